@@ -0,0 +1,20 @@
+""" Configuration of gunicorn (see the Procfile). """
+import os
+import shutil
+
+# Every worker writes its metrics in this directory and /metrics adds
+# them up (see `minesweeper.apps.game.metrics`). It's set here so the
+# workers get it before creating any metric.
+os.environ.setdefault('prometheus_multiproc_dir', '/tmp/minesweeper-metrics')
+
+
+def on_starting(server):
+    """ Starts with no metrics left by earlier runs. """
+    path = os.environ['prometheus_multiproc_dir']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,90 @@
+""" Authentication of the API.
+
+    `CachedJSONWebTokenAuthentication` takes the users of the tokens from
+    a cache of this process instead of loading them on every request.
+    Users are cached by their id and token for `JWT_USER_CACHE_TIMEOUT`
+    seconds, up to `JWT_USER_CACHE_MAX_ENTRIES` of them (dropping the least
+    recently used), and dropped when they are saved or deleted. Changes
+    made by other processes are seen once the entry expires.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_jwt.authentication import JSONWebTokenAuthentication
+
+
+class UserCache(object):
+    """ Users by (user id, token), kept for a while. """
+    def __init__(self):
+        # (user id, token): (expiry time, user)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, token):
+        """ Copy of the user cached for the token, None if it's not
+            cached or it expired.
+        """
+        key = (user_id, token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        # Every request gets its own instance
+        return copy.deepcopy(entry[1])
+
+    def set(self, user_id, token, user):
+        if not settings.JWT_USER_CACHE_TIMEOUT:
+            return
+        entry = (time.monotonic() + settings.JWT_USER_CACHE_TIMEOUT, copy.deepcopy(user))
+        with self._lock:
+            self._entries[(user_id, token)] = entry
+            self._entries.move_to_end((user_id, token))
+            while len(self._entries) > settings.JWT_USER_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def delete(self, user_id):
+        """ Drops the user `user_id` for every token. """
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    user_cache.delete(instance.pk)
+
+
+class CachedJSONWebTokenAuthentication(JSONWebTokenAuthentication):
+    """ JSON Web Token authentication taking the users from `user_cache`.
+        The token is still decoded (and checked) by every request.
+    """
+    def authenticate(self, request):
+        # An instance authenticates a single request
+        self.token = self.get_jwt_value(request)
+        return super(CachedJSONWebTokenAuthentication, self).authenticate(request)
+
+    def authenticate_credentials(self, payload):
+        user_id = payload.get('user_id')
+        user = user_cache.get(user_id, self.token) if user_id is not None else None
+        if user is None:
+            user = super(CachedJSONWebTokenAuthentication, self).authenticate_credentials(payload)
+            if user_id is not None and user.pk == user_id:
+                user_cache.set(user_id, self.token, user)
+        return user
@@ -0,0 +1,100 @@
+import json
+import operator
+from functools import reduce
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetCursorPagination(CursorPagination):
+    """ Cursor pagination positioned on every field of the ordering,
+        which must identify the rows, instead of just the first one
+        (plus an offset over its ties). Pages are then found through an
+        index on the ordering so they take the same time at any depth,
+        however many rows share the first field.
+    """
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, current_position = self.cursor or (0, False, None)
+
+        if reverse:
+            queryset = queryset.order_by(*[order[1:] if order.startswith('-') else '-' + order
+                                           for order in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if current_position is not None:
+            queryset = queryset.filter(self.position_filter(current_position, reverse))
+
+        # One more row tells if there's a page following
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = following_position is not None
+            self.next_position, self.previous_position = current_position, following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position, self.previous_position = following_position, current_position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def position_filter(self, position, reverse):
+        """ Rows after the `position` of a cursor (before it if `reverse`)
+            in the ordering: those with the same values in the first
+            fields and a following value in the next one.
+        """
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        after, equal = [], Q()
+        for order, value in zip(self.ordering, values):
+            field = order.lstrip('-')
+            lookup = 'lt' if reverse != order.startswith('-') else 'gt'
+            after.append(equal & Q(**{'{}__{}'.format(field, lookup): value}))
+            equal &= Q(**{field: value})
+        return reduce(operator.or_, after)
+
+    def _get_position_from_instance(self, instance, ordering):
+        fields = [instance._meta.get_field(order.lstrip('-')) for order in ordering]
+        # Dates as text with all their digits
+        return json.dumps([getattr(instance, field.attname) for field in fields], default=str)
+
+
+class GameCursorPagination(KeysetCursorPagination):
+    """ Newest games first. """
+    ordering    = ('-create_date', '-id')
+    page_size   = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class LeaderboardPagination(GameCursorPagination):
+    """ Users with the most games won first. """
+    ordering    = ('-won', 'user')
+
+
+class BoardLeaderboardPagination(GameCursorPagination):
+    """ Users with the best times first (leaderboards of a board size). """
+    ordering    = ('best_time', 'user')
+
+
+class BoardStatsPagination(GameCursorPagination):
+    """ Board sizes, smallest first (stats of a user). """
+    ordering    = ('rows', 'columns', 'mines')
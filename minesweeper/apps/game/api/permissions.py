@@ -11,5 +11,6 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
 
-        # Instance must have an attribute named `owner`.
-        return obj.owner == request.user
+        # Instance must have an attribute named `owner_id`, compared
+        # without loading the owner.
+        return obj.owner_id == request.user.id
@@ -1,6 +1,11 @@
+import base64
+
 from rest_framework import serializers
 
-from minesweeper.apps.game.models import Game
+from minesweeper.apps.game import bitmap
+from minesweeper.apps.game.chunks import WholeBoardError
+from minesweeper.apps.game.middleware import timed
+from minesweeper.apps.game.models import BoardStats, Game, UserStats
 
 
 class GameSerializer(serializers.ModelSerializer):
@@ -18,10 +23,20 @@ class GameSerializer(serializers.ModelSerializer):
             'status',
             'rows',
             'columns',
-            'mines'
+            'mines',
+            'no_guess',
+            'no_guess_fallback',
+            'chunked',
         ]
-        read_only_fields = ['id', 'user', 'create_date', 'finish_date', 'last_action', 'elapsed_time', 'status', 'url']
+        read_only_fields = ['id', 'user', 'create_date', 'finish_date', 'last_action', 'elapsed_time', 'status', 'url',
+                            'no_guess_fallback']
+
+    # Fields of the board, only given when the game is created
+    CREATE_ONLY_FIELDS = ['rows', 'columns', 'mines', 'no_guess', 'chunked']
 
+    def to_representation(self, instance):
+        with timed('serializer'):
+            return super(GameSerializer, self).to_representation(instance)
 
     def get_url(self, obj):
         request = self.context.get("request")
@@ -35,3 +50,106 @@ class GameSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Some other game has this name!")
         return value
 
+    def update(self, instance, validated_data):
+        """ Only the edited fields are written (see `Game.edit`). """
+        instance.edit(**validated_data)
+        return instance
+
+    def validate(self, data):
+        if self.instance is not None:
+            changed = [field for field in self.CREATE_ONLY_FIELDS
+                       if field in data and data[field] != getattr(self.instance, field)]
+            if changed:
+                raise serializers.ValidationError({field: "It can't be changed once the game is created!"
+                                                   for field in changed})
+        if data.get('chunked') and data.get('no_guess'):
+            raise serializers.ValidationError("Chunked games can't be no-guess games!")
+        return data
+
+
+class GameBoardSerializer(GameSerializer):
+    """ Game with what the player sees of the board.
+        `board` is the base64 encoding of `Board.view` packed
+        with 4 bits per cell (see `bitmap`), None for chunked games
+        (they are seen by chunks, see `packed_chunk_view`).
+    """
+    board = serializers.SerializerMethodField(read_only=True)
+    class Meta(GameSerializer.Meta):
+        fields = GameSerializer.Meta.fields + ['flags', 'board']
+
+    def get_board(self, obj):
+        try:
+            return packed_view(obj.board)
+        except WholeBoardError:
+            return None
+
+
+class GameMoveSerializer(GameSerializer):
+    """ Game with the cells changed by the last move
+        as a list of [row, column, view].
+    """
+    changes = serializers.SerializerMethodField(read_only=True)
+    class Meta(GameSerializer.Meta):
+        fields = GameSerializer.Meta.fields + ['flags', 'changes']
+
+    def get_changes(self, obj):
+        return cell_changes(obj, ((idx, obj.board.cell_view(idx)) for idx in obj.changed_cells))
+
+
+class UserStatsSerializer(serializers.ModelSerializer):
+    """ Games finished by a user, `win_rate` being the share of them won. """
+    username = serializers.CharField(source='user.username', read_only=True)
+    lost = serializers.IntegerField(read_only=True)
+    win_rate = serializers.SerializerMethodField(read_only=True)
+    class Meta:
+        model = UserStats
+        fields = ['user', 'username', 'played', 'won', 'lost', 'win_rate']
+
+    def get_win_rate(self, obj):
+        return round(obj.won / obj.played, 4) if obj.played else None
+
+
+class BoardStatsSerializer(UserStatsSerializer):
+    """ Games finished by a user on a board size, with the best
+        and average times (in seconds) of the games won.
+    """
+    average_time = serializers.FloatField(read_only=True)
+    class Meta:
+        model = BoardStats
+        fields = UserStatsSerializer.Meta.fields[:2] + ['rows', 'columns', 'mines'] + \
+            UserStatsSerializer.Meta.fields[2:] + ['best_time', 'average_time']
+
+
+def packed_view(board):
+    """ Base64 encoding of `Board.view` packed with 4 bits per cell. """
+    return base64.b64encode(bitmap.pack(board.view(), bits=4)).decode('ascii')
+
+
+def packed_chunk_view(board, row, column):
+    """ Base64 encoding of `ChunkedBoard.chunk_view` packed with 4 bits per cell. """
+    return base64.b64encode(bitmap.pack(board.chunk_view(row, column), bits=4)).decode('ascii')
+
+
+def cell_changes(game, cells):
+    """ [row, column, view] of the given (index, view) pairs of cells. """
+    return [[idx // game.columns, idx % game.columns, view] for idx, view in cells]
+
+
+def hint_data(game, solution):
+    """ Cells of the `Solution` of a game as [row, column] lists,
+        [row, column, probability] for the uncertain ones.
+    """
+    def cell(idx):
+        return [idx // game.columns, idx % game.columns]
+
+    def chance(idx):
+        return cell(idx) + [round(solution.probability(idx), 4)]
+
+    best = solution.best()
+    return {
+        'safe': [cell(idx) for idx in sorted(solution.safe)],
+        'mines': [cell(idx) for idx in sorted(solution.mines)],
+        'probabilities': [chance(idx) for idx in sorted(solution.probabilities)],
+        'outside_probability': round(solution.outside_probability, 4),
+        'best': None if best is None else chance(best),
+    }
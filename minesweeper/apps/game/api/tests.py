@@ -1,7 +1,24 @@
-from minesweeper.apps.game.models import Game
+import base64
+import datetime
+import json
+import threading
+from unittest import mock
+
+from minesweeper.apps.game import bitmap
+from minesweeper.apps.game.board import Board
+from minesweeper.apps.game.api.authentication import user_cache
+from minesweeper.apps.game.api.views import MOVE_RETRIES, GameDetailView
+from minesweeper.apps.game.middleware import query_shape
+from minesweeper.apps.game.models import BoardStats, Game, StaleGame, UserStats
+from minesweeper.apps.solver.generator import is_solvable
 
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APIClient, APITestCase
+from django.conf import settings
+from django.db import connection
+from django.test import TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
 
 from django.contrib.auth import get_user_model
 from rest_framework.reverse import reverse as api_reverse
@@ -60,6 +77,123 @@ class GameAPITestCase(APITestCase):
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
+    @override_settings(BOARD_POOL_SIZES=[(9, 9, 10), (16, 16, 40), (16, 30, 99)])
+    def test_create_pooled_sizes(self):
+        """ The standard sizes (those of the board pool) can be created
+        """
+        url = api_reverse("game-api:game-list-and-create")
+        self.client.force_authenticate(User.objects.first())
+        for rows, columns, mines in settings.BOARD_POOL_SIZES:
+            data = {"name": "Pooled {}x{}".format(rows, columns), "rows": rows, "columns": columns, "mines": mines}
+            response = self.client.post(url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED, data)
+
+        for rows, columns, mines in [(9, 9, 73), (3, 3, 1), (9, 9, -1), (9, None, 1)]:
+            data = {"name": "Crowded", "rows": rows, "columns": columns, "mines": mines}
+            response = self.client.post(url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, data)
+        data = {"name": "Full", "rows": 9, "columns": 9, "mines": 72}
+        self.assertEqual(self.client.post(url, data, format='json').status_code, status.HTTP_201_CREATED)
+
+    def test_list_games(self):
+        """ Games are listed newest first, one page at a time
+        """
+        user_obj = User.objects.first()
+        other = User.objects.create(username='otherUser', email='other@test.com')
+        for number in range(4):
+            Game.objects.create(user=other, name='Other Game {}'.format(number), rows=3, columns=3, mines=1)
+        Game.objects.filter(name='Other Game 0').update(status=Game.WON)
+        url = api_reverse("game-api:game-list-and-create")
+
+        response = self.client.get(url, {"page_size": 2}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        names = [game['name'] for game in response.data['results']]
+        self.assertEqual(len(names), 2)
+        while response.data['next']:
+            response = self.client.get(response.data['next'], format='json')
+            names += [game['name'] for game in response.data['results']]
+        self.assertEqual(names, ['Other Game 3', 'Other Game 2', 'Other Game 1', 'Other Game 0', 'Test Game 1'])
+
+        response = self.client.get(url, {"user": user_obj.id}, format='json')
+        self.assertEqual([game['name'] for game in response.data['results']], ['Test Game 1'])
+        response = self.client.get(url, {"user": other.id, "status": Game.PLAYING, "q": "game 2"}, format='json')
+        self.assertEqual([game['name'] for game in response.data['results']], ['Other Game 2'])
+        response = self.client.get(url, {"status": "won"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_game_etag(self):
+        """ Unchanged games answer 304 and cached responses are served
+            without loading the game
+        """
+        game = Game.objects.first()
+        url = game.get_api_url()
+        response = self.client.get(url, format='json')
+        etag = response['ETag']
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        with self.assertNumQueries(1):
+            response = self.client.get(url, format='json')
+        self.assertEqual(response.data['name'], 'Test Game 1')
+        with override_settings(GAME_RESPONSE_CACHE=None), self.assertNumQueries(2):
+            self.assertEqual(self.client.get(url, format='json')['ETag'], etag)
+
+        game.make_move(0, 0, sign='F')
+        response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['flags'], 1)
+        # Stale entries are not served even if they were not dropped
+        with mock.patch('minesweeper.apps.game.models.invalidate_game'):
+            game.make_move(0, 0, sign='')
+        self.assertEqual(self.client.get(url, format='json').data['flags'], 0)
+
+        game.delete()
+        self.assertEqual(self.client.get(url, format='json').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_moves_within_a_second(self):
+        """ A move in the same second as the last one is never taken for
+            the same state, whatever the client sends
+        """
+        game = Game.objects.first()
+        url = game.get_api_url()
+        now = datetime.datetime(2020, 1, 1, 12, 0, 0, 100000, tzinfo=datetime.timezone.utc)
+        game.make_move(0, 0, sign='F')
+        Game.objects.filter(pk=game.pk).update(last_action=now)
+        etag = self.client.get(url, format='json')['ETag']
+        game = Game.objects.get(pk=game.pk)
+        game.make_move(0, 0, sign='')
+        Game.objects.filter(pk=game.pk).update(last_action=now + datetime.timedelta(milliseconds=500))
+        since = http_date(now.timestamp())
+        for headers in ({'HTTP_IF_MODIFIED_SINCE': since}, {'HTTP_IF_NONE_MATCH': etag},
+                        {'HTTP_IF_NONE_MATCH': etag, 'HTTP_IF_MODIFIED_SINCE': since}):
+            response = self.client.get(url, format='json', **headers)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['flags'], 0)
+
+    def test_list_etag(self):
+        """ Unchanged pages of games answer 304
+        """
+        url = api_reverse("game-api:game-list-and-create")
+        response = self.client.get(url, format='json')
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Game.objects.first().make_move(0, 0, sign='F')
+        with override_settings(GAME_RESPONSE_CACHE=None), self.assertNumQueries(1):
+            response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['name'], 'Test Game 1')
+        Game.objects.create(user=User.objects.first(), name='Test Game 2', rows=3, columns=3, mines=1)
+        response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual([game['name'] for game in response.data['results']], ['Test Game 2', 'Test Game 1'])
+
     def test_make_move_error(self):
         game = Game.objects.first()
         url = game.get_api_url()
@@ -88,33 +222,599 @@ class GameAPITestCase(APITestCase):
         response = self.client.put(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
-    def test_game_won(self):
-        # TODO
+    def test_game_board(self):
         game = Game.objects.first()
+        game.make_move(0, 0, sign='F')
         url = game.get_api_url()
 
-        data = {"row": 4, "column": 4}
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        view = bitmap.unpack(base64.b64decode(response.data['board']), 81, bits=4)
+        self.assertEqual(view[0], Board.VIEW_FLAGGED)
+        self.assertEqual(set(view[1:]), {Board.VIEW_HIDDEN})
+        self.assertEqual(response.data['flags'], 1)
+
+    def test_make_move_changes(self):
+        game = Game.objects.first()
+        url = game.get_api_url()
+        row, col = 4, 4
+
+        data = {"row": row, "column": col}
+        # Add credentials
+        user_obj = User.objects.first()
+        payload  = payload_handler(user_obj)
+        token_rsp = encode_handler(payload)
+        self.client.credentials(HTTP_AUTHORIZATION='JWT ' + token_rsp) # JWT <token>
+
+        response = self.client.put(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        changes = response.data['changes']
+        # The mines are placed away from the first reveal
+        game = Game.objects.get(pk=game.pk)
+        self.assertEqual(changes[0], [row, col, 0])
+        self.assertEqual(len(changes), 81 - game.hidden_cells - 10)
+        self.assertEqual(sum(game.board.mine), 10)
+        self.assertNotIn('board', response.data)
+
+        data = {"row": row, "column": col, "sign": "X"}
+        response = self.client.put(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_make_moves(self):
+        game = Game.objects.first()
+        url = api_reverse("game-api:game-moves", kwargs={'id': game.id})
+        mine_map, _, _, count_map = Board.random(9, 9, 10).packed()
+        Game.objects.filter(pk=game.pk).update(mine_map=mine_map, count_map=count_map, mines_placed=True)
+        game = Game.objects.get(pk=game.pk)
+        safe = [divmod(idx, game.columns) for idx, mine in enumerate(game.board.mine) if not mine]
+
         # Add credentials
         user_obj = User.objects.first()
         payload  = payload_handler(user_obj)
         token_rsp = encode_handler(payload)
         self.client.credentials(HTTP_AUTHORIZATION='JWT ' + token_rsp) # JWT <token>
 
+        data = {"moves": [{"row": 0, "column": 0, "sign": "F"}, {"row": 400, "column": 0}]}
         response = self.client.post(url, data, format='json')
-        #self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Game.objects.get(pk=game.pk).flags, 0)
 
-    def test_game_lost(self):
-        # TODO
+        moves = [{"row": 0, "column": 0, "sign": "F"}] + [{"row": r, "column": c} for r, c in safe]
+        moves.append({"row": 0, "column": 0, "sign": ""})
+        response = self.client.post(url, {"moves": moves}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], Game.WON)
+        self.assertEqual(response.data['moves'][0]['changes'], [[0, 0, Board.VIEW_FLAGGED]])
+        # Moves after the game is won are not applied
+        self.assertLess(len(response.data['moves']), len(moves))
+        self.assertEqual(sum(len(move['changes']) for move in response.data['moves'][1:]), 71)
+        game = Game.objects.get(pk=game.pk)
+        self.assertEqual((game.status, game.hidden_cells, game.flags), (Game.WON, 0, 1))
+
+    def test_chunked_game(self):
+        url = api_reverse("game-api:game-list-and-create")
+        user_obj = User.objects.first()
+        self.client.credentials(HTTP_AUTHORIZATION='JWT ' + encode_handler(payload_handler(user_obj)))
+
+        data = {"name": "Chunked", "rows": 1000, "columns": 1000, "mines": 1000, "chunked": True}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # The first reveal could hardly be kept clear of a denser board
+        data["mines"] = 500000
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        data["mines"] = 200000
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        game = Game.objects.get(pk=response.data['id'])
+        self.assertIsNone(self.client.get(game.get_api_url(), format='json').data['board'])
+
+        response = self.client.put(game.get_api_url(), {"row": 40, "column": 40}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn([40, 40, 0], response.data['changes'])
+        url = api_reverse("game-api:game-chunk", kwargs={'id': game.id, 'row': 1, 'column': 1})
+        response = self.client.get(url, format='json')
+        self.assertEqual((response.data['row'], response.data['column'], response.data['size']), (1, 1, 32))
+        view = bitmap.unpack(base64.b64decode(response.data['board']), 32 * 32, bits=4)
+        self.assertEqual(view[8 * 32 + 8], 0)
+        url = api_reverse("game-api:game-chunk", kwargs={'id': game.id, 'row': 32, 'column': 0})
+        self.assertEqual(self.client.get(url, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        url = api_reverse("game-api:game-hint", kwargs={'id': game.id})
+        self.assertEqual(self.client.get(url, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_edit_game(self):
+        """ Only the name of a game can be changed once it's created
+        """
+        game = Game.objects.first()
+        game.make_move(0, 0, sign='F')
+        user_obj = User.objects.first()
+        self.client.credentials(HTTP_AUTHORIZATION='JWT ' + encode_handler(payload_handler(user_obj)))
+
+        for data in ({"chunked": True, "rows": 3}, {"mines": 20}, {"no_guess": True}):
+            response = self.client.patch(game.get_api_url(), data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(set(response.data), set(data))
+        response = self.client.patch(game.get_api_url(), {"name": "Renamed", "rows": 9}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        game = Game.objects.get(pk=game.pk)
+        self.assertEqual((game.name, game.rows, game.chunked, game.flags), ("Renamed", 9, False, 1))
+
+    def test_edit_during_move(self):
+        """ Renaming a game never undoes the moves made meanwhile, and
+            the moves loaded before are tried again
+        """
+        game = Game.objects.first()
+        user_obj = User.objects.first()
+        self.client.credentials(HTTP_AUTHORIZATION='JWT ' + encode_handler(payload_handler(user_obj)))
+        loaded = Game.objects.get(pk=game.pk)
+        moving = Game.objects.get(pk=game.pk)
+        Game.objects.get(pk=game.pk).make_move(0, 0, sign='F')
+        etag = self.client.get(game.get_api_url(), format='json')['ETag']
+
+        with mock.patch.object(GameDetailView, 'get_object', return_value=loaded):
+            response = self.client.patch(game.get_api_url(), {"name": "Renamed"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['flags'], 1)
+        game = Game.objects.get(pk=game.pk)
+        self.assertEqual((game.name, game.flags, game.version), ("Renamed", 1, 2))
+        self.assertNotEqual(self.client.get(game.get_api_url(), format='json')['ETag'], etag)
+        with self.assertRaises(StaleGame):
+            moving.make_move(1, 1, sign='F')
+
+    def test_huge_chunked_game(self):
+        """ The mines and counters of a chunked game can exceed 32 bits,
+            its rows and columns can't, and other games are far smaller
+        """
+        url = api_reverse("game-api:game-list-and-create")
+        user_obj = User.objects.first()
+        self.client.credentials(HTTP_AUTHORIZATION='JWT ' + encode_handler(payload_handler(user_obj)))
+
+        data = {"name": "Huge", "rows": 10 ** 6, "columns": 10 ** 6, "mines": 2 * 10 ** 11, "chunked": True}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        game = Game.objects.get(pk=response.data['id'])
+        self.assertEqual((game.mines, game.hidden_cells), (2 * 10 ** 11, 8 * 10 ** 11))
+        response = self.client.put(game.get_api_url(), {"row": 10 ** 6 - 1, "column": 0}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.put(game.get_api_url(), {"row": 0, "column": 0, "sign": "F"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Game.objects.get(pk=game.pk).flags, 1)
+
+        data.update(rows=2 ** 31, mines=10 ** 15)
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # Only chunked boards are that big
+        data = {"name": "Whole", "rows": 100000, "columns": 100000, "mines": 1000}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('chunked', str(response.data))
+        data.update(rows=1000, columns=1000)
+        self.assertEqual(self.client.post(url, data, format='json').status_code, status.HTTP_201_CREATED)
+
+    def test_game_hint(self):
+        game = Game.objects.first()
+        layout = ['*........',
+                  '.........',
+                  '..*......',
+                  '.........',
+                  '.......**',
+                  '.........',
+                  '..*......',
+                  '.....*...',
+                  '*.......*']
+        board = Board(9, 9, mine=bytearray(c == '*' for row in layout for c in row))
+        mine_map, _, _, count_map = board.packed()
+        Game.objects.filter(pk=game.pk).update(mine_map=mine_map, count_map=count_map, mines_placed=True)
+        game = Game.objects.get(pk=game.pk)
+        game.make_move(0, 8)
+        url = api_reverse("game-api:game-hint", kwargs={'id': game.id})
+
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['safe'] or response.data['best'])
+        for row, col in response.data['safe']:
+            self.assertFalse(game.board.mine[game.board.index(row, col)])
+        for row, col in response.data['mines']:
+            self.assertTrue(game.board.mine[game.board.index(row, col)])
+        self.assertIn([0, 0], response.data['mines'])
+        for row, col, probability in response.data['probabilities']:
+            self.assertTrue(0 < probability < 1)
+
+    def test_game_replay(self):
+        game = Game.objects.first()
+        game.make_move(0, 0, sign='F')
+        game.make_move(0, 0, sign='')
+        url = api_reverse("game-api:game-replay", kwargs={'id': game.id})
+
+        response = self.client.get(url, {'seq': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['seq'], response.data['move_count']), (1, 2))
+        view = bitmap.unpack(base64.b64decode(response.data['board']), 81, bits=4)
+        self.assertEqual(view[0], Board.VIEW_FLAGGED)
+        response = self.client.get(url, format='json')
+        view = bitmap.unpack(base64.b64decode(response.data['board']), 81, bits=4)
+        self.assertEqual((response.data['seq'], view[0]), (2, Board.VIEW_HIDDEN))
+
+        response = self.client.get(url, {'seq': 3}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_make_move_conflict(self):
         game = Game.objects.first()
         url = game.get_api_url()
 
-        data = {"row": 4, "column": 4}
+        data = {"row": 4, "column": 4, "sign": "F"}
         # Add credentials
         user_obj = User.objects.first()
         payload  = payload_handler(user_obj)
         token_rsp = encode_handler(payload)
         self.client.credentials(HTTP_AUTHORIZATION='JWT ' + token_rsp) # JWT <token>
 
-        response = self.client.post(url, data, format='json')
-        #self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        with mock.patch.object(Game, '_save_move', side_effect=StaleGame) as save_move:
+            response = self.client.put(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(save_move.call_count, 3)
+
+        with mock.patch.object(Game, '_save_move', side_effect=[StaleGame, None]):
+            response = self.client.put(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_no_guess_unlocked(self):
+        """ The board of the first reveal of a no-guess game is searched
+            outside the transaction of the move, with the game unlocked
+        """
+        user_obj = User.objects.first()
+        self.client.credentials(HTTP_AUTHORIZATION='JWT ' + encode_handler(payload_handler(user_obj)))
+        game = Game.objects.create(user=user_obj, name='No guess', rows=9, columns=9, mines=10, no_guess=True)
+        search = Game.find_no_guess_seed
+        depths = []
+
+        def find_no_guess_seed(game, idx):
+            depths.append(len(connection.savepoint_ids))
+            return search(game, idx)
+
+        depth = len(connection.savepoint_ids)
+        with mock.patch.object(Game, 'find_no_guess_seed', find_no_guess_seed):
+            response = self.client.put(game.get_api_url(), {"row": 4, "column": 4}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(depths, [depth])
+        game = Game.objects.get(pk=game.pk)
+        self.assertEqual((game.move_count, game.version, game.mines_placed), (1, 1, True))
+        self.assertTrue(is_solvable(Board(9, 9, mine=bytearray(game.board.mine)), 10, 40))
+        self.assertFalse(response.data['no_guess_fallback'])
+
+    def test_no_guess_fallback(self):
+        """ A no-guess game that got a regular board is returned with
+            `no_guess_fallback` set
+        """
+        user_obj = User.objects.first()
+        self.client.credentials(HTTP_AUTHORIZATION='JWT ' + encode_handler(payload_handler(user_obj)))
+        game = Game.objects.create(user=user_obj, name='No guess', rows=9, columns=9, mines=10, no_guess=True)
+        with mock.patch('minesweeper.apps.game.models.no_guess_seed', return_value=None):
+            response = self.client.put(game.get_api_url(), {"row": 4, "column": 4}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['no_guess'] and response.data['no_guess_fallback'])
+        response = self.client.get(game.get_api_url())
+        self.assertTrue(response.data['no_guess_fallback'])
+
+    def test_stale_move(self):
+        """ A move on a game changed by another move since it was loaded
+            is rejected by its outdated version and retried with the game
+            loaded again, up to MOVE_RETRIES times
+        """
+        game = Game.objects.first()
+        url = game.get_api_url()
+        self.client.force_authenticate(User.objects.first())
+        get_object = GameDetailView.get_object
+        save_move = Game._save_move
+        stale = []
+
+        def outdated(times):
+            """ The view first gets `times` copies of the game loaded
+                before another move changed it.
+            """
+            copies = [Game.objects.get(pk=game.pk) for _ in range(times)]
+            Game.objects.get(pk=game.pk).make_move(8, 8, sign='?')
+            return mock.patch.object(GameDetailView, 'get_object',
+                                     lambda view: copies.pop() if copies else get_object(view))
+
+        def save(game, *args):
+            try:
+                save_move(game, *args)
+            except StaleGame:
+                stale.append(game.version)
+                raise
+
+        with outdated(1), mock.patch.object(Game, '_save_move', save):
+            response = self.client.put(url, {"row": 0, "column": 0, "sign": "F"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(stale, [0])
+        game = Game.objects.get(pk=game.pk)
+        self.assertEqual((game.version, game.flags, game.board.as_ascii()[-2:]), (2, 1, 'x?'))
+
+        del stale[:]
+        with outdated(MOVE_RETRIES), mock.patch.object(Game, '_save_move', save):
+            response = self.client.put(url, {"row": 0, "column": 8, "sign": "F"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(stale, [2] * MOVE_RETRIES)
+        game = Game.objects.get(pk=game.pk)
+        self.assertEqual((game.version, game.flags), (3, 1))
+        self.assertEqual(game.board.sign[8], Board.NO_SIGN)
+
+    def set_layout(self, game):
+        """ Places 8 mines on the 9x9 board of the game. """
+        layout = ['*........',
+                  '.........',
+                  '..*......',
+                  '.........',
+                  '.......**',
+                  '.........',
+                  '..*......',
+                  '.....*...',
+                  '*.......*']
+        board = Board(9, 9, mine=bytearray(c == '*' for row in layout for c in row))
+        mine_map, _, _, count_map = board.packed()
+        Game.objects.filter(pk=game.pk).update(mine_map=mine_map, count_map=count_map, mines_placed=True,
+                                               mines=8, hidden_cells=73)
+        return board
+
+    def test_game_won(self):
+        game = Game.objects.first()
+        board = self.set_layout(game)
+        url = game.get_api_url()
+        self.client.credentials(HTTP_AUTHORIZATION='JWT ' + encode_handler(payload_handler(User.objects.first())))
+
+        hidden = {divmod(idx, 9) for idx in range(81) if not board.mine[idx]}
+        while hidden:
+            self.assertIsNone(Game.objects.get(pk=game.pk).finish_date)
+            row, col = min(hidden)
+            response = self.client.put(url, {"row": row, "column": col}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            hidden -= {(row, col) for row, col, _ in response.data['changes']}
+        self.assertEqual(response.data['status'], Game.WON)
+        self.assertIsNotNone(response.data['finish_date'])
+
+        response = self.client.put(url, {"row": 0, "column": 0}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_game_lost(self):
+        game = Game.objects.first()
+        self.set_layout(game)
+        url = game.get_api_url()
+        self.client.credentials(HTTP_AUTHORIZATION='JWT ' + encode_handler(payload_handler(User.objects.first())))
+
+        response = self.client.put(url, {"row": 4, "column": 4}, format='json')
+        self.assertEqual(response.data['status'], Game.PLAYING)
+        response = self.client.put(url, {"row": 4, "column": 7}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], Game.LOST)
+        self.assertEqual(response.data['changes'], [[4, 7, Board.VIEW_MINE]])
+        self.assertIsNotNone(response.data['finish_date'])
+
+        response = self.client.put(url, {"row": 0, "column": 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CachedAuthenticationTestCase(APITestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create(username='testUser', email='test@test.com')
+        self.game = Game.objects.create(user=self.user, name='Test Game 1', rows=9, columns=9, mines=10)
+        self.url = self.game.get_api_url()
+        self.token = encode_handler(payload_handler(self.user))
+        self.client.credentials(HTTP_AUTHORIZATION='JWT ' + self.token)
+
+    def flag(self):
+        return self.client.put(self.url, {"row": 0, "column": 0, "sign": "F"}, format='json')
+
+    def flag_queries(self):
+        """ Queries of a flag, leaving out savepoints. """
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.flag().status_code, status.HTTP_200_OK)
+        return [query['sql'] for query in captured.captured_queries if 'SAVEPOINT' not in query['sql']]
+
+    def test_cached_user(self):
+        """ Once cached, neither the user of the token nor the owner of the game are loaded by a move
+        """
+        self.assertEqual(self.flag().status_code, status.HTTP_200_OK)
+        # The game (locked), its UPDATE and the entry of its log
+        self.assertEqual(len(self.flag_queries()), 3)
+        with override_settings(JWT_USER_CACHE_TIMEOUT=0):
+            user_cache.clear()
+            self.assertEqual(len(self.flag_queries()), 4)
+
+    def test_user_changed(self):
+        """ Users are loaded again once changed
+        """
+        self.assertEqual(self.flag().status_code, status.HTTP_200_OK)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.flag().status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_expired(self):
+        """ Users are loaded again once their entry expires
+        """
+        self.flag()
+        with mock.patch('minesweeper.apps.game.api.authentication.time.monotonic', return_value=10 ** 9):
+            self.assertIsNone(user_cache.get(self.user.id, self.token.encode('ascii')))
+        self.assertEqual(len(user_cache._entries), 0)
+
+    def test_not_owner(self):
+        """ Other users can't play the game
+        """
+        other = User.objects.create(username='otherUser', email='other@test.com')
+        self.client.credentials(HTTP_AUTHORIZATION='JWT ' + encode_handler(payload_handler(other)))
+        self.assertEqual(self.flag().status_code, status.HTTP_403_FORBIDDEN)
+
+
+class StatsAPITestCase(APITestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username='user{}'.format(number)) for number in range(3)]
+        for user, played, won, best_time in zip(self.users, (5, 4, 2), (1, 3, 0), (30, 12, None)):
+            UserStats.objects.create(user=user, played=played, won=won)
+            BoardStats.objects.create(user=user, rows=9, columns=9, mines=10, played=played, won=won,
+                                      best_time=best_time, won_time=(best_time or 0) * won)
+        BoardStats.objects.create(user=self.users[0], rows=16, columns=16, mines=40, played=1)
+
+    def test_leaderboard(self):
+        """ Users with the most games won first, from their stats only
+        """
+        url = api_reverse("game-api:leaderboard")
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'page_size': 2}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(stats['username'], stats['won'], stats['lost'], stats['win_rate'])
+                          for stats in response.data['results']],
+                         [('user1', 3, 1, 0.75), ('user0', 1, 4, 0.2)])
+        response = self.client.get(response.data['next'], format='json')
+        self.assertEqual([stats['username'] for stats in response.data['results']], ['user2'])
+
+    def test_leaderboard_ties(self):
+        """ Pages are positioned on every field of the ordering, so the
+            users with as many games won are neither skipped nor offset
+        """
+        for number in range(3, 10):
+            UserStats.objects.create(user=User.objects.create(username='user{}'.format(number)), played=2, won=2)
+        expected = ['user1'] + ['user{}'.format(number) for number in range(3, 10)] + ['user0', 'user2']
+        url = api_reverse("game-api:leaderboard")
+        response = self.client.get(url, {'page_size': 3}, format='json')
+        names = [stats['username'] for stats in response.data['results']]
+        while response.data['next']:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(response.data['next'], format='json')
+            self.assertNotIn('OFFSET', queries[0]['sql'].upper())
+            names += [stats['username'] for stats in response.data['results']]
+        self.assertEqual(names, expected)
+
+        names = [stats['username'] for stats in response.data['results']]
+        while response.data['previous']:
+            response = self.client.get(response.data['previous'], format='json')
+            names = [stats['username'] for stats in response.data['results']] + names
+        self.assertEqual(names, expected)
+        response = self.client.get(url, {'cursor': base64.b64encode(b'p=oops').decode('ascii')}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_board_leaderboard(self):
+        """ Users with the best times of a board size first
+        """
+        url = api_reverse("game-api:board-leaderboard", kwargs={'rows': 9, 'columns': 9, 'mines': 10})
+        with self.assertNumQueries(1):
+            response = self.client.get(url, format='json')
+        self.assertEqual([(stats['username'], stats['best_time'], stats['average_time'])
+                          for stats in response.data['results']],
+                         [('user1', 12, 12.0), ('user0', 30, 30.0)])
+        url = api_reverse("game-api:board-leaderboard", kwargs={'rows': 16, 'columns': 16, 'mines': 40})
+        self.assertEqual(self.client.get(url, format='json').data['results'], [])
+
+    def test_user_stats(self):
+        """ The games finished by a user, of every size and by size
+        """
+        url = api_reverse("game-api:user-stats", kwargs={'id': self.users[0].id})
+        with self.assertNumQueries(1):
+            response = self.client.get(url, format='json')
+        self.assertEqual((response.data['played'], response.data['won'], response.data['lost']), (5, 1, 4))
+
+        url = api_reverse("game-api:user-board-stats", kwargs={'id': self.users[0].id})
+        with self.assertNumQueries(1):
+            response = self.client.get(url, format='json')
+        self.assertEqual([(stats['rows'], stats['played'], stats['win_rate'], stats['best_time'])
+                          for stats in response.data['results']],
+                         [(9, 5, 0.2, 30), (16, 1, 0.0, None)])
+
+        newcomer = User.objects.create(username='newcomer')
+        response = self.client.get(api_reverse("game-api:user-stats", kwargs={'id': newcomer.id}), format='json')
+        self.assertEqual((response.data['played'], response.data['win_rate']), (0, None))
+        response = self.client.get(api_reverse("game-api:user-stats", kwargs={'id': newcomer.id + 1}), format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RequestTimingTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='testUser', email='test@test.com')
+        self.game = Game.objects.create(user=self.user, name='Test Game 1', rows=9, columns=9, mines=10)
+        self.client.force_authenticate(self.user)
+
+    def test_disabled(self):
+        """ Requests aren't instrumented by default
+        """
+        response = self.client.put(self.game.get_api_url(), {"row": 0, "column": 0, "sign": "F"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(REQUEST_TIMING=True, SLOW_REQUEST_THRESHOLD=60)
+    def test_server_timing(self):
+        """ The queries and timings of a request are sent as Server-Timing headers and logged
+        """
+        url = self.game.get_api_url()
+        with self.assertLogs('minesweeper.requests', 'INFO') as logs:
+            response = self.client.put(url, {"row": 0, "column": 0, "sign": "F"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timings = dict(entry.split(';', 1) for entry in response['Server-Timing'].split(', '))
+        self.assertEqual(list(timings), ['db', 'view', 'serializer', 'render', 'total'])
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line['method'], line['path'], line['status']), ('PUT', url, 200))
+        self.assertIn('desc="{} queries"'.format(line['queries']), timings['db'])
+        self.assertGreater(line['queries'], 0)
+        self.assertLessEqual(line['serializer_ms'], line['view_ms'])
+        self.assertLessEqual(line['view_ms'], line['total_ms'])
+        self.assertNotIn('top_queries', line)
+
+    @override_settings(REQUEST_TIMING=True, SLOW_REQUEST_THRESHOLD=0)
+    def test_slow_request(self):
+        """ Slow requests log the query shapes they repeat the most
+        """
+        for number in range(3):
+            Game.objects.create(user=self.user, name='Other Game {}'.format(number), rows=3, columns=3, mines=1)
+        url = api_reverse("game-api:game-list-and-create")
+        with self.assertLogs('minesweeper.requests', 'WARNING') as logs:
+            response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        line = json.loads(logs.records[0].getMessage())
+        self.assertTrue(line['slow'])
+        self.assertEqual(sum(query['count'] for query in line['top_queries']), line['queries'])
+        for query in line['top_queries']:
+            self.assertNotIn(str(self.user.id), query['sql'].split())
+
+    def test_query_shape(self):
+        """ Queries only differing in their values have the same shape
+        """
+        self.assertEqual(query_shape('SELECT "t1"."id" FROM "t1" WHERE "t1"."id" IN (%s, %s) AND name = \'it\'\'s\''),
+                         'SELECT "t1"."id" FROM "t1" WHERE "t1"."id" IN (...) AND name = ?')
+        self.assertEqual(query_shape('SELECT 1 FROM t WHERE id IN (4, 5, 6) LIMIT 21'),
+                         'SELECT ? FROM t WHERE id IN (...) LIMIT ?')
+        self.assertEqual(query_shape('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)'),
+                         'INSERT INTO t (a, b) VALUES (...)')
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class GameConcurrencyTestCase(TransactionTestCase):
+    def test_parallel_moves(self):
+        """ Parallel moves on the same game are all applied
+        """
+        user_obj = User.objects.create(username='testUser', email='test@test.com')
+        game = Game.objects.create(user=user_obj, name='Test Game 1', rows=9, columns=9, mines=10)
+        url = game.get_api_url()
+        cells = [divmod(idx, game.columns) for idx in range(0, 81, 3)]
+        responses = []
+
+        def flag(row, col):
+            client = APIClient()
+            client.force_authenticate(user_obj)
+            try:
+                responses.append(client.put(url, {"row": row, "column": col, "sign": "F"}, format='json'))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=flag, args=cell) for cell in cells]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
 
+        self.assertEqual([r.status_code for r in responses], [status.HTTP_200_OK] * len(cells))
+        game = Game.objects.get(pk=game.pk)
+        self.assertEqual((game.flags, game.version), (len(cells), len(cells)))
+        self.assertEqual([idx for idx, sign in enumerate(game.board.sign) if sign == Board.FLAGGED],
+                         list(range(0, 81, 3)))
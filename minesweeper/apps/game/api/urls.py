@@ -1,10 +1,20 @@
 from django.conf.urls import url
 
-from .views import GameDetailView, GameAPIView
+from .views import (GameDetailView, GameAPIView, GameMovesView, GameHintView, GameReplayView, GameChunkView,
+                    LeaderboardView, BoardLeaderboardView, UserStatsView, UserBoardStatsView)
 
 app_name = 'minesweeper'
 
 urlpatterns = [
     url(r'^$', GameAPIView.as_view(), name='game-list-and-create'),
-    url(r'^(?P<id>\d+)/$', GameDetailView.as_view(), name='game-detail')
+    url(r'^(?P<id>\d+)/$', GameDetailView.as_view(), name='game-detail'),
+    url(r'^(?P<id>\d+)/moves/$', GameMovesView.as_view(), name='game-moves'),
+    url(r'^(?P<id>\d+)/hint/$', GameHintView.as_view(), name='game-hint'),
+    url(r'^(?P<id>\d+)/replay/$', GameReplayView.as_view(), name='game-replay'),
+    url(r'^(?P<id>\d+)/chunks/(?P<row>\d+)/(?P<column>\d+)/$', GameChunkView.as_view(), name='game-chunk'),
+    url(r'^leaderboard/$', LeaderboardView.as_view(), name='leaderboard'),
+    url(r'^leaderboard/(?P<rows>\d+)/(?P<columns>\d+)/(?P<mines>\d+)/$', BoardLeaderboardView.as_view(),
+        name='board-leaderboard'),
+    url(r'^users/(?P<id>\d+)/stats/$', UserStatsView.as_view(), name='user-stats'),
+    url(r'^users/(?P<id>\d+)/stats/boards/$', UserBoardStatsView.as_view(), name='user-board-stats'),
 ]
@@ -1,23 +1,181 @@
-from rest_framework import generics, mixins
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.shortcuts import get_object_or_404
+from rest_framework import generics, mixins, status
 from rest_framework.decorators import detail_route
+from rest_framework.exceptions import APIException, NotFound
 from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
 
-from minesweeper.apps.game.models import Game
+from minesweeper.apps.game.board import Board
+from minesweeper.apps.game.boardcache import board_cache
+from minesweeper.apps.game.cache import detail_key, game_etag, list_key, response_cache
+from minesweeper.apps.game.chunks import CHUNK_SIZE, MAX_DENSITY, MIN_DENSITY
+from minesweeper.apps.game.models import BoardStats, Game, NoGuessSearch, StaleGame, UserStats
+from minesweeper.apps.solver import solve
+from .pagination import BoardLeaderboardPagination, BoardStatsPagination, GameCursorPagination, LeaderboardPagination
 from .permissions import IsOwnerOrReadOnly
-from .serializers import GameSerializer
+from .serializers import (BoardStatsSerializer, GameSerializer, GameBoardSerializer, GameMoveSerializer,
+                          UserStatsSerializer, cell_changes, hint_data, packed_chunk_view, packed_view)
+
+# Maximum number of moves of a batch
+MAX_BATCH_MOVES = 1000
+# Largest number of rows or columns of a chunked board (they are stored as
+# 32 bits integers, the mines and the counters of cells as 64 bits ones)
+MAX_SIDE = 2 ** 31 - 1
+# Largest number of cells of a board that is not chunked (it's kept whole
+# in memory by every move)
+MAX_CELLS = 10 ** 6
+# Times a move is tried again when another move changed the game first
+MOVE_RETRIES = 3
+
+
+class GameConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The game was changed by another move, try again!"
+    default_code = 'conflict'
+
+
+def games_to_play():
+    """ Games locked for a move. Their boards are left out when the
+        board cache is enabled: moves take them from it (see `Game.board`).
+    """
+    games = Game.objects.select_for_update()
+    if board_cache() is not None:
+        games = games.defer(*Game.PACKED_FIELDS)
+    return games
+
+
+def check_playing(game):
+    if game.status == game.PAUSED:
+        raise ValidationError("The game is paused!")
+    elif game.status in (game.LOST, game.WON):
+        raise ValidationError("The game has ended!")
+
+
+def play_locked(view, play):
+    """ Runs `play(game)` on the game of the view inside a short transaction
+        with the game row locked (where the database supports it).
+        If another move changed the game first, it's loaded again and
+        the play is retried. So is the first reveal of a no-guess game,
+        once its board is searched with the game unlocked.
+
+    Returns:
+        tuple: The game and the result of `play`.
+    """
+    found = None
+    for _ in range(MOVE_RETRIES):
+        try:
+            with transaction.atomic():
+                game = view.get_object()
+                check_playing(game)
+                game.search_no_guess, game.no_guess_found = False, found
+                return game, play(game)
+        except StaleGame:
+            continue
+        except NoGuessSearch as search:
+            found = search.game.find_no_guess_seed(search.idx)
+    raise GameConflict()
+
+
+def check_cell(game, row, col):
+    if (not isinstance(row, int) or not isinstance(col, int)
+            or not (0 <= row < game.rows and 0 <= col < game.columns)):
+        raise ValidationError("The selected cell is not valid!")
+
+
+def check_whole(game):
+    """ Checks the game is seen whole: chunked boards raise
+        `WholeBoardError` when they are (see `chunks`).
+    """
+    if game.chunked:
+        raise ValidationError("Chunked games are only seen by chunks!")
+
+
+def conditional_response(request, etag, key, render):
+    """ Response of a GET for a state of a game (or list of games)
+        identified by `etag`: a 304 if the client has it already,
+        otherwise the data cached under `key` if it was rendered for the
+        same `etag`, or else the data returned by `render()` (and cached).
+        There's no Last-Modified date: with a precision of one second,
+        a move in the same second as the date would go unnoticed.
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        cache = response_cache()
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None and cached[0] == etag:
+            data = cached[1]
+        else:
+            data = render()
+            if cache is not None:
+                cache.set(key, (etag, data), settings.GAME_RESPONSE_CACHE_TIMEOUT)
+        response = Response(data)
+    response['ETag'] = etag
+    # Clients may keep it but must check it's still current
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def int_param(request, name):
+    """ Integer query parameter `name` of the request, None if missing. """
+    value = request.GET.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError("The parameter {} must be an integer!".format(name))
+
 
 class GameAPIView(mixins.CreateModelMixin, generics.ListAPIView):
     lookup_field            = 'id'
     serializer_class        = GameSerializer
+    pagination_class        = GameCursorPagination
 
     def get_queryset(self):
+        """
+        Games, newest first. They can be filtered by:
+            user (int): Id of the owner.
+            status (int): Status of the game.
+            q (str): Text in the name of the game.
+        """
         qs = Game.objects.all()
+        user = int_param(self.request, "user")
+        if user is not None:
+            qs = qs.filter(user_id=user)
+        game_status = int_param(self.request, "status")
+        if game_status is not None:
+            qs = qs.filter(status=game_status)
         query = self.request.GET.get("q")
         if query is not None:
             qs = qs.filter(name__icontains=query)
         return qs
 
+    def list(self, request, *args, **kwargs):
+        """
+        Games answer 304 when the page is unchanged since the ETag of
+        the client: it's made of the id, version and last action of
+        the games of the page. The page is loaded once, without the
+        boards, for both the ETag and the response.
+        """
+        queryset = self.filter_queryset(self.get_queryset()).defer(*Game.PACKED_FIELDS)
+        page = self.paginate_queryset(queryset)
+        state = [(game.id, game.version, game.last_action.timestamp()) for game in page]
+        state += [self.paginator.has_next, self.paginator.has_previous]
+        etag = '"{}"'.format(hashlib.md5(repr(state).encode('ascii')).hexdigest())
+        cache = response_cache()
+        key = list_key(cache, request.get_full_path()) if cache is not None else None
+
+        def render():
+            return self.get_paginated_response(self.get_serializer(page, many=True).data).data
+
+        return conditional_response(request, etag, key, render)
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
@@ -25,8 +183,18 @@ class GameAPIView(mixins.CreateModelMixin, generics.ListAPIView):
         row = request.data.get('rows')
         col = request.data.get('columns')
         mines = request.data.get('mines')
-        if mines >= row + col:
-            raise ValidationError("The number if mines should be less than #Rows + #Cols -1!")
+        if not all(isinstance(value, int) and value >= 0 for value in (row, col, mines)):
+            raise ValidationError("The rows, columns and mines should be positive integers!")
+        if not request.data.get('chunked') and row * col > MAX_CELLS:
+            raise ValidationError("Boards of more than {} cells must be chunked!".format(MAX_CELLS))
+        if row > MAX_SIDE or col > MAX_SIDE:
+            raise ValidationError("The rows and columns can't exceed {}!".format(MAX_SIDE))
+        # The first reveal and its neighbours are kept clear of mines
+        if mines > row * col - 9:
+            raise ValidationError("The mines should leave at least 9 cells without!")
+        if request.data.get('chunked') and not MIN_DENSITY * row * col <= mines <= MAX_DENSITY * row * col:
+            raise ValidationError("Chunked boards need between {:.0%} and {:.0%} of mines!".format(
+                MIN_DENSITY, MAX_DENSITY))
         return self.create(request, *args, **kwargs)
 
     def get_serializer_context(self, *args, **kwargs):
@@ -36,15 +204,33 @@ class GameAPIView(mixins.CreateModelMixin, generics.ListAPIView):
 class GameDetailView(generics.RetrieveUpdateDestroyAPIView):
     lookup_field        = 'id'
     ordering_fields     = ('create_date', )
-    serializer_class    = GameSerializer
+    serializer_class    = GameBoardSerializer
     permission_classes  = [IsOwnerOrReadOnly]
 
     def get_queryset(self):
+        if self.request.method == 'PUT':
+            return games_to_play()
         return Game.objects.all()
 
     def get_serializer_context(self, *args, **kwargs):
         return {"request": self.request}
 
+    def retrieve(self, request, *args, **kwargs):
+        """
+        The game answers 304 when it's unchanged since the ETag of the
+        client, checked without loading its board.
+        """
+        state = Game.objects.filter(id=kwargs['id']).values_list('version', 'last_action').first()
+        if state is None:
+            raise NotFound()
+        version, last_action = state
+
+        def render():
+            return super(GameDetailView, self).retrieve(request, *args, **kwargs).data
+
+        return conditional_response(request, game_etag(kwargs['id'], version, last_action),
+                                    detail_key(kwargs['id']), render)
+
     def put(self, request, *args, **kwargs):
         """
         API for making a new play on the minesweeper
@@ -55,7 +241,9 @@ class GameDetailView(generics.RetrieveUpdateDestroyAPIView):
             sign (char, optional): Defaults to None. Indicates the
                     kind of move intended.
         Returns:
-            bool: True if a valid move was made, False otherwise.
+            The game and the cells changed by the move
+            as a list of [row, column, view].
+            409 if other moves keep changing the game meanwhile.
 
         - If sign is None, it indicates that a cell have
           been chosen to be revealed.
@@ -65,18 +253,204 @@ class GameDetailView(generics.RetrieveUpdateDestroyAPIView):
           have been marked witha a question mark.
         - If sign is '' it indicates that the cell (row, col)
           have been cleared of any markings.
+        - If sign is 'C' it indicates a chord on the revealed cell
+          (row, col): when as many neighbours as its number are flagged,
+          every other hidden neighbour is revealed.
         """
-        game = self.get_object()
-        if game.status == game.PAUSED:
-            raise ValidationError("The game is paused!")
-        elif game.status in (game.LOST, game.WON):
-            raise ValidationError("The game has ended!")
         row = request.data.get('row')
         col = request.data.get('column')
         sign = request.data.get('sign')
-        if row is None or col is None or row + 1 > game.rows or col + 1 > game.columns:
-            raise ValidationError("The selected cell is not valid!")
-        game.make_move(row, col, sign=sign)
-        serializer = GameSerializer(game, context={'request': request}, many=False)
+        if not Board.is_move(sign):
+            raise ValidationError("The selected sign is not valid!")
+
+        def play(game):
+            check_cell(game, row, col)
+            game.make_move(row, col, sign=sign)
+
+        game, _ = play_locked(self, play)
+        serializer = GameMoveSerializer(game, context={'request': request}, many=False)
         return Response(serializer.data)
 
+
+class GameMovesView(generics.GenericAPIView):
+    lookup_field        = 'id'
+    serializer_class    = GameBoardSerializer
+    permission_classes  = [IsOwnerOrReadOnly]
+
+    def get_queryset(self):
+        return games_to_play()
+
+    def get_serializer_context(self, *args, **kwargs):
+        return {"request": self.request}
+
+    def post(self, request, *args, **kwargs):
+        """
+        API for making several plays on the minesweeper
+        game at once.
+        Args:
+            moves (list): Moves to make in order, each one with
+                    the `row`, `column` and `sign` of a single play.
+        Returns:
+            The game (with its board) and for every move made
+            the cells it changed as a list of [row, column, view].
+
+        The moves are applied with the game locked and stored
+        at once. Moves after the end of the game are ignored.
+        Answers 409 if other moves keep changing the game meanwhile.
+        """
+        moves = request.data.get('moves')
+        if not isinstance(moves, list) or not moves:
+            raise ValidationError("A list of moves is expected!")
+        if len(moves) > MAX_BATCH_MOVES:
+            raise ValidationError("At most {} moves are allowed!".format(MAX_BATCH_MOVES))
+
+        plays = []
+        for move in moves:
+            if not isinstance(move, dict):
+                raise ValidationError("Every move must be an object!")
+            row, col, sign = move.get('row'), move.get('column'), move.get('sign')
+            if not Board.is_move(sign):
+                raise ValidationError("The selected sign is not valid!")
+            plays.append((row, col, sign))
+
+        def play(game):
+            for row, col, _ in plays:
+                check_cell(game, row, col)
+            return game.make_moves(plays)
+
+        game, changes = play_locked(self, play)
+
+        data = self.get_serializer(game).data
+        data['moves'] = [dict(row=row, column=col, sign=sign, changes=cell_changes(game, cells or []))
+                         for (row, col, sign), cells in zip(plays, changes)]
+        return Response(data)
+
+
+class GameHintView(generics.GenericAPIView):
+    lookup_field        = 'id'
+    queryset            = Game.objects.all()
+    permission_classes  = [IsOwnerOrReadOnly]
+
+    def get(self, request, *args, **kwargs):
+        """
+        API for getting hints on the minesweeper game.
+        They only use what the player sees of the board.
+        Returns:
+            safe: Hidden cells without a mine for sure, as [row, column].
+            mines: Hidden cells with a mine for sure, as [row, column].
+            probabilities: Probability of having a mine of the other
+                    hidden cells next to a number, as [row, column, probability].
+            outside_probability: Probability of having a mine of
+                    the rest of the hidden cells.
+            best: The hidden cell least likely to have a mine,
+                    as [row, column, probability].
+        """
+        game = self.get_object()
+        check_whole(game)
+        solution = solve(game.rows, game.columns, game.mines, game.board.view())
+        return Response(hint_data(game, solution))
+
+
+class GameReplayView(generics.GenericAPIView):
+    lookup_field        = 'id'
+    queryset            = Game.objects.all()
+    permission_classes  = [IsOwnerOrReadOnly]
+
+    def get(self, request, *args, **kwargs):
+        """
+        API for replaying the minesweeper game.
+        Args:
+            seq (int, optional): Sequence number of the move, from 1
+                    for the first one. Defaults to the last move.
+        Returns:
+            seq: The sequence number of the move.
+            move_count: The number of moves of the game.
+            board: The board right after the move (as the `board` of a game).
+        """
+        game = self.get_object()
+        check_whole(game)
+        seq = int_param(request, "seq")
+        if seq is None:
+            seq = game.move_count
+        try:
+            board = game.replay(seq)
+        except ValueError as error:
+            raise ValidationError(str(error))
+        return Response({'seq': seq, 'move_count': game.move_count, 'board': packed_view(board)})
+
+
+class GameChunkView(generics.GenericAPIView):
+    lookup_field        = 'id'
+    queryset            = Game.objects.all()
+    permission_classes  = [IsOwnerOrReadOnly]
+
+    def get(self, request, *args, **kwargs):
+        """
+        API for seeing a chunk of the board of a chunked game.
+        Args:
+            row (int): Row of the chunk, the one of its cells over CHUNK_SIZE.
+            column (int): Column of the chunk.
+        Returns:
+            row, column: The position of the chunk.
+            size: The cells per side of a chunk.
+            board: What the player sees of the cells of the chunk, row
+                    by row (as the `board` of a game). Cells out of the
+                    board are hidden.
+        """
+        game = self.get_object()
+        if not game.chunked:
+            raise ValidationError("The game is not chunked!")
+        row, col = int(kwargs['row']), int(kwargs['column'])
+        if row * CHUNK_SIZE >= game.rows or col * CHUNK_SIZE >= game.columns:
+            raise ValidationError("The selected chunk is not valid!")
+        return Response({'row': row, 'column': col, 'size': CHUNK_SIZE,
+                         'board': packed_chunk_view(game.board, row, col)})
+
+
+class LeaderboardView(generics.ListAPIView):
+    """
+    Users with the most games won first, read from their stats
+    (see `UserStats`) a page at a time.
+    """
+    serializer_class    = UserStatsSerializer
+    pagination_class    = LeaderboardPagination
+    queryset            = UserStats.objects.select_related('user')
+
+
+class BoardLeaderboardView(generics.ListAPIView):
+    """
+    Users with the best times of a board size (rows, columns and mines)
+    first, read from their stats (see `BoardStats`) a page at a time.
+    Only users who won a game of the size are listed.
+    """
+    serializer_class    = BoardStatsSerializer
+    pagination_class    = BoardLeaderboardPagination
+
+    def get_queryset(self):
+        return BoardStats.objects.filter(rows=self.kwargs['rows'], columns=self.kwargs['columns'],
+                                         mines=self.kwargs['mines'], best_time__isnull=False).select_related('user')
+
+
+class UserStatsView(generics.RetrieveAPIView):
+    """
+    Games finished by a user, of every board size.
+    """
+    serializer_class    = UserStatsSerializer
+
+    def get_object(self):
+        stats = UserStats.objects.select_related('user').filter(user_id=self.kwargs['id']).first()
+        if stats is None:
+            # No game finished yet
+            stats = UserStats(user=get_object_or_404(get_user_model(), pk=self.kwargs['id']))
+        return stats
+
+
+class UserBoardStatsView(generics.ListAPIView):
+    """
+    Games finished by a user by board size, smallest first.
+    """
+    serializer_class    = BoardStatsSerializer
+    pagination_class    = BoardStatsPagination
+
+    def get_queryset(self):
+        return BoardStats.objects.filter(user_id=self.kwargs['id']).select_related('user')
@@ -0,0 +1,232 @@
+""" Benchmarks of the game hot paths.
+    They are run with the `benchmark` management command inside a
+    transaction that is rolled back, so they can be pointed to any database.
+    Every case is measured for its duration, its SQL queries and the peak
+    memory it allocates, and has a budget of queries: going over it
+    (e.g. a query run for every cell or every game of a page) fails.
+"""
+import os
+import random
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.reverse import reverse as api_reverse
+from rest_framework.test import APIClient
+from rest_framework_jwt.settings import api_settings
+
+from minesweeper.apps.solver.generator import no_guess_board
+
+from .board import Board
+from .models import BoardStats, Game, UserStats
+
+# (rows, columns, mines)
+BOARD_SIZES = [
+    (9, 9, 10),
+    (16, 16, 40),
+    (16, 30, 99),
+    (100, 100, 1500),
+    (300, 300, 13500),
+    (1000, 1000, 150000),
+]
+
+# Queries of a move: the UPDATE of the game and the INSERT of its log.
+MOVE_QUERIES = 2
+# Queries of a move ending a game: also the UPDATEs of the stats of the user.
+END_MOVE_QUERIES = MOVE_QUERIES + 2
+# Queries of a request playing moves: the game (locked) and the queries of
+# the move. The user of the credentials is cached and the owner check
+# doesn't load it.
+MOVE_REQUEST_QUERIES = 1 + MOVE_QUERIES
+# Queries of a page of games: its games, also used for the ETag.
+LIST_QUERIES = 1
+
+
+def benchmark_user():
+    """ User owning the games created by the benchmarks. """
+    user, _ = get_user_model().objects.get_or_create(username='benchmark')
+    return user
+
+
+def measure(func, repeat, setup=None):
+    """ Runs `func` `repeat` times, with the result of `setup()` as its
+        argument if given (prepared out of the measures). A first run,
+        not timed, counts the queries and the memory.
+
+    Returns:
+        dict: The `best` and `mean` duration of a run in seconds, the
+            SQL `queries` (leaving out savepoints) and the `peak_memory`
+            allocated by a run in bytes.
+    """
+    args = () if setup is None else (setup(),)
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as captured:
+            func(*args)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    queries = sum(1 for query in captured.captured_queries if 'SAVEPOINT' not in query['sql'])
+
+    durations = []
+    for _ in range(repeat):
+        args = () if setup is None else (setup(),)
+        start = time.perf_counter()
+        func(*args)
+        durations.append(time.perf_counter() - start)
+    return {
+        'best': min(durations),
+        'mean': sum(durations) / len(durations),
+        'queries': queries,
+        'peak_memory': peak_memory,
+    }
+
+
+def case_result(benchmark, case, budget, measures, **extra):
+    """ Result of a case: its `measures` (see `measure`), its query
+        `budget` and anything `extra`.
+    """
+    result = {'benchmark': benchmark, 'case': case, 'budget': budget}
+    result.update(measures, **extra)
+    return result
+
+
+def size_name(rows, columns, mines):
+    return '{}x{}/{}'.format(rows, columns, mines)
+
+
+def game_with_board(user, board, mines):
+    """ Stored game playing `board` (loaded), as if its mines were placed. """
+    game = Game.objects.create(user=user, rows=board.rows, columns=board.columns, mines=mines)
+    mine_map, visible_map, _, count_map = board.packed()
+    Game.objects.filter(pk=game.pk).update(mine_map=mine_map, visible_map=visible_map, count_map=count_map,
+                                           mines_placed=True, hidden_cells=board.size - mines - sum(board.visible))
+    game = Game.objects.get(pk=game.pk)
+    game.board
+    return game
+
+
+def bench_create_game(sizes=BOARD_SIZES, repeat=5):
+    """ Latency of creating (and storing) a game for every board size. """
+    user = benchmark_user()
+    for rows, columns, mines in sizes:
+        def create():
+            Game.objects.create(user=user, rows=rows, columns=columns, mines=mines)
+        yield case_result('create_game', size_name(rows, columns, mines), 1, measure(create, repeat))
+
+
+def bench_engine(sizes=BOARD_SIZES, repeat=5):
+    """ Latency of the game operations for every board size, on games
+        loaded with their board:
+        - initialize_game: a new board for a stored game.
+        - reveal: a single cell with a number.
+        - cascade: the worst case, a board with a single mine (so it
+          wins the game, its user having stats already).
+        - flag: a hidden cell.
+        - is_solved: the game counter and the scan of the board (solved,
+          so it's scanned whole).
+        - as_ascii: the whole board.
+    """
+    user = benchmark_user()
+    rng = random.Random(1)
+    for rows, columns, mines in sizes:
+        board = Board.random(rows, columns, mines, rng=rng)
+        number = next(idx for idx in range(board.size) if not board.mine[idx] and board.counts[idx])
+        lonely = Board(rows, columns, mine=bytearray(board.size - 1) + b'\x01')
+        UserStats.objects.get_or_create(user=user)
+        BoardStats.objects.get_or_create(user=user, rows=rows, columns=columns, mines=1)
+        solved = Board(rows, columns, mine=board.mine, visible=bytearray(1 - mine for mine in board.mine),
+                       counts=board.counts)
+
+        def loaded(board=board, mines=mines):
+            return lambda: game_with_board(user, board, mines)
+
+        cases = [
+            ('initialize_game', loaded(), lambda game: game.initialize_game(), 1),
+            ('reveal', loaded(), lambda game, idx=number: game.make_move(*divmod(idx, columns)), MOVE_QUERIES),
+            ('cascade', loaded(lonely, 1), lambda game: game.make_move(0, 0), END_MOVE_QUERIES),
+            ('flag', loaded(), lambda game: game.make_move(0, 0, sign='F'), MOVE_QUERIES),
+            ('is_solved', loaded(solved), lambda game: (game.is_solved, game.board.is_solved), 0),
+            ('as_ascii', loaded(), lambda game: game.as_ascii(), 0),
+        ]
+        for name, setup, func, budget in cases:
+            yield case_result('engine', '{} {}'.format(name, size_name(rows, columns, mines)), budget,
+                              measure(func, repeat, setup))
+
+
+def bench_moves(sizes=((16, 30, 99), (100, 100, 1500)), moves=100, repeat=5):
+    """ Moves per second when every move is a PUT and when
+        they are all sent in a single batch.
+        Only signs are played so the game never ends.
+    """
+    user = benchmark_user()
+    client = APIClient()
+    # Authenticated as the clients are, the user is cached by the first move
+    token = api_settings.JWT_ENCODE_HANDLER(api_settings.JWT_PAYLOAD_HANDLER(user))
+    client.credentials(HTTP_AUTHORIZATION='JWT ' + token)
+    for rows, columns, mines in sizes:
+        game = Game.objects.create(user=user, rows=rows, columns=columns, mines=mines)
+        plays = [{'row': random.randrange(rows), 'column': random.randrange(columns), 'sign': sign}
+                 for sign in ('F', '?', '') * (moves // 3)]
+        detail_url = game.get_api_url()
+        moves_url = api_reverse("game-api:game-moves", kwargs={'id': game.id})
+        # So is the board
+        client.put(detail_url, {'row': 0, 'column': 0, 'sign': ''}, format='json')
+
+        def single():
+            for play in plays:
+                client.put(detail_url, play, format='json')
+
+        def batch():
+            client.post(moves_url, {'moves': plays}, format='json')
+
+        for case, func, budget in (('put', single, MOVE_REQUEST_QUERIES * len(plays)),
+                                   ('batch', batch, MOVE_REQUEST_QUERIES)):
+            measures = measure(func, repeat)
+            yield case_result('moves', '{} {}x{} x{}'.format(case, rows, columns, len(plays)), budget,
+                              measures, per_second=len(plays) / measures['best'])
+
+
+def bench_list(pages=(10, 50, 200), repeat=5):
+    """ Latency of a page of the list of games for every page size. """
+    user = benchmark_user()
+    client = APIClient()
+    missing = max(pages) - Game.objects.count()
+    for _ in range(max(missing, 0)):
+        Game.objects.create(user=user, rows=9, columns=9, mines=10)
+    url = api_reverse("game-api:game-list-and-create")
+    for page_size in pages:
+        def get_page():
+            client.get(url, {'page_size': page_size}, format='json')
+        yield case_result('list', 'page of {}'.format(page_size), LIST_QUERIES, measure(get_page, repeat))
+
+
+def bench_no_guess(sizes=((9, 9, 10), (16, 16, 40), (16, 30, 99)), repeat=5):
+    """ No-guess boards generated per second for every board size,
+        with 1, 2, 4... worker processes up to the number of CPUs.
+    """
+    workers = [1]
+    while workers[-1] * 2 <= (os.cpu_count() or 1):
+        workers.append(workers[-1] * 2)
+    for count in workers:
+        with ProcessPoolExecutor(max_workers=count) as executor:
+            for rows, columns, mines in sizes:
+                start = (rows // 2) * columns + columns // 2
+
+                def generate():
+                    no_guess_board(rows, columns, mines, start, executor=executor)
+                measures = measure(generate, repeat)
+                yield case_result('no_guess', '{} {} workers'.format(size_name(rows, columns, mines), count), 0,
+                                  measures, per_second=1 / measures['mean'])
+
+
+BENCHMARKS = {
+    'create_game': bench_create_game,
+    'engine': bench_engine,
+    'moves': bench_moves,
+    'list': bench_list,
+    'no_guess': bench_no_guess,
+}
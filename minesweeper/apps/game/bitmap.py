@@ -0,0 +1,62 @@
+""" Helpers to pack per-cell values of a board into compact binary blobs.
+
+    A board of `size` cells is stored as a little-endian integer in which
+    cell `i` (i.e. `row * columns + column`) takes `bits` consecutive bits
+    starting at bit `i * bits`. Both conversions go through `int` so the
+    heavy lifting is done in C even for very large boards.
+"""
+
+# Digits used to spell a cell value in base 2 ** bits.
+_DIGITS = b'0123456789abcdef'
+
+
+def _check_bits(bits):
+    if bits not in (1, 2, 4):
+        raise ValueError("Only 1, 2 or 4 bits per cell are supported")
+
+
+def packed_size(size, bits):
+    """ Number of bytes needed to store `size` cells of `bits` bits each. """
+    _check_bits(bits)
+    return (size * bits + 7) // 8
+
+
+def pack(values, bits=1):
+    """ Packs a bytes-like object with one value per cell into a blob.
+
+    Args:
+        values (bytes-like): One value per cell, each below 2 ** bits.
+        bits (int, optional): Defaults to 1. Bits used by each cell.
+    Returns:
+        bytes: The packed representation of `values`.
+    """
+    _check_bits(bits)
+    values = bytes(values)
+    if not values:
+        return b''
+    digits = values.translate(bytes.maketrans(bytes(range(1 << bits)), _DIGITS[:1 << bits]))
+    return int(digits[::-1], 1 << bits).to_bytes(packed_size(len(values), bits), 'little')
+
+
+def unpack(data, size, bits=1):
+    """ Inverse of `pack`.
+
+    Args:
+        data (bytes-like): A blob created by `pack`. An empty blob is
+            read as a board with every value set to zero.
+        size (int): Number of cells stored in `data`.
+        bits (int, optional): Defaults to 1. Bits used by each cell.
+    Returns:
+        bytearray: One value per cell.
+    """
+    _check_bits(bits)
+    if not data:
+        return bytearray(size)
+    per_digit = 4 // bits
+    mask = (1 << bits) - 1
+    # Every hexadecimal digit holds `per_digit` cells, lowest bits first.
+    table = {ord(_DIGITS[d:d+1]): ''.join(chr((d >> (bits * k)) & mask) for k in range(per_digit))
+             for d in range(16)}
+    hex_digits = '{:x}'.format(int.from_bytes(bytes(data), 'little'))
+    cells = hex_digits[::-1].translate(table).encode('latin-1')
+    return bytearray(cells[:size].ljust(size, b'\x00'))
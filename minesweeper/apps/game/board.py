@@ -0,0 +1,352 @@
+""" In-memory minesweeper board.
+
+    This module owns the rules of the game and has no dependencies on
+    Django so it can be used (and tested) without a database. `Game`
+    loads a `Board` from its packed fields, applies the moves on it and
+    stores it back with a single write.
+"""
+import random
+from collections import deque
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from . import bitmap
+
+_AS_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+_FROM_DIGITS = bytes.maketrans(b'0123456789', bytes(range(10)))
+
+
+def adjacent_mines(rows, columns, mine):
+    """ Number of surronding mines of every cell of a board.
+        It's a 3x3 convolution over the mine grid, vectorized with
+        NumPy when available. Otherwise the grid (with a blank border)
+        is read as an integer with four bits per cell and the eight
+        neighbours are added as shifted copies of it, which keeps the
+        work in C too.
+
+    Args:
+        rows (int): Number of rows of the board.
+        columns (int): Number of columns of the board.
+        mine (bytes-like): One 0/1 value per cell.
+    Returns:
+        bytearray: One count (0 to 8) per cell.
+    """
+    mine = bytes(mine)
+    if numpy is not None:
+        grid = numpy.frombuffer(mine, dtype=numpy.uint8).reshape(rows, columns)
+        padded = numpy.pad(grid, 1, mode='constant')
+        counts = sum(padded[r:r + rows, c:c + columns] for r in range(3) for c in range(3)) - grid
+        return bytearray(counts.astype(numpy.uint8).tobytes())
+    width = columns + 2
+    blank = bytes(width)
+    padded = blank + b''.join(b'\x00' + mine[start:start + columns] + b'\x00'
+                              for start in range(0, rows * columns, columns)) + blank
+    grid = int(padded.translate(_AS_DIGITS)[::-1], 16)
+    total = 0
+    for offset in (1, width - 1, width, width + 1):
+        total += (grid << (4 * offset)) + (grid >> (4 * offset))
+    # A count is at most 8 so every cell is a single hexadecimal digit.
+    digits = '{:x}'.format(total).zfill(len(padded))[::-1].encode('ascii').translate(_FROM_DIGITS)
+    return bytearray(b''.join(digits[start + 1:start + width - 1]
+                              for start in range(width, width * (rows + 1), width)))
+
+
+class Board(object):
+    """ A board of `rows` x `columns` cells.
+        Every cell is addressed by its index (i.e. `row * columns + column`)
+        and its state is spread over bytearrays with one entry per cell:
+        `mine` (0/1), `visible` (0/1), `sign` (one of the sign constants)
+        and `counts`, the number of surronding mines, computed once when
+        the mines are placed. Until `mines_placed` the board has no mines.
+    """
+    NO_SIGN = 0
+    Q_MARK  = 1
+    FLAGGED = 2
+    SIGNS = {
+        '': NO_SIGN,
+        '?': Q_MARK,
+        'F': FLAGGED,
+    }
+    # Reveals the neighbours of a number whose flags are all placed
+    CHORD = 'C'
+
+    # What a player sees of a cell: 0 to 8 is the number of surronding
+    # mines of a revealed cell, the rest are the values below.
+    VIEW_HIDDEN  = 9
+    VIEW_FLAGGED = 10
+    VIEW_Q_MARK  = 11
+    VIEW_MINE    = 12
+
+    __slots__ = ('rows', 'columns', 'mine', 'visible', 'sign', 'counts', 'mines_placed')
+
+    def __init__(self, rows, columns, mine=None, visible=None, sign=None, counts=None, mines_placed=True):
+        size = rows * columns
+        self.rows = rows
+        self.columns = columns
+        self.mine = bytearray(size) if mine is None else mine
+        self.visible = bytearray(size) if visible is None else visible
+        self.sign = bytearray(size) if sign is None else sign
+        self.counts = adjacent_mines(rows, columns, self.mine) if counts is None else counts
+        self.mines_placed = mines_placed
+
+    @classmethod
+    def random(cls, rows, columns, mines, rng=random):
+        """ Creates a board pseudo-randomly choosing the mines location.
+
+        Args:
+            rows (int): Number of rows of the board.
+            columns (int): Number of columns of the board.
+            mines (int): Number of mines to place.
+            rng (random.Random, optional): Defaults to the `random` module.
+                    Source of randomness (NumPy is seeded from it).
+        """
+        board = cls(rows, columns, counts=bytearray(rows * columns), mines_placed=False)
+        board.place_mines(mines, rng=rng)
+        return board
+
+    @classmethod
+    def from_packed(cls, rows, columns, mine_map, visible_map, sign_map, count_map=b''):
+        """ Creates a board from the blobs returned by `packed`.
+            The counts are computed again if `count_map` is empty and
+            an empty `mine_map` is a board whose mines are not placed yet
+            (so it has no counts either).
+        """
+        size = rows * columns
+        if count_map:
+            counts = bitmap.unpack(count_map, size, bits=4)
+        else:
+            counts = None if mine_map else bytearray(size)
+        return cls(rows, columns,
+                   mine=bitmap.unpack(mine_map, size),
+                   visible=bitmap.unpack(visible_map, size),
+                   sign=bitmap.unpack(sign_map, size, bits=2),
+                   counts=counts,
+                   mines_placed=bool(mine_map))
+
+    def place_mines(self, mines, safe=(), rng=None):
+        """ Pseudo-randomly chooses the mines location, avoiding the
+            cells in `safe` when there is room for it. The mines are a
+            single sample over the flat cell indexes (vectorized with
+            NumPy when available) that skips the safe cells.
+
+        Args:
+            mines (int): Number of mines to place.
+            safe (iterable, optional): Index of the cells to keep clear.
+            rng (random.Random, optional): Defaults to the `random` module.
+                    Source of randomness (NumPy is seeded from it).
+        """
+        rng = rng or random
+        size = self.size
+        safe = sorted(set(safe))
+        if size - len(safe) < mines:
+            safe = []
+        if numpy is not None:
+            generator = numpy.random.default_rng(rng.getrandbits(64))
+            picks = generator.choice(size - len(safe), mines, replace=False)
+            for idx in safe:
+                picks += picks >= idx
+            grid = numpy.zeros(size, dtype=numpy.uint8)
+            grid[picks] = 1
+            self.mine = bytearray(grid.tobytes())
+        else:
+            self.mine = bytearray(size)
+            for pick in rng.sample(range(size - len(safe)), mines):
+                # The pick-th cell that is not safe
+                for idx in safe:
+                    if pick >= idx:
+                        pick += 1
+                self.mine[pick] = 1
+        self.counts = adjacent_mines(self.rows, self.columns, self.mine)
+        self.mines_placed = True
+
+    def move_mines(self, safe, rng=None):
+        """ Moves the mines found in the `safe` cells to random cells
+            that are neither safe nor mined, when there is room for them.
+        """
+        rng = rng or random
+        safe = set(safe)
+        moved = [idx for idx in safe if self.mine[idx]]
+        if not moved:
+            return
+        free = [idx for idx in range(self.size) if not self.mine[idx] and idx not in safe]
+        if len(free) < len(moved):
+            return
+        for old, new in zip(moved, rng.sample(free, len(moved))):
+            self.mine[old] = 0
+            self.mine[new] = 1
+        self.counts = adjacent_mines(self.rows, self.columns, self.mine)
+
+    def packed(self):
+        """ Returns the (mine, visible, sign, count) blobs of the board. """
+        return (bitmap.pack(self.mine),
+                bitmap.pack(self.visible),
+                bitmap.pack(self.sign, bits=2),
+                bitmap.pack(self.counts, bits=4))
+
+    @property
+    def size(self):
+        return self.rows * self.columns
+
+    def index(self, row, col):
+        """ Index of the cell in position (row, col). """
+        if not (0 <= row < self.rows and 0 <= col < self.columns):
+            raise IndexError("Cell ({}, {}) is out of the board".format(row, col))
+        return row * self.columns + col
+
+    def neighbours(self, idx):
+        """ Index of the surronding cells taking care of "borders". """
+        row, col = divmod(idx, self.columns)
+        first_col = col - 1 if col > 0 else col
+        last_col = col + 1 if col + 1 < self.columns else col
+        for r in range(max(row - 1, 0), min(row + 2, self.rows)):
+            base = r * self.columns
+            for c in range(first_col, last_col + 1):
+                if r != row or c != col:
+                    yield base + c
+
+    def count_mines(self, idx):
+        """ Count the surronding cells that have mines. """
+        return self.counts[idx]
+
+    @property
+    def flagged_mines(self):
+        """ Number of mines correctly flagged. """
+        return sum(1 for m, s in zip(self.mine, self.sign) if m and s == self.FLAGGED)
+
+    @property
+    def is_solved(self):
+        """ Checks if every cell without a mine is visible. """
+        return all((v or m) for m, v in zip(self.mine, self.visible))
+
+    def reveal(self, idx):
+        """ Reveals the cell `idx`. When a cell with no adjacent
+            mines is revealed, all adjacent cells will be revealed (and repeat).
+            The cascade is an iterative breadth-first search so its size
+            is only bounded by the board.
+
+        Returns:
+            list: Index of the cells that became visible.
+        """
+        visible = self.visible
+        if visible[idx]:
+            return []
+        visible[idx] = 1
+        revealed = [idx]
+        if self.mine[idx]:
+            return revealed
+        counts = self.counts
+        pending = deque(revealed)
+        while pending:
+            current = pending.popleft()
+            if counts[current]:
+                continue
+            for nei in self.neighbours(current):
+                if not visible[nei]:
+                    visible[nei] = 1
+                    revealed.append(nei)
+                    pending.append(nei)
+        return revealed
+
+    def chord(self, idx):
+        """ Reveals every hidden neighbour (and its cascade) without a flag
+            of the visible cell `idx`, provided the number of flagged
+            neighbours matches its number of surronding mines.
+            Otherwise nothing is done.
+
+        Returns:
+            list: Index of the cells that became visible.
+        """
+        if not self.visible[idx] or self.mine[idx]:
+            return []
+        hidden = [nei for nei in self.neighbours(idx) if not self.visible[nei]]
+        unflagged = [nei for nei in hidden if self.sign[nei] != self.FLAGGED]
+        if len(hidden) - len(unflagged) != self.counts[idx]:
+            return []
+        revealed = []
+        for nei in unflagged:
+            revealed.extend(self.reveal(nei))
+        return revealed
+
+    @classmethod
+    def is_move(cls, sign):
+        """ Checks if `sign` is a valid kind of move: None to reveal,
+            `CHORD` or one of `SIGNS`.
+        """
+        return sign is None or sign == cls.CHORD or sign in cls.SIGNS
+
+    def mark(self, idx, sign):
+        """ Sets the sign (one of the values of `SIGNS`) of the cell `idx`.
+
+        Returns:
+            int: The previous sign of the cell.
+        """
+        previous = self.sign[idx]
+        self.sign[idx] = self.SIGNS[sign]
+        return previous
+
+    def cell_view(self, idx):
+        """ What a player sees of the cell `idx` (see the VIEW_ values). """
+        if self.visible[idx]:
+            return self.VIEW_MINE if self.mine[idx] else self.counts[idx]
+        return _SIGN_VIEWS[self.sign[idx]]
+
+    def view(self):
+        """ What a player sees of every cell (see `cell_view`).
+            The state of each cell is combined into one byte so the
+            whole board is translated at once.
+
+        Returns:
+            bytearray: One view value per cell.
+        """
+        def as_int(values):
+            return int.from_bytes(values, 'big')
+        key = (as_int(self.counts) + (as_int(self.mine) << 4)
+               + (as_int(self.visible) << 5) + (as_int(self.sign) << 6))
+        return bytearray(key.to_bytes(self.size, 'big').translate(_VIEWS))
+
+    def cell_char(self, idx):
+        """ Character used to draw a cell in the ASCII board. """
+        sign = self.sign[idx]
+        if sign == self.Q_MARK:
+            return '?'
+        elif sign == self.FLAGGED:
+            return 'F'
+        elif not self.visible[idx]:
+            return 'x'
+        elif self.mine[idx]:
+            return 'B'
+        else:
+            return str(self.counts[idx])
+
+    def as_ascii(self):
+        """ One line per row with the character of each cell. """
+        return '\n'.join(''.join(self.cell_char(row * self.columns + col) for col in range(self.columns))
+                         for row in range(self.rows))
+
+
+def random_packed(rows, columns, mines, count):
+    """ Packed (mine, count) blobs of `count` random boards.
+        It's meant to run in worker processes (see `PooledBoard.refill`)
+        so it uses its own source of randomness, seeded by the OS.
+    """
+    rng = random.Random()
+    boards = []
+    for _ in range(count):
+        board = Board.random(rows, columns, mines, rng=rng)
+        boards.append((bitmap.pack(board.mine), bitmap.pack(board.counts, bits=4)))
+    return boards
+
+
+_SIGN_VIEWS = {
+    Board.NO_SIGN: Board.VIEW_HIDDEN,
+    Board.Q_MARK: Board.VIEW_Q_MARK,
+    Board.FLAGGED: Board.VIEW_FLAGGED,
+}
+
+# View of a cell indexed by: count | mine << 4 | visible << 5 | sign << 6
+_VIEWS = bytes(
+    (Board.VIEW_MINE if key & 16 else key & 15) if key & 32 else _SIGN_VIEWS.get(key >> 6, Board.VIEW_HIDDEN)
+    for key in range(256))
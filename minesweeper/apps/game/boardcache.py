@@ -0,0 +1,217 @@
+""" Cache of the boards of the games being played.
+
+    Moves take the board of the game from the cache instead of the
+    database and write it back to both once played (write-through), so
+    in the steady state a move doesn't read the board at all. Every
+    entry is stamped with the ETag of the game it was cached for (its
+    version and last action, see `game_etag`) and only returned for the
+    same stamp, so entries left behind by moves made elsewhere, or rolled
+    back, are never used. Both caches drop the least recently used boards
+    beyond `max_entries` (the file cache only every `cull_every` new
+    entries, so it can briefly hold a few more).
+    The cache is built from the `BOARD_CACHE` setting, if any.
+"""
+import json
+import os
+import stat
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from .board import Board
+
+_caches = {}
+
+# Header of the files of FileBoardCache: length of the stamp, rows,
+# columns and lengths of the four packed maps, which follow the stamp
+_FILE_HEADER = struct.Struct('<7I')
+
+
+def board_cache():
+    """ The cache configured by `BOARD_CACHE`, None if it's disabled. """
+    if not settings.BOARD_CACHE:
+        return None
+    config = json.dumps(settings.BOARD_CACHE, sort_keys=True)
+    if config not in _caches:
+        _caches[config] = import_string(settings.BOARD_CACHE['BACKEND'])(**settings.BOARD_CACHE.get('OPTIONS', {}))
+    return _caches[config]
+
+
+class BoardCache(object):
+    """ Boards of the games by id, stamped (see `get`). """
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+
+    def get(self, pk, stamp):
+        """ Copy of the board of the game `pk`, None if it's not cached
+            or it was cached with another `stamp`.
+        """
+        raise NotImplementedError
+
+    def set(self, pk, stamp, board):
+        """ Caches a copy of the `board` of the game `pk` for `stamp`. """
+        raise NotImplementedError
+
+    def delete(self, pk):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LocMemBoardCache(BoardCache):
+    """ Boards kept in the memory of this process. """
+    def __init__(self, max_entries=1000):
+        super(LocMemBoardCache, self).__init__(max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, pk, stamp):
+        with self._lock:
+            entry = self._entries.get(pk)
+            if entry is None or entry[0] != stamp:
+                return None
+            self._entries.move_to_end(pk)
+        _, rows, columns, mine, visible, sign, counts, mines_placed = entry
+        return Board(rows, columns, bytearray(mine), bytearray(visible), bytearray(sign), bytearray(counts),
+                     mines_placed=mines_placed)
+
+    def set(self, pk, stamp, board):
+        entry = (stamp, board.rows, board.columns, bytes(board.mine), bytes(board.visible),
+                 bytes(board.sign), bytes(board.counts), board.mines_placed)
+        with self._lock:
+            self._entries[pk] = entry
+            self._entries.move_to_end(pk)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, pk):
+        with self._lock:
+            self._entries.pop(pk, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileBoardCache(BoardCache):
+    """ Boards packed in the files of a directory, shared by every
+        process of the host. On Linux a directory of /dev/shm keeps
+        them in shared memory. Listing the directory to cull it costs as
+        much as its entries, so every process only does it once every
+        `cull_every` new entries it writes (a tenth of `max_entries` by
+        default).
+        Entries are a fixed header followed by the packed maps of the
+        board, so a file that's not one is just a missing entry. The
+        directory must be owned by the user of the process and is only
+        accessible to it.
+    """
+    def __init__(self, location, max_entries=1000, cull_every=None):
+        super(FileBoardCache, self).__init__(max_entries)
+        self.location = location
+        self.cull_every = cull_every or max(1, max_entries // 10)
+        self._new_entries = 0
+        self._lock = threading.Lock()
+        os.makedirs(location, mode=0o700, exist_ok=True)
+        # Not following links, which anyone can make in /dev/shm
+        info = os.lstat(location)
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+            raise ImproperlyConfigured("The board cache directory {} isn't a directory owned by this user!"
+                                       .format(location))
+        if info.st_mode & 0o077:
+            os.chmod(location, 0o700)
+
+    def _path(self, pk):
+        return os.path.join(self.location, '{}.board'.format(pk))
+
+    def get(self, pk, stamp):
+        path = self._path(pk)
+        try:
+            with open(path, 'rb') as entry_file:
+                data = entry_file.read()
+            # The modification time orders the entries by use
+            os.utime(path)
+        except OSError:
+            return None
+        entry = _unpack_entry(data)
+        if entry is None or entry[0] != stamp:
+            return None
+        return Board.from_packed(*entry[1:])
+
+    def set(self, pk, stamp, board):
+        mine_map, visible_map, sign_map, count_map = board.packed()
+        if not board.mines_placed:
+            mine_map = count_map = b''
+        stamp = stamp.encode('utf-8')
+        maps = (mine_map, visible_map, sign_map, count_map)
+        header = _FILE_HEADER.pack(len(stamp), board.rows, board.columns, *[len(blob) for blob in maps])
+        path = self._path(pk)
+        new = not os.path.exists(path)
+        # Written aside and moved in place so readers never see half a file
+        handle, temp_path = tempfile.mkstemp(dir=self.location, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as entry_file:
+            entry_file.write(b''.join((header, stamp) + maps))
+        os.replace(temp_path, path)
+        if new:
+            with self._lock:
+                self._new_entries += 1
+                cull = self._new_entries % self.cull_every == 0
+            if cull:
+                self._cull()
+
+    def _cull(self):
+        """ Removes the least recently used boards beyond `max_entries`. """
+        names = [name for name in os.listdir(self.location) if name.endswith('.board')]
+        if len(names) <= self.max_entries:
+            return
+        paths = [os.path.join(self.location, name) for name in names]
+        for path in sorted(paths, key=_mtime)[:len(paths) - self.max_entries]:
+            _remove(path)
+
+    def delete(self, pk):
+        _remove(self._path(pk))
+
+    def clear(self):
+        for name in os.listdir(self.location):
+            if name.endswith('.board'):
+                _remove(os.path.join(self.location, name))
+
+
+def _unpack_entry(data):
+    """ Stamp, rows, columns and packed maps of the file of a
+        FileBoardCache entry, None if `data` isn't one.
+    """
+    if len(data) < _FILE_HEADER.size:
+        return None
+    stamp_length, rows, columns, *lengths = _FILE_HEADER.unpack_from(data)
+    if len(data) != _FILE_HEADER.size + stamp_length + sum(lengths):
+        return None
+    start = _FILE_HEADER.size + stamp_length
+    try:
+        stamp = data[_FILE_HEADER.size:start].decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+    maps = []
+    for length in lengths:
+        maps.append(data[start:start + length])
+        start += length
+    return (stamp, rows, columns) + tuple(maps)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,52 @@
+""" Server-side cache of the API responses of the games.
+
+    Responses are cached with the ETag of the state they were rendered
+    from (see `game_etag`) and only served while it's still current, so
+    a response cached by a request racing with a move is never served
+    once the move is stored. Entries are also dropped by every change
+    of a game (see `invalidate_game`) so they don't outlive it.
+    The cache is the one named by `GAME_RESPONSE_CACHE`, if any.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Bumped by every change of a game, it's part of the key of every list
+LIST_GENERATION_KEY = 'game-list-generation'
+
+
+def response_cache():
+    """ Cache of the API responses, None if it's disabled. """
+    if not settings.GAME_RESPONSE_CACHE:
+        return None
+    return caches[settings.GAME_RESPONSE_CACHE]
+
+
+def game_etag(pk, version, last_action):
+    """ ETag of the state of a game: every move increments its version
+        and any other change sets its last action.
+    """
+    return '"{}-{}-{}"'.format(pk, version, int(last_action.timestamp() * 1000000))
+
+
+def detail_key(pk):
+    return 'game-detail:{}'.format(pk)
+
+
+def list_key(cache, path):
+    """ Key of the list of games of the full `path` of the request. """
+    generation = cache.get(LIST_GENERATION_KEY, 0)
+    return 'game-list:{}:{}'.format(generation, hashlib.md5(path.encode('utf-8')).hexdigest())
+
+
+def invalidate_game(pk):
+    """ Drops the cached responses showing the game `pk`. """
+    cache = response_cache()
+    if cache is None:
+        return
+    cache.delete(detail_key(pk))
+    try:
+        cache.incr(LIST_GENERATION_KEY)
+    except ValueError:
+        cache.set(LIST_GENERATION_KEY, 1, None)
@@ -0,0 +1,214 @@
+""" Boards materialized by chunks.
+
+    A chunked board is too big to be kept whole: it's split in square
+    chunks of `CHUNK_SIZE` cells per side and only the chunks reached by
+    the moves are kept in memory (and stored by `Game`). The mines of a
+    chunk are never stored, they are derived from the seed of the board
+    and the position of the chunk, so any chunk can be rebuilt at will.
+    `ChunkedBoard` is a `Board` whose cell values are looked up by chunk,
+    so the rules of the game are the same for both. What needs the whole
+    board at once (seeing or packing it) raises `WholeBoardError`.
+"""
+import random
+
+from .board import Board
+
+CHUNK_SIZE = 32
+CHUNK_CELLS = CHUNK_SIZE * CHUNK_SIZE
+# Mines per cell below which most reveals would cascade through
+# a big part of the board.
+MIN_DENSITY = 0.15
+# Mines per cell above which the seeds drawn for the first reveal
+# may never leave it and its neighbours clear (see `place_mines`):
+# at most, 1000 seeds all fail with a chance of about one in 10**9.
+MAX_DENSITY = 0.35
+
+# Mines of every chunk until the mines are placed
+_NO_MINES = bytes(CHUNK_CELLS)
+
+
+class WholeBoardError(Exception):
+    """ The whole board of a `ChunkedBoard` was needed at once. """
+
+
+def chunk_mines(seed, chunk_row, chunk_col, rows, columns, mines):
+    """ Mines of a chunk, pseudo-randomly placed from the seed of the
+        board and the position of the chunk. Every chunk gets its share
+        of the `mines` of the board (as if they were spread evenly over
+        the cells, taken chunk by chunk), so they add up exactly.
+
+    Args:
+        seed (int): Seed of the board.
+        chunk_row (int): Row of the chunk.
+        chunk_col (int): Column of the chunk.
+        rows (int): Number of rows of the board.
+        columns (int): Number of columns of the board.
+        mines (int): Number of mines of the board.
+    Returns:
+        bytearray: One 0/1 value per cell of the chunk (row by row,
+            `CHUNK_SIZE` cells per row). Cells out of the board are 0.
+    """
+    height = min(CHUNK_SIZE, rows - chunk_row * CHUNK_SIZE)
+    width = min(CHUNK_SIZE, columns - chunk_col * CHUNK_SIZE)
+    # Cells of the chunks before this one, row of chunks by row of chunks
+    before = chunk_row * CHUNK_SIZE * columns + height * chunk_col * CHUNK_SIZE
+    size = rows * columns
+    count = mines * (before + height * width) // size - mines * before // size
+    mine = bytearray(CHUNK_CELLS)
+    # A string seed is hashed the same way by every process
+    rng = random.Random('{}:{}:{}'.format(seed, chunk_row, chunk_col))
+    for pos in rng.sample(range(height * width), count):
+        mine[(pos // width) * CHUNK_SIZE + pos % width] = 1
+    return mine
+
+
+class _Layer(object):
+    """ One of the values of the cells of a `ChunkedBoard`, indexed
+        by the index of the cell like the bytearrays of a `Board`.
+    """
+    __slots__ = ('board', 'name')
+
+    def __init__(self, board, name):
+        self.board = board
+        self.name = name
+
+    def __getitem__(self, idx):
+        values, pos = self.board.locate(idx, self.name)
+        return values[pos]
+
+    def __setitem__(self, idx, value):
+        values, pos = self.board.locate(idx, self.name)
+        values[pos] = value
+        self.board.dirty.add(self.board.chunk_of(idx))
+
+
+class ChunkedBoard(Board):
+    """ A board of `rows` x `columns` cells materialized by chunks.
+        The mines of every chunk follow from `seed` (see `chunk_mines`).
+        The visible cells and signs of a chunk are given by `loader`,
+        called with the (row, column) of the chunk, that returns them
+        as two bytearrays (one value per cell of the chunk) or None if
+        the chunk was never stored. `dirty` are the chunks changed since.
+        `hidden_cells` are the cells without a mine still hidden (all of
+        them by default), kept by the reveals.
+    """
+    __slots__ = ('mines', 'seed', 'loader', 'hidden_cells', 'chunks', 'dirty', '_mines', '_counts')
+
+    def __init__(self, rows, columns, mines, seed, loader=None, mines_placed=True, hidden_cells=None):
+        self.rows = rows
+        self.columns = columns
+        self.mines = mines
+        self.seed = seed
+        self.hidden_cells = rows * columns - mines if hidden_cells is None else hidden_cells
+        self.loader = loader
+        self.mines_placed = mines_placed
+        # (row, column) of the chunk: {'visible': bytearray, 'sign': bytearray}
+        self.chunks = {}
+        self.dirty = set()
+        self._mines = {}
+        self._counts = {}
+        self.mine = _Layer(self, 'mine')
+        self.visible = _Layer(self, 'visible')
+        self.sign = _Layer(self, 'sign')
+        self.counts = _Layer(self, 'counts')
+
+    def chunk_of(self, idx):
+        """ (row, column) of the chunk of the cell `idx`. """
+        row, col = divmod(idx, self.columns)
+        return row // CHUNK_SIZE, col // CHUNK_SIZE
+
+    def locate(self, idx, name):
+        """ Values `name` of the chunk of the cell `idx` and position
+            of the cell in them.
+        """
+        row, col = divmod(idx, self.columns)
+        key = row // CHUNK_SIZE, col // CHUNK_SIZE
+        pos = (row % CHUNK_SIZE) * CHUNK_SIZE + col % CHUNK_SIZE
+        if name == 'mine':
+            return self.chunk_mines(key) if self.mines_placed else _NO_MINES, pos
+        if name == 'counts':
+            return self.chunk_counts(key), pos
+        return self.chunk(key)[name], pos
+
+    def chunk(self, key):
+        """ Visible cells and signs of the chunk `key`, loaded once. """
+        if key not in self.chunks:
+            stored = self.loader(*key) if self.loader else None
+            self.add_chunk(key, *(stored or (bytearray(CHUNK_CELLS), bytearray(CHUNK_CELLS))))
+        return self.chunks[key]
+
+    def add_chunk(self, key, visible, sign):
+        """ Loads the visible cells and signs of the chunk `key`. """
+        self.chunks[key] = {'visible': visible, 'sign': sign}
+
+    def chunk_mines(self, key):
+        if key not in self._mines:
+            self._mines[key] = chunk_mines(self.seed, key[0], key[1], self.rows, self.columns, self.mines)
+        return self._mines[key]
+
+    def chunk_counts(self, key):
+        """ Number of surronding mines of the cells of the chunk `key`,
+            looking into the neighbour chunks for the cells of its border.
+        """
+        if key not in self._counts:
+            first = key[0] * CHUNK_SIZE * self.columns + key[1] * CHUNK_SIZE
+            counts = bytearray(CHUNK_CELLS)
+            for row in range(min(CHUNK_SIZE, self.rows - key[0] * CHUNK_SIZE)):
+                for col in range(min(CHUNK_SIZE, self.columns - key[1] * CHUNK_SIZE)):
+                    idx = first + row * self.columns + col
+                    counts[row * CHUNK_SIZE + col] = sum(self.mine[nei] for nei in self.neighbours(idx))
+            self._counts[key] = counts
+        return self._counts[key]
+
+    def place_mines(self, mines=None, safe=(), rng=None):
+        """ Draws seeds until the `safe` cells are clear of mines
+            (or gives up after a while, unlikely up to `MAX_DENSITY`).
+            The mines of every chunk follow from the seed.
+        """
+        rng = rng or random
+        self.mines_placed = True
+        for _ in range(1000):
+            if not any(self.mine[idx] for idx in safe):
+                break
+            self.seed = rng.getrandbits(63)
+            self._mines.clear()
+        self._counts.clear()
+
+    @property
+    def flagged_mines(self):
+        """ Number of mines correctly flagged in the loaded chunks. """
+        return sum(1 for key, chunk in self.chunks.items()
+                   for pos, sign in enumerate(chunk['sign'])
+                   if sign == self.FLAGGED and self.chunk_mines(key)[pos])
+
+    def reveal(self, idx):
+        revealed = super(ChunkedBoard, self).reveal(idx)
+        self.hidden_cells -= sum(1 for cell in revealed if not self.mine[cell])
+        return revealed
+
+    @property
+    def is_solved(self):
+        """ Checks if every cell without a mine is visible, by the count
+            of the hidden ones (the board is never scanned whole).
+        """
+        return self.hidden_cells == 0
+
+    def chunk_view(self, chunk_row, chunk_col):
+        """ What a player sees of every cell of a chunk (see `cell_view`),
+            hidden for the cells out of the board.
+
+        Returns:
+            bytearray: One view value per cell of the chunk.
+        """
+        view = bytearray([self.VIEW_HIDDEN]) * CHUNK_CELLS
+        first = chunk_row * CHUNK_SIZE * self.columns + chunk_col * CHUNK_SIZE
+        for row in range(min(CHUNK_SIZE, self.rows - chunk_row * CHUNK_SIZE)):
+            for col in range(min(CHUNK_SIZE, self.columns - chunk_col * CHUNK_SIZE)):
+                view[row * CHUNK_SIZE + col] = self.cell_view(first + row * self.columns + col)
+        return view
+
+    def view(self):
+        raise WholeBoardError("Chunked boards are only seen by chunks (see `chunk_view`)")
+
+    def packed(self):
+        raise WholeBoardError("Chunked boards are stored by chunks")
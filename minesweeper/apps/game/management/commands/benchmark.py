@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from minesweeper.apps.game.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = ("Runs the game benchmarks. Every change is rolled back. "
+            "Fails if any case runs more queries than its budget.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help="Benchmarks to run (all by default): {}".format(
+            ', '.join(sorted(BENCHMARKS))))
+        parser.add_argument('--repeat', type=int, default=5, help="Runs of every case.")
+        parser.add_argument('--output', help="File where the results are saved as JSON.")
+
+    def handle(self, *args, **options):
+        names = options['names'] or sorted(BENCHMARKS)
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError("Unknown benchmarks: {}".format(', '.join(sorted(unknown))))
+
+        results = []
+        with transaction.atomic():
+            for name in names:
+                for result in BENCHMARKS[name](repeat=options['repeat']):
+                    results.append(result)
+                    line = ("{benchmark:<12} {case:<32} best {best:9.4f}s  mean {mean:9.4f}s  "
+                            "{queries:5} queries  {peak_memory:>12,} bytes").format(**result)
+                    if 'per_second' in result:
+                        line += "  {:10.1f}/s".format(result['per_second'])
+                    if result['queries'] > result['budget']:
+                        line += "  OVER BUDGET ({})".format(result['budget'])
+                    self.stdout.write(line)
+            transaction.set_rollback(True)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+
+        over = [result for result in results if result['queries'] > result['budget']]
+        if over:
+            raise CommandError("Query budget exceeded by: {}".format(', '.join(
+                '{benchmark} {case} ({queries} > {budget})'.format(**result) for result in over)))
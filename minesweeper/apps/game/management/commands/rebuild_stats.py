@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from minesweeper.apps.game.models import BoardStats, UserStats
+
+
+class Command(BaseCommand):
+    help = ("Rebuilds the stats of the users (and leaderboards) from their finished games. "
+            "Run it while no games are being finished, their results may be counted twice or not at all.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            UserStats.rebuild()
+            BoardStats.rebuild()
+        self.stdout.write("{} users, {} board sizes".format(UserStats.objects.count(), BoardStats.objects.count()))
@@ -0,0 +1,30 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from minesweeper.apps.game.models import PooledBoard
+
+
+class Command(BaseCommand):
+    help = "Tops up the pool of pre-generated boards (see BOARD_POOL_SIZES)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--depth', type=int, default=settings.BOARD_POOL_DEPTH,
+                            help="Boards kept ready for every size.")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Processes generating the boards (one per CPU by default).")
+        parser.add_argument('--loop', action='store_true', help="Keeps refilling the pool until stopped.")
+        parser.add_argument('--interval', type=float, default=5,
+                            help="Seconds between refills when looping.")
+
+    def handle(self, *args, **options):
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                added = PooledBoard.refill(depth=options['depth'], executor=executor)
+                for (rows, columns, mines), count in sorted(added.items()):
+                    self.stdout.write("{}x{}/{}: {} boards added".format(rows, columns, mines, count))
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
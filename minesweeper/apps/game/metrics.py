@@ -0,0 +1,75 @@
+""" Metrics of the games in the Prometheus text format.
+
+    The metrics are collected in the process that plays the games.
+    When the `prometheus_multiproc_dir` environment variable names a
+    directory (set by `gunicorn.conf.py`), every process writes its
+    metrics there and `/metrics` adds up those of all the workers.
+    The variable must be set before the first metric is created, so
+    it can't be changed by the settings.
+"""
+import os
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+from django.http import HttpResponse
+
+# Name of every move by its sign (see `Game.make_move`)
+MOVE_NAMES = {None: 'reveal', 'F': 'flag', '?': 'question', '': 'clear', 'C': 'chord'}
+# Upper bounds of the number of cells of the size classes of boards
+SIZE_CLASSES = (100, 1000, 10 ** 4, 10 ** 5, 10 ** 6)
+
+MOVE_SECONDS = Histogram(
+    'minesweeper_move_seconds', "Time to make and store a move, by move ('batch' for the moves sent at once)",
+    ['move'], buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+CASCADE_CELLS = Histogram(
+    'minesweeper_cascade_cells', "Cells revealed by a reveal",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 1000, 10 ** 4, 10 ** 5, 10 ** 6))
+BOARD_CREATION_SECONDS = Histogram(
+    'minesweeper_board_creation_seconds', "Time to create the board of a game, by size (see `size_class`)",
+    ['size'], buckets=(.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1))
+GAMES_FINISHED = Counter('minesweeper_games_finished', "Games finished, by result", ['result'])
+
+# Children of the labels known beforehand, so they aren't looked up by every move
+MOVE_TIMERS = {sign: MOVE_SECONDS.labels(name) for sign, name in MOVE_NAMES.items()}
+BATCH_TIMER = MOVE_SECONDS.labels('batch')
+
+
+def size_class(cells):
+    """ Label of the size of a board of `cells` cells: the first of
+        `SIZE_CLASSES` it doesn't exceed, 'more' if it exceeds them all.
+    """
+    for bound in SIZE_CLASSES:
+        if cells <= bound:
+            return str(bound)
+    return 'more'
+
+
+class ActiveGamesCollector(object):
+    """ Games being played, counted from the database when scraped
+        (the same for every process).
+    """
+    def collect(self):
+        from .models import Game
+        active = GaugeMetricFamily('minesweeper_active_games', "Games being played")
+        active.add_metric([], Game.objects.filter(status=Game.PLAYING).count())
+        yield active
+
+
+def registry():
+    """ Registry of the metrics of every process (or just this one if
+        `prometheus_multiproc_dir` is not set) and the active games.
+    """
+    scraped = CollectorRegistry()
+    if 'prometheus_multiproc_dir' in os.environ:
+        multiprocess.MultiProcessCollector(scraped)
+    else:
+        scraped.register(REGISTRY)
+    scraped.register(ActiveGamesCollector())
+    return scraped
+
+
+def metrics_view(request):
+    """ The metrics in the Prometheus text format. """
+    return HttpResponse(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
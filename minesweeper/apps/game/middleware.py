@@ -0,0 +1,168 @@
+""" Per-request instrumentation.
+
+    `RequestTimingMiddleware` counts the SQL queries of every request and
+    the time spent running them, measures the time of the view, of the
+    serializers and of the rendering, and sends them back as
+    `Server-Timing` headers (durations in milliseconds) and a JSON log
+    line of the `minesweeper.requests` logger. Requests slower than
+    `SLOW_REQUEST_THRESHOLD` also log the query shapes they repeat the
+    most. It's enabled by the `REQUEST_TIMING` setting; otherwise Django
+    drops it when loading the middleware, so it costs nothing.
+"""
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('minesweeper.requests')
+
+# Query shapes logged by a slow request
+TOP_QUERY_SHAPES = 5
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s")
+_VALUES = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_ROWS = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+
+_local = threading.local()
+
+
+def query_shape(sql):
+    """ The `sql` with its values left out, so the same query with other
+        values (or lists of values of another length) has the same shape.
+    """
+    shape = _VALUES.sub('(...)', _LITERALS.sub('?', sql))
+    return _ROWS.sub('(...)', shape)
+
+
+class RequestMetrics(object):
+    """ SQL queries and timings (in seconds) of a request. """
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        # SQL of the queries: [times run, total duration]
+        self.statements = {}
+        self.timings = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        """ Runs a query of the request (an execute wrapper, see
+            `django.db.backends.base.base.BaseDatabaseWrapper.execute_wrapper`).
+        """
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries += 1
+            self.sql_time += duration
+            statement = self.statements.setdefault(sql, [0, 0.0])
+            statement[0] += 1
+            statement[1] += duration
+
+    def query_shapes(self):
+        """ [shape, times run, total duration] of the queries of the
+            request by shape, the most run first.
+        """
+        shapes = {}
+        for sql, (count, duration) in self.statements.items():
+            shape = shapes.setdefault(query_shape(sql), [0, 0.0])
+            shape[0] += count
+            shape[1] += duration
+        return sorted(([shape] + values for shape, values in shapes.items()), key=lambda item: (-item[1], -item[2]))
+
+
+class timed(object):
+    """ Adds the time spent in the block to the timing `name` of the
+        request being instrumented, if any.
+    """
+    __slots__ = ('name', 'metrics', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.metrics = getattr(_local, 'metrics', None)
+        if self.metrics is not None:
+            self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        if self.metrics is not None:
+            self.metrics.timings[self.name] += time.perf_counter() - self.start
+
+
+def server_timing(metrics, total):
+    """ Value of the `Server-Timing` header of the `metrics` of a request. """
+    entries = ['db;dur={:.2f};desc="{} queries"'.format(metrics.sql_time * 1000, metrics.queries)]
+    entries.extend('{};dur={:.2f}'.format(name, metrics.timings[name] * 1000)
+                   for name in ('view', 'serializer', 'render') if name in metrics.timings)
+    entries.append('total;dur={:.2f}'.format(total * 1000))
+    return ', '.join(entries)
+
+
+class RequestTimingMiddleware(object):
+    """ Instruments every request (see the module). It should be the first
+        middleware so its total covers the others.
+    """
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = _local.metrics = RequestMetrics()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _local.metrics = None
+        total = time.perf_counter() - start
+        if hasattr(request, '_timing_view_start') and 'view' not in metrics.timings:
+            # Not rendered afterwards, the view ended with the response
+            metrics.timings['view'] = time.perf_counter() - request._timing_view_start
+        response['Server-Timing'] = server_timing(metrics, total)
+        self.log(request, response, metrics, total)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._timing_view_start = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        """ The view is over and the response is about to be rendered. """
+        metrics = getattr(_local, 'metrics', None)
+        if metrics is None or not hasattr(request, '_timing_view_start'):
+            return response
+        render_start = time.perf_counter()
+        metrics.timings['view'] = render_start - request._timing_view_start
+
+        def rendered(response):
+            metrics.timings['render'] += time.perf_counter() - render_start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def log(self, request, response, metrics, total):
+        line = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'db_ms': round(metrics.sql_time * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+        }
+        line.update(('{}_ms'.format(name), round(duration * 1000, 2)) for name, duration in metrics.timings.items())
+        if total < settings.SLOW_REQUEST_THRESHOLD:
+            logger.info(json.dumps(line, sort_keys=True))
+            return
+        line['slow'] = True
+        line['top_queries'] = [{'sql': shape, 'count': count, 'ms': round(duration * 1000, 2)}
+                               for shape, count, duration in metrics.query_shapes()[:TOP_QUERY_SHAPES]]
+        logger.warning(json.dumps(line, sort_keys=True))
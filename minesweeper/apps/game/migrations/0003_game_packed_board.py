@@ -0,0 +1,60 @@
+from django.db import migrations, models
+
+from minesweeper.apps.game import bitmap
+
+
+def cells_to_packed_board(apps, schema_editor):
+    """ Packs the legacy `Cell` rows of every game into the new fields. """
+    Game = apps.get_model('game', 'Game')
+    Cell = apps.get_model('game', 'Cell')
+    for game in Game.objects.filter(mine_map=b'').iterator():
+        size = game.rows * game.columns
+        mine, visible, sign = bytearray(size), bytearray(size), bytearray(size)
+        cells = Cell.objects.filter(game=game).values_list('row', 'column', 'mine', 'visible', 'sign')
+        for row, col, cell_mine, cell_visible, cell_sign in cells.iterator():
+            idx = row * game.columns + col
+            mine[idx], visible[idx], sign[idx] = cell_mine, cell_visible, cell_sign
+        Game.objects.filter(pk=game.pk).update(mine_map=bitmap.pack(mine),
+                                               visible_map=bitmap.pack(visible),
+                                               sign_map=bitmap.pack(sign, bits=2))
+
+
+def packed_board_to_cells(apps, schema_editor):
+    """ Recreates the `Cell` rows of the games without them. """
+    Game = apps.get_model('game', 'Game')
+    Cell = apps.get_model('game', 'Cell')
+    for game in Game.objects.exclude(mine_map=b'').filter(cells__isnull=True).iterator():
+        size = game.rows * game.columns
+        mine = bitmap.unpack(game.mine_map, size)
+        visible = bitmap.unpack(game.visible_map, size)
+        sign = bitmap.unpack(game.sign_map, size, bits=2)
+        Cell.objects.bulk_create(
+            Cell(game=game, row=idx // game.columns, column=idx % game.columns,
+                 mine=bool(mine[idx]), visible=bool(visible[idx]), sign=sign[idx])
+            for idx in range(size))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0002_game_finish_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='mine_map',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='sign_map',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='visible_map',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.RunPython(cells_to_packed_board, packed_board_to_cells),
+    ]
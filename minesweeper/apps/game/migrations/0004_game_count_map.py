@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+from minesweeper.apps.game import bitmap
+from minesweeper.apps.game.board import adjacent_mines
+
+
+def compute_count_map(apps, schema_editor):
+    """ Stores the number of surronding mines of every cell. """
+    Game = apps.get_model('game', 'Game')
+    for game in Game.objects.filter(count_map=b'').exclude(mine_map=b'').iterator():
+        mine = bitmap.unpack(game.mine_map, game.rows * game.columns)
+        counts = adjacent_mines(game.rows, game.columns, mine)
+        Game.objects.filter(pk=game.pk).update(count_map=bitmap.pack(counts, bits=4))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0003_game_packed_board'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='count_map',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.RunPython(compute_count_map, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations, models
+
+from minesweeper.apps.game.board import Board
+
+
+def compute_counters(apps, schema_editor):
+    """ Counts the hidden cells and flags of every game. """
+    Game = apps.get_model('game', 'Game')
+    for game in Game.objects.exclude(mine_map=b'').iterator():
+        board = Board.from_packed(game.rows, game.columns, game.mine_map,
+                                  game.visible_map, game.sign_map, game.count_map)
+        flags = bytearray(sign == Board.FLAGGED for sign in board.sign)
+        Game.objects.filter(pk=game.pk).update(
+            hidden_cells=sum(1 for m, v in zip(board.mine, board.visible) if not (m or v)),
+            flags=sum(flags),
+            flagged_mines=sum(1 for m, f in zip(board.mine, flags) if m and f))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0004_game_count_map'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='flagged_mines',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='flags',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='hidden_cells',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(compute_counters, migrations.RunPython.noop),
+    ]
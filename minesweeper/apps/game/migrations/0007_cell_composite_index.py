@@ -0,0 +1,28 @@
+# Generated by Django 2.1.15 on 2026-10-18 19:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0006_game_version'),
+    ]
+
+    # The composite index is created before the single column ones are dropped.
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='cell',
+            unique_together={('game', 'row', 'column')},
+        ),
+        migrations.AlterField(
+            model_name='cell',
+            name='column',
+            field=models.IntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='cell',
+            name='row',
+            field=models.IntegerField(),
+        ),
+    ]
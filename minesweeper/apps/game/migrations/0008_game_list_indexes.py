@@ -0,0 +1,59 @@
+# Generated by Django 2.1.15 on 2026-10-18 19:42
+
+from django.db import DatabaseError, migrations, models, transaction
+
+TRIGRAM_INDEX = 'game_name_trgm_idx'
+
+
+def create_trigram_index(apps, schema_editor):
+    """ Index for the `name__icontains` search of the game list.
+        Only on PostgreSQL and when the pg_trgm extension can be used.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    try:
+        with transaction.atomic(using=connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except DatabaseError:
+        # Not allowed to create the extension
+        return
+    schema_editor.execute('CREATE INDEX IF NOT EXISTS {} ON game_game '
+                          'USING gin (UPPER(name::text) gin_trgm_ops)'.format(TRIGRAM_INDEX))
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS {}'.format(TRIGRAM_INDEX))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0007_cell_composite_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='game',
+            name='name',
+            field=models.CharField(db_index=True, default='', max_length=128),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['-create_date', '-id'], name='game_create_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['user', '-create_date', '-id'], name='game_user_create_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['status', '-create_date', '-id'], name='game_status_create_idx'),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
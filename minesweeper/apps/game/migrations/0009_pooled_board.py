@@ -0,0 +1,28 @@
+# Generated by Django 2.1.15 on 2026-10-18 19:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0008_game_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PooledBoard',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rows', models.IntegerField()),
+                ('columns', models.IntegerField()),
+                ('mines', models.IntegerField()),
+                ('mine_map', models.BinaryField()),
+                ('count_map', models.BinaryField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pooledboard',
+            index=models.Index(fields=['rows', 'columns', 'mines', 'id'], name='pooled_board_size_idx'),
+        ),
+    ]
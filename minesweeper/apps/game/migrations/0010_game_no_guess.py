@@ -0,0 +1,18 @@
+# Generated by Django 2.1.15 on 2026-10-18 19:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0009_pooled_board'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='no_guess',
+            field=models.BooleanField(default=False),
+        ),
+    ]
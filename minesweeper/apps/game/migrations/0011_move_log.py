@@ -0,0 +1,71 @@
+# Generated by Django 2.1.15 on 2026-10-18 19:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def snapshot_games(apps, schema_editor):
+    """ The log of the games played so far starts with their current board. """
+    Game = apps.get_model('game', 'Game')
+    Snapshot = apps.get_model('game', 'Snapshot')
+    for game in Game.objects.exclude(visible_map=b'', sign_map=b'').iterator():
+        Snapshot.objects.create(game=game, seq=0, visible_map=game.visible_map, sign_map=game.sign_map)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0010_game_no_guess'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Move',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.IntegerField()),
+                ('row', models.IntegerField()),
+                ('column', models.IntegerField()),
+                ('sign', models.CharField(max_length=1, null=True)),
+                ('date', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Snapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.IntegerField()),
+                ('visible_map', models.BinaryField()),
+                ('sign_map', models.BinaryField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='move_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='seed',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='snapshot',
+            name='game',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='game.Game'),
+        ),
+        migrations.AddField(
+            model_name='move',
+            name='game',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='moves', to='game.Game'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='snapshot',
+            unique_together={('game', 'seq')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='move',
+            unique_together={('game', 'seq')},
+        ),
+        migrations.RunPython(snapshot_games, migrations.RunPython.noop),
+    ]
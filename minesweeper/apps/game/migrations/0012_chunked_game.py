@@ -0,0 +1,43 @@
+# Generated by Django 2.1.15 on 2026-10-18 20:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0011_move_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Chunk',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row', models.IntegerField()),
+                ('column', models.IntegerField()),
+                ('visible_map', models.BinaryField()),
+                ('sign_map', models.BinaryField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='chunked',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='game',
+            name='hidden_cells',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chunk',
+            name='game',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='game.Game'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='chunk',
+            unique_together={('game', 'row', 'column')},
+        ),
+    ]
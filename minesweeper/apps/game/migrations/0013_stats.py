@@ -0,0 +1,55 @@
+# Generated by Django 2.1.15 on 2026-10-18 20:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('auth', '0009_alter_user_last_name_max_length'),
+        ('game', '0012_chunked_game'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BoardStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rows', models.IntegerField()),
+                ('columns', models.IntegerField()),
+                ('mines', models.IntegerField()),
+                ('played', models.IntegerField(default=0)),
+                ('won', models.IntegerField(default=0)),
+                ('best_time', models.IntegerField(null=True)),
+                ('won_time', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('played', models.IntegerField(default=0)),
+                ('won', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='userstats',
+            index=models.Index(fields=['-won', 'user'], name='user_stats_won_idx'),
+        ),
+        migrations.AddField(
+            model_name='boardstats',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='board_stats', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='boardstats',
+            index=models.Index(fields=['rows', 'columns', 'mines', 'best_time', 'user'], name='board_stats_best_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='boardstats',
+            unique_together={('user', 'rows', 'columns', 'mines')},
+        ),
+    ]
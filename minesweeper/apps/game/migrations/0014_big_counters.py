@@ -0,0 +1,33 @@
+# Generated by Django 2.1.15 on 2026-10-18 20:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0013_stats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='boardstats',
+            name='mines',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='game',
+            name='flagged_mines',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='game',
+            name='flags',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='game',
+            name='mines',
+            field=models.BigIntegerField(default=10),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.1.15 on 2026-10-18 20:48
+
+from django.db import migrations, models
+
+
+def mark_placed_mines(apps, schema_editor):
+    """ The mines of a game were placed if it stored them, or (chunked
+        games, that never do) if it logged a reveal.
+    """
+    Game = apps.get_model('game', 'Game')
+    Game.objects.filter(chunked=False).exclude(mine_map=b'').update(mines_placed=True)
+    Game.objects.filter(chunked=True, moves__sign__isnull=True).update(mines_placed=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0014_big_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='mines_placed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_placed_mines, migrations.RunPython.noop),
+    ]
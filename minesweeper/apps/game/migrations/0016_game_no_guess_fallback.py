@@ -0,0 +1,18 @@
+# Generated by Django 2.1.15 on 2026-10-18 21:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0015_game_mines_placed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='no_guess_fallback',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,12 +1,53 @@
-import random
 import datetime
-import itertools
+import random
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 from django.conf import settings
-from django.db import models
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Count, Min, Q, Sum
 
 from rest_framework.reverse import reverse as api_reverse
 
+from minesweeper.apps.solver.generator import no_guess_seed
+
+from . import bitmap
+from .boardcache import board_cache
+from .cache import game_etag, invalidate_game
+from .board import Board, random_packed
+from .chunks import CHUNK_CELLS, ChunkedBoard
+from .metrics import BATCH_TIMER, BOARD_CREATION_SECONDS, CASCADE_CELLS, GAMES_FINISHED, MOVE_TIMERS, size_class
+
+_executor = None
+
+
+class StaleGame(Exception):
+    """ The game was changed by someone else since it was loaded. """
+
+
+class NoGuessSearch(Exception):
+    """ The first reveal of the cell `idx` of a no-guess `game` needs
+        its board searched, which the game was told to leave for later
+        (see `Game.search_no_guess`).
+    """
+    def __init__(self, game, idx):
+        super(NoGuessSearch, self).__init__("Game {} needs a no-guess board".format(game.pk))
+        self.game = game
+        self.idx = idx
+
+
+def no_guess_executor():
+    """ Pool of `NO_GUESS_WORKERS` processes shared by the games of this
+        process to generate no-guess boards, None to generate them in
+        this process.
+    """
+    global _executor
+    if _executor is None and settings.NO_GUESS_WORKERS:
+        _executor = ProcessPoolExecutor(max_workers=settings.NO_GUESS_WORKERS)
+    return _executor
+
+
 class Game(models.Model):
     """ Representation of the minesweeping game.
         It contains the data about a single game such as number of rows
@@ -25,7 +66,7 @@ class Game(models.Model):
     ]
 
     # General information
-    name            = models.CharField(max_length=128, default='')
+    name            = models.CharField(max_length=128, default='', db_index=True)
     user            = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     create_date     = models.DateTimeField(auto_now_add=True)
     finish_date     = models.DateTimeField(null=True)
@@ -36,21 +77,120 @@ class Game(models.Model):
     # Board data
     rows            = models.IntegerField(default=9)
     columns         = models.IntegerField(default=9)
-    mines           = models.IntegerField(default=10)
+    mines           = models.BigIntegerField(default=10)
+    # Every board can be solved without guessing from the first reveal
+    no_guess        = models.BooleanField(default=False)
+    # No board solved without guessing was found, so the first reveal
+    # placed a regular one (see `_place_mines`)
+    no_guess_fallback = models.BooleanField(default=False)
+    # The board is only materialized by chunks where the moves reach
+    # (see `Chunk`), so it can be as big as the integers allow.
+    chunked         = models.BooleanField(default=False)
+
+    # Packed board state (see `bitmap`): one bit per cell for mines and
+    # visibility, two bits per cell for the sign (Cell.SIGN_OPTIONS) and
+    # four bits per cell for the number of surronding mines.
+    # The mines are placed on the first reveal so `mine_map` and
+    # `count_map` are empty until then. Chunked games leave them all empty.
+    mine_map        = models.BinaryField(default=b'')
+    visible_map     = models.BinaryField(default=b'')
+    sign_map        = models.BinaryField(default=b'')
+    count_map       = models.BinaryField(default=b'')
+
+    # Counters kept up to date by every move
+    hidden_cells    = models.BigIntegerField(default=0)   # Cells without mine not yet revealed
+    flags           = models.BigIntegerField(default=0)
+    flagged_mines   = models.BigIntegerField(default=0)
+    move_count      = models.IntegerField(default=0)   # Sequence number of the last move (see `Move`)
+    # Incremented by every move (see `_save_move`)
+    version         = models.IntegerField(default=0)
+    # Seed of the mines placement (see `_place_mines`). Only boards
+    # taken from the pool are not derived from it. The mines of chunked
+    # games are always derived from it.
+    seed            = models.BigIntegerField(default=0)
+    # The first reveal placed the mines (before, the board has none)
+    mines_placed    = models.BooleanField(default=False)
+
+    # Packed field: (Board attribute, bits per cell)
+    PACKED_FIELDS = {
+        'mine_map': ('mine', 1),
+        'visible_map': ('visible', 1),
+        'sign_map': ('sign', 2),
+        'count_map': ('counts', 4),
+    }
+    # Counters incremented by a move.
+    COUNTER_FIELDS = ['hidden_cells', 'flags', 'flagged_mines', 'move_count']
+    # Fields written by a move.
+    MOVE_FIELDS = ['visible_map', 'sign_map', 'status', 'elapsed_time', 'finish_date', 'last_action']
+    # Fields also written by the move that places the mines.
+    MINE_FIELDS = ['mine_map', 'count_map', 'seed', 'mines_placed', 'no_guess_fallback']
+    # Moves between snapshots of the board (see `replay`).
+    SNAPSHOT_INTERVAL = 100
+
+    class Meta:
+        # Listing (see GameCursorPagination), optionally by owner or status
+        indexes = [
+            models.Index(fields=['-create_date', '-id'], name='game_create_idx'),
+            models.Index(fields=['user', '-create_date', '-id'], name='game_user_create_idx'),
+            models.Index(fields=['status', '-create_date', '-id'], name='game_status_create_idx'),
+        ]
+
+    def __init__(self, *args, **kwargs):
+        super(Game, self).__init__(*args, **kwargs)
+        self._board = None
+        # Index of the cells changed by the last move
+        self.changed_cells = []
+        # (row, column) of the chunks already stored
+        self._stored_chunks = set()
+        # The mines were placed by a move not saved yet
+        self._placed_mines = False
+        # Whether a first reveal searches its no-guess board, otherwise it
+        # raises `NoGuessSearch` unless it was found already (`no_guess_found`)
+        self.search_no_guess = True
+        self.no_guess_found = None
 
     @property
     def owner(self):
         return self.user
 
+    @property
+    def owner_id(self):
+        return self.user_id
+
+    @property
+    def board(self):
+        """ In-memory `Board` of the game.
+            It's loaded once and kept until the game is reloaded.
+            Chunked games get a `ChunkedBoard` that loads its chunks
+            when first used. Other boards are taken from the board cache
+            when it has the current one (see `boardcache`), otherwise the
+            packed fields are loaded if they were deferred.
+        """
+        if self._board is None and self.chunked:
+            self._board = ChunkedBoard(self.rows, self.columns, self.mines, self.seed, loader=self._load_chunk,
+                                       mines_placed=self.mines_placed,
+                                       hidden_cells=self.hidden_cells)
+        elif self._board is None:
+            cache = board_cache()
+            if cache is not None and self.pk:
+                self._board = cache.get(self.pk, game_etag(self.pk, self.version, self.last_action))
+            if self._board is None:
+                deferred = self.get_deferred_fields() & set(self.PACKED_FIELDS)
+                if deferred:
+                    self.refresh_from_db(fields=sorted(deferred))
+                self._board = Board.from_packed(self.rows, self.columns, self.mine_map,
+                                                self.visible_map, self.sign_map, self.count_map)
+        return self._board
+
     @property
     def remaining_mines(self):
         """ Count the remaining mines. """
-        return self.mines - sum(1 for cell in self.cells.filter(mine=True,sign=Cell.FLAGGED))
+        return self.mines - self.flagged_mines
 
     @property
     def is_solved(self):
         """ Checks if the game have been succesfully solved. """
-        return all((cell.visible or cell.mine) for cell in self.cells.all())
+        return self.hidden_cells == 0
 
     @property
     def played_time(self):
@@ -74,84 +214,106 @@ class Game(models.Model):
                 remaining_mines=self.remaining_mines,
                 status=self.status,
                 time=self.played_time)
-        for row in range(self.rows):
-            board_string += '\n'
-            for col in range(self.columns):
-                cell = Cell.objects.get(game=self,  row=row, column=col)
-                cell_str = str(cell)
-                if ' ' == cell_str:
-                    cell_str = str(self._count_surrounding_mines(cell))
-                board_string += cell_str
+        board_string += '\n' + self.board.as_ascii()
 
         return board_string
 
+    def refresh_from_db(self, using=None, fields=None):
+        super(Game, self).refresh_from_db(using, fields)
+        # Loading the deferred packed fields keeps the board in memory
+        if fields is None or not set(fields) <= set(self.PACKED_FIELDS):
+            self._board = None
+            self._stored_chunks = set()
+
     def save(self, *args, **kwargs):
         # Dirty hack in the save method to initialize a game on creation.
-        needs_initialization = False
-        if not self.pk:
-            needs_initialization = True
-        super(Game, self).save(*args, **kwargs)
-        if needs_initialization:
+        # The board is built in memory so the game is stored with one INSERT.
+        if not self.pk and not self.mine_map:
             self.initialize_game()
+            with transaction.atomic():
+                super(Game, self).save(*args, **kwargs)
+            invalidate_game(self.pk)
+            return
+        self._pack_board(kwargs.get('update_fields'))
+        super(Game, self).save(*args, **kwargs)
+        invalidate_game(self.pk)
+
+    def edit(self, **fields):
+        """ Changes the given `fields` of the game (its name) with an
+            UPDATE of just them, leaving the board and counters to the
+            moves. The version is incremented so moves loaded before are
+            tried again (see `_save_move`) and the ETags change. The game
+            is reloaded afterwards.
+        """
+        Game.objects.filter(pk=self.pk).update(version=models.F('version') + 1, **fields)
+        invalidate_game(self.pk)
+        self.refresh_from_db()
+
+    def delete(self, *args, **kwargs):
+        pk = self.pk
+        result = super(Game, self).delete(*args, **kwargs)
+        invalidate_game(pk)
+        if board_cache() is not None:
+            board_cache().delete(pk)
+        return result
+
+    def _pack_board(self, fields=None):
+        """ Writes the in-memory board back to the packed fields
+            (only to `fields` if given). The mines are left empty
+            until they are placed. Chunked games are stored by chunks
+            instead (see `_save_chunks`).
+        """
+        if self._board is not None and not self.chunked:
+            for field, (attr, bits) in self.PACKED_FIELDS.items():
+                if field in self.MINE_FIELDS and not self._board.mines_placed:
+                    setattr(self, field, b'')
+                elif fields is None or field in fields:
+                    setattr(self, field, bitmap.pack(getattr(self._board, attr), bits))
 
     def initialize_game(self):
         """
-        Creates an initializes the board game and
-        pseudo-randomly choces the mines location.
+        Creates an initializes an empty board game. The mines are
+        pseudo-randomly placed by the first reveal, away from the
+        revealed cell (see `_place_mines`). Until a move is made only
+        the size of the board is stored: its packed fields are left
+        empty (read as every cell hidden, see `bitmap.unpack`).
+        The board is only persisted if the game is already saved.
         """
-        if not self.id:
-            raise Exception("Game not saved")
-        cells = []
-        for row in range(self.rows):
-            for col in range(self.columns):
-                cells.append( Cell.objects.create(game=self, row=row, column=col))
-        for mine in random.sample(cells, self.mines):
-            mine.mine = True
-            mine.save()
+        start = time.perf_counter()
+        if self.chunked and self.pk:
+            self.chunks.all().delete()
+        if self.pk and board_cache() is not None:
+            board_cache().delete(self.pk)
+        self._board = None
+        self._stored_chunks = set()
+        for field in self.PACKED_FIELDS:
+            setattr(self, field, b'')
+        self.hidden_cells = self.rows * self.columns - self.mines
+        self.flags = self.flagged_mines = 0
+        self.seed = secrets.randbits(63)
+        self.mines_placed = self.no_guess_fallback = False
+        BOARD_CREATION_SECONDS.labels(size_class(self.rows * self.columns)).observe(time.perf_counter() - start)
+        if self.pk:
+            super(Game, self).save(update_fields=list(self.PACKED_FIELDS) + self.COUNTER_FIELDS +
+                                   ['seed', 'mines_placed', 'no_guess_fallback'])
 
     def game_won(self):
         """ Changes status of the game to WON GAME.
             Kudos!
         """
-        self.elapsed_time = self.played_time
+        self.elapsed_time = int(self.played_time)
         self.status = self.WON
         self.finish_date = datetime.datetime.now(datetime.timezone.utc)
-        self.save()
+        invalidate_game(self.pk)
 
     def game_lost(self):
         """ Changes status of the game to LOST GAME.
             Best luck for the next game!
         """
         self.status = self.LOST
-        self.elapsed_time = self.played_time
+        self.elapsed_time = int(self.played_time)
         self.finish_date = datetime.datetime.now(datetime.timezone.utc)
-        self.save()
-
-    def _get_surronding_cells(self, cell):
-        """ Yields surronding cells taking care of "borders". """
-        for r, c in itertools.product(range(cell.row-1, cell.row+2), range(cell.column-1, cell.column+2)):
-            if ((r == cell.row and c == cell.column)
-                    or r + 1 > self.rows
-                    or c + 1 > self.columns
-                    or r < 0 or c < 0):
-                continue
-            yield Cell.objects.get(game=self, row=r, column=c)
-
-    def _count_surrounding_mines(self, cell):
-        """ Count the surronding cells that have mines. """
-        return sum(1 for cell in self._get_surronding_cells(cell) if cell.mine)
-
-    def _reveal_cell(self, cell):
-        """ Reveals the cell in position (row,col) if is not
-        already visible else no action is taken.
-        When a cell with no adjacent mines is revealed, all adjacent cells will be revealed (and repeat)
-        """
-        if not cell.visible:
-           cell.visible = True
-           cell.save()
-           if 0 == self._count_surrounding_mines(cell):
-               for nei in self._get_surronding_cells(cell):
-                   self._reveal_cell(nei)
+        invalidate_game(self.pk)
 
     def make_move(self, row, col, sign=None):
         """ Make a move in the minesweeper's game.
@@ -163,6 +325,15 @@ class Game(models.Model):
           have been marked witha a question mark.
         - If sign is '' it indicates that the cell (row, col)
           have been cleared of any markings.
+        - If sign is 'C' it indicates a chord on the revealed cell
+          (row, col): when as many neighbours as its number are flagged,
+          every other hidden neighbour is revealed.
+
+        The whole board is updated in memory and stored with
+        a single write inside a transaction, that also increments
+        the counters of the game and appends the move to its log
+        (see `Move`). The cells changed by the move are left in
+        `changed_cells`.
 
         Args:
             row (int): The first parameter.
@@ -172,42 +343,527 @@ class Game(models.Model):
         Returns:
             bool: True if a valid move was made, False otherwise.
         """
-        cell = Cell.objects.get(game=self, row=row, column=col)
-        if sign is None:
-            if cell.mine:
-                cell.visible = True
-                cell.save()
+        start = time.perf_counter()
+        counters = self._apply_move(row, col, sign)
+        if counters is None:
+            return False
+        self._save_move(counters, [(row, col, sign)])
+        MOVE_TIMERS[sign].observe(time.perf_counter() - start)
+        return True
+
+    def make_moves(self, moves):
+        """ Makes several moves (see `make_move`) in order and stores
+            the result with a single write. It stops when the game ends.
+
+        Args:
+            moves (list): (row, col, sign) tuples.
+        Returns:
+            list: For every move made, the (index, view) of the cells
+                it changed (see `Board.cell_view`) or None if the move
+                was not valid.
+        """
+        start = time.perf_counter()
+        total = dict.fromkeys(self.COUNTER_FIELDS, 0)
+        changes = []
+        played = []
+        for row, col, sign in moves:
+            if self.status != self.PLAYING:
+                break
+            counters = self._apply_move(row, col, sign)
+            if counters is None:
+                changes.append(None)
+                continue
+            changes.append([(idx, self.board.cell_view(idx)) for idx in self.changed_cells])
+            played.append((row, col, sign))
+            for field, delta in counters.items():
+                total[field] += delta
+        if played:
+            self._save_move(total, played)
+            BATCH_TIMER.observe(time.perf_counter() - start)
+        return changes
+
+    def _apply_move(self, row, col, sign):
+        """ Applies a move to the in-memory board and counters.
+
+        Returns:
+            dict: The delta of every counter, None if the sign is not valid.
+        """
+        board = self.board
+        idx = board.index(row, col)
+        counters = dict.fromkeys(self.COUNTER_FIELDS, 0)
+        counters['move_count'] = 1
+        self.changed_cells = [idx]
+        if sign is None and not board.mines_placed:
+            counters['flagged_mines'] = self._place_mines(idx)
+            self.mines_placed = self._placed_mines = True
+        if sign is None or sign == board.CHORD:
+            revealed = board.reveal(idx) if sign is None else board.chord(idx)
+            self.changed_cells = revealed
+            if sign is None:
+                CASCADE_CELLS.observe(len(revealed))
+            exploded = sum(board.mine[cell] for cell in revealed)
+            counters['hidden_cells'] = exploded - len(revealed)
+            if exploded:
                 self.game_lost()
-            else:
-                self._reveal_cell(cell)
-                if self.is_solved:
-                    self.game_won()
-        elif sign == 'F':
-            cell.sign = cell.FLAGGED
-            cell.save()
-            if self.is_solved:
-                self.game_won()
-        elif sign == '?':
-            cell.sign = cell.Q_MARK
-            cell.save()
-        elif sign == '':
-            cell.sign = CELL.NO_SIGN
-            cell.save()
+        elif sign in board.SIGNS:
+            previous = board.mark(idx, sign)
+            flagged = (board.sign[idx] == board.FLAGGED) - (previous == board.FLAGGED)
+            counters['flags'] = flagged
+            counters['flagged_mines'] = flagged * board.mine[idx]
         else:
-            return False
+            self.changed_cells = []
+            return None
 
-        return True
+        for field, delta in counters.items():
+            setattr(self, field, getattr(self, field) + delta)
+        if self.status == self.PLAYING and self.is_solved:
+            self.game_won()
+        return counters
+
+    def _place_mines(self, idx):
+        """ Places the mines of the board away from the first revealed
+            cell `idx` and its neighbours, so the first reveal is always
+            safe and opens some room (or just away from `idx` if the
+            board is too crowded).
+            The mines are placed pseudo-randomly from `seed`, except
+            for the boards of the sizes in `BOARD_POOL_SIZES`, that are
+            taken from the pool when available (moving the mines out
+            of the safe cells). No-guess games get the seed of a board
+            that can be solved without guessing from `idx`, if one is found.
+            Chunked games draw seeds until the safe cells are clear.
+
+        Returns:
+            int: Number of flagged cells that got a mine.
+        """
+        board = self.board
+        safe = [idx] + list(board.neighbours(idx))
+        if board.size - len(safe) < self.mines:
+            safe = [idx]
+        ready = None
+        if self.chunked:
+            # Flags may have been placed on chunks not loaded yet
+            for chunk in self.chunks.all():
+                if (chunk.row, chunk.column) not in board.chunks:
+                    self._stored_chunks.add((chunk.row, chunk.column))
+                    board.add_chunk((chunk.row, chunk.column), *chunk.unpacked())
+            board.place_mines(self.mines, safe, rng=random.Random(self.seed))
+            self.seed = board.seed
+            return board.flagged_mines
+        if self.no_guess:
+            found = self.no_guess_found
+            if found is None or found[:4] != (self.rows, self.columns, self.mines, idx):
+                if not self.search_no_guess:
+                    raise NoGuessSearch(self, idx)
+                found = self.find_no_guess_seed(idx)
+            if found[4] is not None:
+                self.seed = found[4]
+            self.no_guess_fallback = found[4] is None
+        elif (self.rows, self.columns, self.mines) in settings.BOARD_POOL_SIZES:
+            ready = PooledBoard.claim(self.rows, self.columns, self.mines)
+            if ready is not None:
+                ready.move_mines(safe, rng=random.Random(self.seed))
+        if ready is None:
+            board.place_mines(self.mines, safe, rng=random.Random(self.seed))
+        else:
+            ready.visible, ready.sign = board.visible, board.sign
+            self._board = board = ready
+        return sum(1 for m, s in zip(board.mine, board.sign) if m and s == board.FLAGGED)
+
+    def find_no_guess_seed(self, idx):
+        """ Searches the seed of a board that can be solved without
+            guessing from the first reveal of the cell `idx`, kept in
+            `no_guess_found` for that reveal. It can take a while, so
+            games played locked search it before (see `NoGuessSearch`).
+
+        Returns:
+            tuple: The rows, columns and mines of the board, `idx` and
+                the seed (None if no board was found).
+        """
+        seed = no_guess_seed(self.rows, self.columns, self.mines, idx,
+                             executor=no_guess_executor(), rng=random.Random(self.seed))
+        self.no_guess_found = (self.rows, self.columns, self.mines, idx, seed)
+        return self.no_guess_found
+
+    def _save_move(self, counters, moves):
+        """ Stores the board and status of the game with a single UPDATE.
+            The counters, already updated in memory, are incremented
+            by the given deltas in the database (F-expressions).
+            The UPDATE only succeeds if the game is still in the `version`
+            it was loaded (compare-and-swap), otherwise `StaleGame` is raised
+            and the game must be loaded again.
+            The (row, col, sign) `moves` made are appended to the log
+            in the same transaction, and the result of the game to the
+            stats of its user if they ended it. The board is written through to the
+            board cache and the cached responses of the game are dropped
+            (see `boardcache` and `cache`).
+        """
+        fields = list(self.MOVE_FIELDS)
+        if self.chunked:
+            fields += ['seed', 'mines_placed'] if self._placed_mines else ['seed']
+        elif self._placed_mines:
+            fields += self.MINE_FIELDS
+        self._pack_board(fields)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if self.status == self.PLAYING:
+            # The time played since the last action is added up in whole
+            # seconds, the rest is counted from the last action onwards
+            seconds = int((now - self.last_action).total_seconds())
+            self.elapsed_time += seconds
+            now = self.last_action + datetime.timedelta(seconds=seconds)
+        self.last_action = now
+        values = {field: getattr(self, field) for field in fields}
+        for field, delta in counters.items():
+            values[field] = models.F(field) + delta
+        values['version'] = models.F('version') + 1
+        with transaction.atomic():
+            updated = Game.objects.filter(pk=self.pk, version=self.version).update(**values)
+            if not updated:
+                raise StaleGame("Game {} was changed by another move".format(self.pk))
+            if self.chunked:
+                self._save_chunks()
+            self._log_moves(moves)
+            # Moves are refused once the game is over, so these ended it
+            if self.status in (self.WON, self.LOST):
+                UserStats.record(self)
+                BoardStats.record(self)
+        self.version += 1
+        self._placed_mines = False
+        if self.status == self.WON:
+            GAMES_FINISHED.labels('won').inc()
+        elif self.status == self.LOST:
+            GAMES_FINISHED.labels('lost').inc()
+        cache = board_cache()
+        if cache is not None and not self.chunked:
+            cache.set(self.pk, game_etag(self.pk, self.version, self.last_action), self.board)
+        invalidate_game(self.pk)
+
+    def _load_chunk(self, row, column):
+        """ Visible cells and signs of the chunk (row, column) of a
+            chunked game, None if it was never stored (see `ChunkedBoard`).
+        """
+        chunk = self.chunks.filter(row=row, column=column).first()
+        if chunk is None:
+            return None
+        self._stored_chunks.add((row, column))
+        return chunk.unpacked()
+
+    def _save_chunks(self):
+        """ Stores the chunks changed by the last moves: the new ones
+            with a single INSERT and an UPDATE for every other one.
+        """
+        board = self.board
+        new = []
+        for key in sorted(board.dirty):
+            chunk = board.chunks[key]
+            values = {'visible_map': bitmap.pack(chunk['visible']), 'sign_map': bitmap.pack(chunk['sign'], 2)}
+            if key in self._stored_chunks:
+                Chunk.objects.filter(game=self, row=key[0], column=key[1]).update(**values)
+            else:
+                new.append(Chunk(game=self, row=key[0], column=key[1], **values))
+        Chunk.objects.bulk_create(new)
+        self._stored_chunks |= board.dirty
+        board.dirty = set()
+
+    def _log_moves(self, moves):
+        """ Appends the last `moves` to the log of the game, with a
+            snapshot of the board every `SNAPSHOT_INTERVAL` moves
+            (chunked games have no snapshots).
+        """
+        first = self.move_count - len(moves)
+        Move.objects.bulk_create([
+            Move(game=self, seq=seq, row=row, column=col, sign=sign, date=self.last_action)
+            for seq, (row, col, sign) in enumerate(moves, first + 1)])
+        if not self.chunked and first // self.SNAPSHOT_INTERVAL != self.move_count // self.SNAPSHOT_INTERVAL:
+            Snapshot.objects.create(game=self, seq=self.move_count,
+                                    visible_map=self.visible_map, sign_map=self.sign_map)
+
+    def replay(self, seq):
+        """ Rebuilds the board of the game as it was right after the
+            move `seq` (0 for the board before any move): the moves
+            are played again from the latest snapshot before it.
+            The mines are the ones of the game once the first reveal
+            placed them. Chunked games are always replayed from the start.
+
+        Args:
+            seq (int): Sequence number of the move (see `Move`).
+        Returns:
+            Board: The board after the move.
+        Raises:
+            ValueError: If the game has no move `seq`.
+        """
+        if not 0 <= seq <= self.move_count:
+            raise ValueError("Game {} has no move {}".format(self.pk, seq))
+        if self.chunked:
+            snapshot = None
+            board = ChunkedBoard(self.rows, self.columns, self.mines, self.seed)
+        else:
+            snapshot = self.snapshots.filter(seq__lte=seq).order_by('-seq').first()
+            board = Board.from_packed(self.rows, self.columns, self.mine_map,
+                                      snapshot.visible_map if snapshot else b'',
+                                      snapshot.sign_map if snapshot else b'', self.count_map)
+        placed = snapshot is not None and any(board.visible)
+        for move in self.moves.filter(seq__gt=snapshot.seq if snapshot else 0, seq__lte=seq).order_by('seq'):
+            idx = board.index(move.row, move.column)
+            if move.sign is None:
+                placed = True
+                board.reveal(idx)
+            elif move.sign == board.CHORD:
+                board.chord(idx)
+            else:
+                board.mark(idx, move.sign)
+        if self.chunked:
+            board.mines_placed = placed
+        elif not placed:
+            board = Board(self.rows, self.columns, visible=board.visible, sign=board.sign,
+                          counts=bytearray(board.size), mines_placed=False)
+        return board
 
     def get_api_url(self, request=None):
         return api_reverse("game-api:game-detail", kwargs={'id': self.id}, request=request)
 
 
+class Move(models.Model):
+    """ A move of a game (see `Game.make_move`). The moves of a game
+        are only ever appended, numbered from 1 by `seq`.
+    """
+    game            = models.ForeignKey('game.Game', on_delete=models.CASCADE, related_name='moves')
+    seq             = models.IntegerField()
+    row             = models.IntegerField()
+    column          = models.IntegerField()
+    sign            = models.CharField(max_length=1, null=True)     # None for a reveal
+    date            = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('game', 'seq')
+
+
+class Snapshot(models.Model):
+    """ The visible cells and signs of the board of a game right
+        after the move `seq`, so replays start close to any move.
+    """
+    game            = models.ForeignKey('game.Game', on_delete=models.CASCADE, related_name='snapshots')
+    seq             = models.IntegerField()
+    # Packed as in `Game`
+    visible_map     = models.BinaryField()
+    sign_map        = models.BinaryField()
+
+    class Meta:
+        unique_together = ('game', 'seq')
+
+
+class Chunk(models.Model):
+    """ The visible cells and signs of a chunk of the board of a
+        chunked game (see `ChunkedBoard`). Chunks are only stored
+        once a move changes them, so the storage of a game grows
+        with the explored part of its board.
+    """
+    game            = models.ForeignKey('game.Game', on_delete=models.CASCADE, related_name='chunks')
+    # Position of the chunk, in chunks
+    row             = models.IntegerField()
+    column          = models.IntegerField()
+    # Packed as in `Game`, `CHUNK_SIZE` cells per row
+    visible_map     = models.BinaryField()
+    sign_map        = models.BinaryField()
+
+    class Meta:
+        unique_together = ('game', 'row', 'column')
+
+    def unpacked(self):
+        """ Visible cells and signs of the chunk, one value per cell. """
+        return (bitmap.unpack(self.visible_map, CHUNK_CELLS),
+                bitmap.unpack(self.sign_map, CHUNK_CELLS, bits=2))
+
+
+class PooledBoard(models.Model):
+    """ Mines of a pre-generated board, ready to be used by a new game.
+        The pool is kept topped up by the `refill_board_pool`
+        management command so games don't pay for the generation.
+    """
+    rows            = models.IntegerField()
+    columns         = models.IntegerField()
+    mines           = models.IntegerField()
+    # Packed as in `Game`
+    mine_map        = models.BinaryField()
+    count_map       = models.BinaryField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['rows', 'columns', 'mines', 'id'], name='pooled_board_size_idx'),
+        ]
+
+    @classmethod
+    def claim(cls, rows, columns, mines):
+        """ Takes a board of the given size out of the pool.
+            Where supported the rows locked by other claims are
+            skipped, so concurrent claims don't wait for each other.
+
+        Returns:
+            Board: The board with its mines placed, None if the pool
+                is empty.
+        """
+        boards = cls.objects.filter(rows=rows, columns=columns, mines=mines).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            boards = boards.select_for_update(skip_locked=True)
+        with transaction.atomic():
+            pooled = boards.first()
+            # Without locks another claim may have taken it first
+            if pooled is None or not cls.objects.filter(pk=pooled.pk).delete()[0]:
+                return None
+        return Board.from_packed(rows, columns, pooled.mine_map, b'', b'', pooled.count_map)
+
+    @classmethod
+    def refill(cls, depth=None, sizes=None, executor=None, batch=50):
+        """ Tops up the pool to `depth` boards of every size.
+
+        Args:
+            depth (int, optional): Defaults to `BOARD_POOL_DEPTH`.
+            sizes (list, optional): Defaults to `BOARD_POOL_SIZES`.
+                    (rows, columns, mines) of the boards.
+            executor (Executor, optional): Generates the boards, in
+                    batches of `batch` boards (e.g. a ProcessPoolExecutor).
+                    By default they are generated in this process.
+        Returns:
+            dict: Number of boards added for every size.
+        """
+        depth = settings.BOARD_POOL_DEPTH if depth is None else depth
+        sizes = settings.BOARD_POOL_SIZES if sizes is None else sizes
+        jobs = {}
+        for rows, columns, mines in sizes:
+            missing = depth - cls.objects.filter(rows=rows, columns=columns, mines=mines).count()
+            for start in range(0, max(missing, 0), batch):
+                args = (rows, columns, mines, min(batch, missing - start))
+                jobs.setdefault((rows, columns, mines), []).append(
+                    executor.submit(random_packed, *args) if executor else random_packed(*args))
+
+        added = {}
+        for (rows, columns, mines), results in jobs.items():
+            boards = [cls(rows=rows, columns=columns, mines=mines, mine_map=mine_map, count_map=count_map)
+                      for result in results
+                      for mine_map, count_map in (result.result() if executor else result)]
+            cls.objects.bulk_create(boards, batch_size=batch)
+            added[(rows, columns, mines)] = len(boards)
+        return added
+
+
+def _add_to_stats(model, lookup, values):
+    """ Adds to the stats of `model` given by `lookup` the `values`
+        (F-expressions), creating them if they're missing.
+    """
+    if model.objects.filter(**lookup).update(**values):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup)
+    except IntegrityError:
+        # Created meanwhile by the end of another game
+        pass
+    model.objects.filter(**lookup).update(**values)
+
+
+class UserStats(models.Model):
+    """ Games finished by a user, of every board size (see `BoardStats`).
+        They are updated by the move that ends every game (see
+        `Game._save_move`) and rebuilt from the games by `rebuild`.
+    """
+    user            = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+                                           related_name='stats')
+    played          = models.IntegerField(default=0)
+    won             = models.IntegerField(default=0)
+
+    class Meta:
+        # Leaderboard of the games won (see `LeaderboardView`)
+        indexes = [
+            models.Index(fields=['-won', 'user'], name='user_stats_won_idx'),
+        ]
+
+    @property
+    def lost(self):
+        return self.played - self.won
+
+    @classmethod
+    def record(cls, game):
+        """ Adds the result of a finished `game`. """
+        _add_to_stats(cls, {'user_id': game.user_id},
+                      {'played': models.F('played') + 1, 'won': models.F('won') + int(game.status == Game.WON)})
+
+    @classmethod
+    def rebuild(cls):
+        """ Replaces the stats of every user with those of their finished games. """
+        cls.objects.all().delete()
+        finished = Game.objects.filter(status__in=[Game.WON, Game.LOST]).order_by()
+        cls.objects.bulk_create(
+            cls(user_id=stats['user'], played=stats['played'], won=stats['won'])
+            for stats in finished.values('user').annotate(played=Count('id'),
+                                                          won=Count('id', filter=Q(status=Game.WON))))
+
+
+class BoardStats(models.Model):
+    """ Games finished by a user on a board size, updated and rebuilt
+        as `UserStats`. Times are in seconds.
+    """
+    user            = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='board_stats')
+    rows            = models.IntegerField()
+    columns         = models.IntegerField()
+    mines           = models.BigIntegerField()
+    played          = models.IntegerField(default=0)
+    won             = models.IntegerField(default=0)
+    # Time of the fastest game won, None until one is won
+    best_time       = models.IntegerField(null=True)
+    # Time of every game won, added up
+    won_time        = models.BigIntegerField(default=0)
+
+    class Meta:
+        # Also the board sizes of a user (see `UserBoardStatsView`)
+        unique_together = ('user', 'rows', 'columns', 'mines')
+        # Leaderboard of the best times of a board size (see `BoardLeaderboardView`)
+        indexes = [
+            models.Index(fields=['rows', 'columns', 'mines', 'best_time', 'user'], name='board_stats_best_idx'),
+        ]
+
+    @property
+    def lost(self):
+        return self.played - self.won
+
+    @property
+    def average_time(self):
+        """ Average time of the games won, None if none was won. """
+        return self.won_time / self.won if self.won else None
+
+    @classmethod
+    def record(cls, game):
+        """ Adds the result of a finished `game`. """
+        values = {'played': models.F('played') + 1}
+        if game.status == Game.WON:
+            seconds = int(game.elapsed_time)
+            values.update(won=models.F('won') + 1, won_time=models.F('won_time') + seconds,
+                          best_time=models.Case(models.When(best_time__lte=seconds, then=models.F('best_time')),
+                                                default=models.Value(seconds)))
+        _add_to_stats(cls, {'user_id': game.user_id, 'rows': game.rows, 'columns': game.columns,
+                            'mines': game.mines}, values)
+
+    @classmethod
+    def rebuild(cls):
+        """ Replaces the stats of every user with those of their finished games. """
+        cls.objects.all().delete()
+        finished = Game.objects.filter(status__in=[Game.WON, Game.LOST]).order_by()
+        won = Q(status=Game.WON)
+        cls.objects.bulk_create(
+            cls(user_id=stats['user'], rows=stats['rows'], columns=stats['columns'], mines=stats['mines'],
+                played=stats['played'], won=stats['won'], best_time=stats['best_time'],
+                won_time=stats['won_time'] or 0)
+            for stats in finished.values('user', 'rows', 'columns', 'mines').annotate(
+                played=Count('id'), won=Count('id', filter=won), best_time=Min('elapsed_time', filter=won),
+                won_time=Sum('elapsed_time', filter=won)))
+
 
 class Cell(models.Model):
     """ Representation of the cell of a minessweeper game.
         The class works as a container and just holds
         the status of each cell. No logic should be placed
         here.
+
+        NOTE: Boards are now stored packed in `Game`. Cell rows
+        are no longer created and are kept only for legacy games.
     """
     NO_SIGN = 0
     Q_MARK  = 1
@@ -221,9 +877,14 @@ class Cell(models.Model):
     mine = models.BooleanField(default=False)
     visible = models.BooleanField(default=False)
     sign = models.IntegerField(choices=SIGN_OPTIONS, default=NO_SIGN)
+    # Cells are always looked up by (game, row, column) so they
+    # are covered by a single composite index.
     game = models.ForeignKey('game.Game', on_delete=models.CASCADE, related_name='cells')
-    row = models.IntegerField(db_index=True)
-    column = models.IntegerField(db_index=True)
+    row = models.IntegerField()
+    column = models.IntegerField()
+
+    class Meta:
+        unique_together = ('game', 'row', 'column')
 
     def __str__(self):
         if self.sign == self.Q_MARK:
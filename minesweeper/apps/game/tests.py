@@ -1,3 +1,900 @@
-from django.test import TestCase
+import datetime
+import io
+import os
+import random
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from prometheus_client import REGISTRY
+
+from minesweeper.apps.game import bitmap
+from minesweeper.apps.game.benchmarks import BENCHMARKS
+from minesweeper.apps.game.board import Board, adjacent_mines
+from minesweeper.apps.game.boardcache import FileBoardCache, LocMemBoardCache, board_cache
+from minesweeper.apps.game.chunks import CHUNK_SIZE, MAX_DENSITY, ChunkedBoard, WholeBoardError, chunk_mines
+from minesweeper.apps.game.metrics import registry, size_class
+from minesweeper.apps.game.models import BoardStats, Chunk, Game, Cell, PooledBoard, StaleGame, UserStats
+from minesweeper.apps.solver.generator import is_solvable
+
+User = get_user_model()
+
+
+class BitmapTestCase(TestCase):
+    def test_round_trip(self):
+        """ Packing and unpacking gives back the same values
+        """
+        for bits in (1, 2, 4):
+            values = bytes(i % (1 << bits) for i in range(103))
+            packed = bitmap.pack(values, bits)
+            self.assertEqual(len(packed), bitmap.packed_size(103, bits))
+            self.assertEqual(bitmap.unpack(packed, 103, bits), bytearray(values))
+
+    def test_empty_blob(self):
+        """ An empty blob is read as an all zeros board
+        """
+        self.assertEqual(bitmap.unpack(b'', 10), bytearray(10))
+
+
+def board_from_layout(layout):
+    """ Creates a board from a list of strings where '*' is a mine. """
+    mine = bytearray(c == '*' for row in layout for c in row)
+    return Board(len(layout), len(layout[0]), mine=mine)
+
+
+class BoardTestCase(SimpleTestCase):
+    def test_neighbours(self):
+        """ Neighbours take care of the borders of the board
+        """
+        board = Board(3, 4)
+        self.assertEqual(sorted(board.neighbours(0)), [1, 4, 5])
+        self.assertEqual(sorted(board.neighbours(7)), [2, 3, 6, 10, 11])
+        self.assertEqual(sorted(board.neighbours(5)), [0, 1, 2, 4, 6, 8, 9, 10])
+        with self.assertRaises(IndexError):
+            board.index(3, 0)
+
+    def test_adjacent_mines(self):
+        """ Counts are the same with and without NumPy
+        """
+        layout = ['*..*.',
+                  '.*...',
+                  '...**']
+        expected = bytearray([1, 2, 2, 0, 1,
+                              2, 1, 3, 3, 3,
+                              1, 1, 2, 1, 1])
+        board = board_from_layout(layout)
+        self.assertEqual(board.counts, expected)
+        with mock.patch('minesweeper.apps.game.board.numpy', None):
+            self.assertEqual(adjacent_mines(board.rows, board.columns, board.mine), expected)
+            board = Board.random(37, 23, 200)
+            self.assertEqual(board.counts, bytearray(sum(board.mine[nei] for nei in board.neighbours(idx))
+                                                     for idx in range(board.size)))
+
+    def test_random(self):
+        board = Board.random(10, 10, 30)
+        self.assertEqual(sum(board.mine), 30)
+
+    def test_reveal(self):
+        """ Revealing a cell without surrounding mines opens its neighbours
+        """
+        board = board_from_layout(['..*.',
+                                   '....',
+                                   '....'])
+        revealed = board.reveal(board.index(2, 0))
+        self.assertEqual(len(revealed), 10)
+        self.assertEqual(board.as_ascii(), '01xx\n0111\n0000')
+        self.assertFalse(board.is_solved)
+        self.assertEqual(board.reveal(board.index(0, 3)), [3])
+        self.assertTrue(board.is_solved)
+
+    def test_reveal_without_mines(self):
+        """ A board without mines is opened with a single reveal
+            (and no recursion limit is hit)
+        """
+        board = Board(300, 300)
+        revealed = board.reveal(board.index(150, 150))
+        self.assertEqual(len(revealed), 300 * 300)
+        self.assertEqual(len(set(revealed)), 300 * 300)
+        self.assertTrue(board.is_solved)
+        self.assertEqual(board.reveal(0), [])
+
+    def test_reveal_mine(self):
+        """ Revealing a mine does not cascade
+        """
+        board = board_from_layout(['*.',
+                                   '..'])
+        self.assertEqual(board.reveal(0), [0])
+        self.assertEqual(board.as_ascii(), 'Bx\nxx')
+
+    def test_chord(self):
+        """ A chord only reveals when the flags match the number
+        """
+        board = board_from_layout(['*...',
+                                   '....',
+                                   '..*.'])
+        idx = board.index(1, 1)
+        self.assertEqual(board.chord(idx), [])
+        board.reveal(idx)
+        self.assertEqual(board.chord(idx), [])
+        board.mark(0, 'F')
+        self.assertEqual(board.chord(idx), [])
+        board.mark(board.index(2, 2), 'F')
+        revealed = board.chord(idx)
+        self.assertEqual(sorted(revealed), [1, 2, 3, 4, 6, 7, 8, 9])
+        self.assertFalse(any(board.mine[cell] for cell in revealed))
+
+    def test_view(self):
+        """ The view of the whole board matches the view of every cell
+        """
+        board = board_from_layout(['*..*',
+                                   '....',
+                                   '...*'])
+        board.reveal(board.index(2, 0))
+        board.reveal(0)
+        board.mark(3, 'F')
+        board.mark(11, '?')
+        view = board.view()
+        self.assertEqual(view, bytearray(board.cell_view(idx) for idx in range(board.size)))
+        self.assertEqual(view, bytearray([Board.VIEW_MINE, Board.VIEW_HIDDEN, Board.VIEW_HIDDEN, Board.VIEW_FLAGGED,
+                                          1, 1, 2, Board.VIEW_HIDDEN,
+                                          0, 0, 1, Board.VIEW_Q_MARK]))
+
+    def test_move_mines(self):
+        """ Mines are moved out of the safe cells to free cells
+        """
+        board = board_from_layout(['**..',
+                                   '*...'])
+        board.move_mines([0, 1, 4, 5])
+        self.assertEqual(sum(board.mine), 3)
+        self.assertFalse(any(board.mine[idx] for idx in (0, 1, 4, 5)))
+        self.assertEqual(board.counts, adjacent_mines(2, 4, board.mine))
+
+    def test_packed(self):
+        board = board_from_layout(['*..',
+                                   '.*.'])
+        board.reveal(2)
+        board.mark(3, 'F')
+        other = Board.from_packed(2, 3, *board.packed())
+        self.assertEqual(other.mine, board.mine)
+        self.assertEqual(other.visible, board.visible)
+        self.assertEqual(other.sign, board.sign)
+
+
+class ChunkedBoardTestCase(SimpleTestCase):
+    def whole(self, board):
+        """ The same board materialized whole. """
+        size = board.rows * board.columns
+        return Board(board.rows, board.columns, mine=bytearray(board.mine[idx] for idx in range(size)))
+
+    def test_chunk_mines(self):
+        """ Every chunk gets its share of the mines, always the same
+        """
+        rows, columns = 2 * CHUNK_SIZE + 5, 3 * CHUNK_SIZE + 7
+        chunks = [chunk_mines(7, row, col, rows, columns, 1000) for row in range(3) for col in range(4)]
+        self.assertEqual(sum(sum(mine) for mine in chunks), 1000)
+        self.assertEqual(chunks[0], chunk_mines(7, 0, 0, rows, columns, 1000))
+        self.assertNotEqual(chunks[0], chunk_mines(8, 0, 0, rows, columns, 1000))
+        # Cells out of the board have no mines
+        self.assertFalse(any(chunks[-1][row * CHUNK_SIZE + col]
+                             for row in range(CHUNK_SIZE) for col in range(CHUNK_SIZE) if row >= 5 or col >= 7))
+
+    def test_across_chunks(self):
+        """ Counts, cascades and chords cross the chunks as if
+            the board was whole
+        """
+        board = ChunkedBoard(2 * CHUNK_SIZE + 5, 3 * CHUNK_SIZE + 7, 300, seed=5)
+        whole = self.whole(board)
+        size = whole.size
+        self.assertEqual(list(board.counts[idx] for idx in range(size)), list(whole.counts))
+        start = next(idx for idx in range(size) if not whole.mine[idx] and not whole.counts[idx])
+        revealed = board.reveal(start)
+        self.assertEqual(revealed, whole.reveal(start))
+        self.assertEqual(len({board.chunk_of(idx) for idx in revealed}), 12)
+        self.assertEqual(board.dirty, set(board.chunks))
+        for idx in range(size):
+            self.assertEqual(board.cell_view(idx), whole.cell_view(idx))
+
+    def test_solved(self):
+        """ A chunked board is solved once its hidden cells are revealed,
+            it's never seen or packed whole
+        """
+        board = ChunkedBoard(CHUNK_SIZE + 3, CHUNK_SIZE + 2, 200, seed=2)
+        whole = self.whole(board)
+        self.assertEqual(board.hidden_cells, board.size - 200)
+        for idx in range(board.size):
+            if not whole.mine[idx] and not whole.visible[idx]:
+                self.assertFalse(board.is_solved)
+                board.reveal(idx)
+                whole.reveal(idx)
+                self.assertEqual(board.hidden_cells, sum(not (m or v) for m, v in zip(whole.mine, whole.visible)))
+        self.assertTrue(board.is_solved)
+        with self.assertRaises(WholeBoardError):
+            board.view()
+        with self.assertRaises(WholeBoardError):
+            board.packed()
+
+    def test_unplaced_mines(self):
+        """ Until the mines are placed the board has none, then the
+            safe cells are clear
+        """
+        board = ChunkedBoard(1000, 1000, 200000, seed=1, mines_placed=False)
+        self.assertEqual(board.mine[0] + board.counts[0], 0)
+        safe = [CHUNK_SIZE * 1000 + CHUNK_SIZE] + list(board.neighbours(CHUNK_SIZE * 1000 + CHUNK_SIZE))
+        board.place_mines(200000, safe, rng=random.Random(3))
+        self.assertTrue(board.mines_placed)
+        self.assertFalse(any(board.mine[idx] for idx in safe))
+        self.assertEqual(board.chunk_mines((0, 0)), chunk_mines(board.seed, 0, 0, 1000, 1000, 200000))
+
+    def test_dense_first_reveal(self):
+        """ Up to the densest boards the first reveal is clear """
+        rng = random.Random(5)
+        for _ in range(20):
+            board = ChunkedBoard(1000, 1000, int(MAX_DENSITY * 10 ** 6), seed=rng.getrandbits(63), mines_placed=False)
+            start = rng.randrange(board.size)
+            safe = [start] + list(board.neighbours(start))
+            board.place_mines(board.mines, safe, rng=rng)
+            self.assertFalse(any(board.mine[idx] for idx in safe))
+
+
+class BoardCacheTestCase(SimpleTestCase):
+    def check_cache(self, cache):
+        board = board_from_layout(['*..',
+                                   '.*.'])
+        board.reveal(2)
+        cache.set(1, 'a', board)
+        cached = cache.get(1, 'a')
+        self.assertEqual((cached.mine, cached.visible, cached.counts), (board.mine, board.visible, board.counts))
+        # Copies are not shared
+        cached.mark(0, 'F')
+        self.assertEqual(cache.get(1, 'a').sign, board.sign)
+        # Only the stamp it was cached for gets it
+        self.assertIsNone(cache.get(1, 'b'))
+        self.assertIsNone(cache.get(2, 'a'))
+        cache.set(2, 'a', Board(2, 3, mines_placed=False))
+        self.assertFalse(cache.get(2, 'a').mines_placed)
+
+        # The least recently used board is dropped
+        cache.get(1, 'a')
+        cache.set(3, 'a', board)
+        self.assertIsNone(cache.get(2, 'a'))
+        self.assertIsNotNone(cache.get(1, 'a'))
+        cache.delete(1)
+        self.assertIsNone(cache.get(1, 'a'))
+        cache.clear()
+        self.assertIsNone(cache.get(3, 'a'))
+
+    def test_locmem(self):
+        self.check_cache(LocMemBoardCache(max_entries=2))
+
+    def test_files(self):
+        with tempfile.TemporaryDirectory() as location:
+            cache = FileBoardCache(location, max_entries=2)
+            # Modification times may not tell apart uses this close
+            uses = {'1.board': 2, '2.board': 1, '3.board': 3}
+            with mock.patch('minesweeper.apps.game.boardcache._mtime', lambda path: uses[os.path.basename(path)]):
+                self.check_cache(cache)
+
+    def test_files_cull(self):
+        """ The directory is only listed every few new entries """
+        with tempfile.TemporaryDirectory() as location:
+            cache = FileBoardCache(location, max_entries=10, cull_every=4)
+            with mock.patch('minesweeper.apps.game.boardcache.os.listdir', wraps=os.listdir) as listdir:
+                for pk in range(11):
+                    cache.set(pk, 'a', Board(2, 3))
+                    cache.set(pk, 'b', Board(2, 3))
+                self.assertEqual(listdir.call_count, 2)
+                self.assertEqual(len(list(os.scandir(location))), 11)
+                cache.set(11, 'a', Board(2, 3))
+                self.assertEqual(listdir.call_count, 3)
+            self.assertEqual(len(os.listdir(location)), 10)
+            self.assertEqual(cache.get(11, 'a').size, 6)
+
+    def test_files_format(self):
+        """ Files that aren't entries are not cached boards """
+        with tempfile.TemporaryDirectory() as location:
+            cache = FileBoardCache(location)
+            board = Board(2, 3)
+            board.place_mines(1, safe=[0])
+            board.reveal(0)
+            cache.set(1, '"1-2-3"', board)
+            cached = cache.get(1, '"1-2-3"')
+            self.assertEqual((cached.mine, cached.visible, cached.counts), (board.mine, board.visible, board.counts))
+            path = os.path.join(location, '1.board')
+            with open(path, 'rb') as entry_file:
+                data = entry_file.read()
+            for content in (data[:-1], data + b'\0', b'\x80\x04N.'):
+                with open(path, 'wb') as entry_file:
+                    entry_file.write(content)
+                self.assertIsNone(cache.get(1, '"1-2-3"'))
+
+    def test_files_directory(self):
+        """ The directory is only accessible to the user owning it """
+        with tempfile.TemporaryDirectory() as parent:
+            location = os.path.join(parent, 'boards')
+            FileBoardCache(location)
+            self.assertEqual(os.stat(location).st_mode & 0o777, 0o700)
+            os.chmod(location, 0o777)
+            FileBoardCache(location)
+            self.assertEqual(os.stat(location).st_mode & 0o777, 0o700)
+            with mock.patch('minesweeper.apps.game.boardcache.os.getuid', return_value=os.getuid() + 1):
+                with self.assertRaises(ImproperlyConfigured):
+                    FileBoardCache(location)
+            os.symlink(location, os.path.join(parent, 'link'))
+            with self.assertRaises(ImproperlyConfigured):
+                FileBoardCache(os.path.join(parent, 'link'))
+
+
+class GameTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='testUser', email='test@test.com')
+
+    def statements(self, queries):
+        """ Executed statements, leaving out the transaction handling. """
+        return [q['sql'] for q in queries.captured_queries if 'SAVEPOINT' not in q['sql']]
+
+    def game_statements(self, queries):
+        """ Executed statements, leaving out those of the stats of the
+            user (written when the game ends, see `StatsTestCase`).
+        """
+        return [sql for sql in self.statements(queries) if 'stats' not in sql]
+
+    def create_game(self, layout):
+        """ Creates a game from a list of strings where '*' is a mine. """
+        game = Game.objects.create(user=self.user, name='Test Game',
+                                   rows=len(layout), columns=len(layout[0]),
+                                   mines=sum(row.count('*') for row in layout))
+        mine_map, _, _, count_map = board_from_layout(layout).packed()
+        Game.objects.filter(pk=game.pk).update(mine_map=mine_map, count_map=count_map, mines_placed=True)
+        return Game.objects.get(pk=game.pk)
+
+    def test_initialize_game(self):
+        """ A new game only stores the size of its board, without Cell
+            rows. The mines are placed by the first reveal
+        """
+        game = Game.objects.create(user=self.user, rows=10, columns=12, mines=15)
+        game = Game.objects.get(pk=game.pk)
+        self.assertEqual([bytes(getattr(game, field)) for field in Game.PACKED_FIELDS], [b''] * 4)
+        self.assertEqual(game.hidden_cells, 105)
+        self.assertFalse(game.mines_placed or game.board.mines_placed)
+        self.assertEqual((game.board.visible, game.board.counts), (bytearray(120), bytearray(120)))
+        self.assertFalse(Cell.objects.exists())
+        game.make_move(5, 5)
+        game = Game.objects.get(pk=game.pk)
+        self.assertTrue(game.mines_placed)
+        self.assertEqual(sum(game.board.mine), 15)
+        self.assertEqual(len(bytes(game.mine_map)), bitmap.packed_size(120, 1))
+        self.assertEqual(game.board.counts, adjacent_mines(10, 12, game.board.mine))
+
+    def test_safe_first_reveal(self):
+        """ The first reveal never hits a mine nor a number, even on
+            crowded boards, and flags placed before it are counted
+        """
+        for _ in range(20):
+            game = Game.objects.create(user=self.user, rows=4, columns=4, mines=7)
+            game.make_move(0, 3, sign='F')
+            game.make_move(0, 0)
+            game = Game.objects.get(pk=game.pk)
+            self.assertEqual(game.status, Game.PLAYING)
+            self.assertFalse(any(game.board.mine[idx] for idx in (0, 1, 4, 5)))
+            self.assertEqual(game.board.counts[0], 0)
+            self.assertEqual(game.flagged_mines, game.board.mine[3])
+        game = Game.objects.create(user=self.user, rows=3, columns=3, mines=8)
+        game.make_move(1, 1)
+        game = Game.objects.get(pk=game.pk)
+        self.assertEqual((game.status, game.hidden_cells), (Game.WON, 0))
+
+    def test_no_guess_game(self):
+        """ A no-guess game gets a board that is solved without guessing
+        """
+        game = Game.objects.create(user=self.user, rows=9, columns=9, mines=10, no_guess=True)
+        game.make_move(8, 8, sign='F')
+        game.make_move(4, 4)
+        game = Game.objects.get(pk=game.pk)
+        mine = bytearray(game.board.mine)
+        self.assertEqual(game.board.sign[80], Board.FLAGGED)
+        self.assertEqual(game.flagged_mines, mine[80])
+        self.assertTrue(is_solvable(Board(9, 9, mine=mine), 10, 40))
+        self.assertFalse(game.no_guess_fallback)
+
+    def test_no_guess_fallback(self):
+        """ A no-guess game gets a regular board, and says so, when no
+            board solved without guessing is found. A restart clears it
+        """
+        game = Game.objects.create(user=self.user, rows=9, columns=9, mines=10, no_guess=True)
+        with mock.patch('minesweeper.apps.game.models.no_guess_seed', return_value=None):
+            game.make_move(4, 4)
+        game = Game.objects.get(pk=game.pk)
+        self.assertTrue(game.no_guess and game.no_guess_fallback and game.mines_placed)
+        self.assertEqual(sum(game.board.mine), 10)
+        game.initialize_game()
+        self.assertFalse(Game.objects.get(pk=game.pk).no_guess_fallback)
+
+    def test_chunked_game(self):
+        """ Chunked games only store the chunks changed by the moves
+        """
+        rows = columns = 100000
+        game = Game.objects.create(user=self.user, rows=rows, columns=columns, mines=2000000000, chunked=True)
+        game.make_move(0, 5, sign='F')
+        self.assertFalse(Game.objects.get(pk=game.pk).mines_placed)
+        game.make_move(5000, 5000)
+        self.assertEqual(game.status, Game.PLAYING)
+        revealed = game.changed_cells
+        self.assertEqual(game.hidden_cells, rows * columns - 2000000000 - len(revealed))
+        game = Game.objects.get(pk=game.pk)
+        self.assertEqual(set(game.chunks.values_list('row', 'column')),
+                         {(0, 0)} | {game.board.chunk_of(idx) for idx in revealed})
+        self.assertEqual((bytes(game.mine_map), bytes(game.visible_map)), (b'', b''))
+        self.assertTrue(game.mines_placed and game.board.mines_placed)
+        self.assertEqual(game.flagged_mines, game.board.mine[5])
+        self.assertTrue(all(game.board.visible[idx] for idx in revealed))
+        self.assertEqual(game.board.cell_view(5), Board.VIEW_FLAGGED)
+        self.assertEqual(game.replay(2).chunk_view(156, 156), game.board.chunk_view(156, 156))
+
+        # A chunk stored already is updated
+        stored = game.chunks.count()
+        hidden = next(idx for idx in range(5000 * columns + 5000, rows * columns)
+                      if not game.board.visible[idx] and game.board.chunk_of(idx) == (156, 156))
+        game.make_move(*divmod(hidden, columns), sign='?')
+        game = Game.objects.get(pk=game.pk)
+        self.assertEqual(game.board.cell_view(hidden), Board.VIEW_Q_MARK)
+        self.assertEqual(Chunk.objects.filter(game=game).count(), stored)
+
+    def test_make_move_single_write(self):
+        """ A move is a single write of the game (and its log entry)
+            no matter the cascade size
+        """
+        game = self.create_game(['....',
+                                 '....',
+                                 '...*'])
+        with CaptureQueriesContext(connection) as queries:
+            game.make_move(0, 0)
+        self.assertEqual([sql.split()[0] for sql in self.game_statements(queries)], ['UPDATE', 'INSERT'])
+        game = Game.objects.get(pk=game.pk)
+        self.assertEqual(game.status, Game.WON)
+        self.assertIn('0000\n0011\n001x', game.as_ascii())
+
+    def test_board_cache(self):
+        """ Moves take the board from the cache and write it through,
+            stale boards are loaded again
+        """
+        game = self.create_game(['....',
+                                 '....',
+                                 '...*'])
+        game.make_move(2, 3, sign='F')
+        game = Game.objects.defer(*Game.PACKED_FIELDS).get(pk=game.pk)
+        with CaptureQueriesContext(connection) as queries:
+            game.make_move(2, 2, sign='?')
+        self.assertEqual([sql.split()[0] for sql in self.statements(queries)], ['UPDATE', 'INSERT'])
+        game = Game.objects.defer(*Game.PACKED_FIELDS).get(pk=game.pk)
+        self.assertEqual(game.board.as_ascii(), 'xxxx\nxxxx\nxx?F')
+
+        # Changed elsewhere
+        board_cache().set(game.pk, 'stale', game.board)
+        with mock.patch('minesweeper.apps.game.models.game_etag', return_value='other'):
+            game = Game.objects.defer(*Game.PACKED_FIELDS).get(pk=game.pk)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(game.board.as_ascii(), 'xxxx\nxxxx\nxx?F')
+        self.assertEqual([sql.split()[0] for sql in self.statements(queries)], ['SELECT'])
+
+    def test_make_move_without_mines(self):
+        """ A game without mines is won with one move and one write
+        """
+        game = Game.objects.create(user=self.user, rows=200, columns=200, mines=0)
+        game = Game.objects.get(pk=game.pk)
+        with CaptureQueriesContext(connection) as queries:
+            game.make_move(199, 0)
+        self.assertEqual([sql.split()[0] for sql in self.game_statements(queries)], ['UPDATE', 'INSERT'])
+        game = Game.objects.get(pk=game.pk)
+        self.assertEqual(game.status, Game.WON)
+        self.assertEqual(sum(game.board.visible), 200 * 200)
+
+    def test_flags(self):
+        """ Flags are stored and counted against the mines
+        """
+        game = self.create_game(['*.',
+                                 '..'])
+        game.make_move(0, 0, sign='F')
+        game.make_move(1, 1, sign='?')
+        game.make_move(0, 1, sign='F')
+        game.make_move(0, 1, sign='F')
+        game = Game.objects.get(pk=game.pk)
+        self.assertEqual((game.flags, game.flagged_mines), (2, 1))
+        self.assertEqual(game.remaining_mines, 0)
+        self.assertIn('FF\nx?', game.as_ascii())
+        game.make_move(1, 1, sign='')
+        game.make_move(0, 1, sign='?')
+        self.assertEqual(game.board.sign[3], Board.NO_SIGN)
+        self.assertEqual((game.flags, game.flagged_mines), (1, 1))
+
+    def test_counters(self):
+        """ The hidden cells are counted down until the game is won
+        """
+        game = self.create_game(['*..',
+                                 '...',
+                                 '..*'])
+        self.assertEqual(game.hidden_cells, 7)
+        game.make_move(0, 1)
+        game.make_move(1, 1)
+        self.assertFalse(game.is_solved)
+        game = Game.objects.get(pk=game.pk)
+        self.assertEqual((game.hidden_cells, game.status), (5, Game.PLAYING))
+        game.make_move(0, 2)
+        game = Game.objects.get(pk=game.pk)
+        self.assertEqual((game.hidden_cells, game.status), (3, Game.PLAYING))
+        game.make_move(2, 0)
+        game = Game.objects.get(pk=game.pk)
+        self.assertEqual((game.hidden_cells, game.status), (0, Game.WON))
+        self.assertTrue(game.is_solved)
+
+    def test_chord_on_wrong_flag(self):
+        """ A chord with a misplaced flag explodes a mine
+        """
+        game = self.create_game(['*..',
+                                 '...',
+                                 '...'])
+        game.make_move(1, 1)
+        game.make_move(0, 1, sign='F')
+        self.assertTrue(game.make_move(1, 1, sign='C'))
+        game = Game.objects.get(pk=game.pk)
+        self.assertEqual(game.status, Game.LOST)
+        self.assertTrue(game.board.visible[0])
+        self.assertEqual(game.hidden_cells, 8 - sum(game.board.visible) + 1)
+
+    def test_concurrent_moves(self):
+        """ A move on a game changed since it was loaded is rejected
+        """
+        game = self.create_game(['*..',
+                                 '...'])
+        first, second = Game.objects.get(pk=game.pk), Game.objects.get(pk=game.pk)
+        first.make_move(1, 1, sign='F')
+        with self.assertRaises(StaleGame):
+            second.make_move(1, 2, sign='F')
+        game = Game.objects.get(pk=game.pk)
+        self.assertEqual((game.version, game.flags), (1, 1))
+        self.assertEqual(game.board.sign[4:], bytearray([Board.FLAGGED, Board.NO_SIGN]))
+        game.make_move(1, 2, sign='F')
+        self.assertEqual(Game.objects.get(pk=game.pk).flags, 2)
+
+    def test_seeded_mines(self):
+        """ The mines are placed from the seed of the game
+        """
+        game = Game.objects.create(user=self.user, rows=10, columns=12, mines=30)
+        game.make_move(3, 4)
+        game = Game.objects.get(pk=game.pk)
+        board = Board(10, 12, mines_placed=False)
+        board.place_mines(30, [40] + list(board.neighbours(40)), rng=random.Random(game.seed))
+        self.assertEqual(game.board.mine, board.mine)
+
+    def test_move_log(self):
+        """ Moves are logged in order and the board is replayed
+            at any of them
+        """
+        game = self.create_game(['*...',
+                                 '....',
+                                 '..*.'])
+        game.make_move(0, 0, sign='F')
+        game.make_move(1, 1)
+        game.make_moves([(0, 1, '?'), (0, 2, 'X'), (1, 1, 'C')])
+        game = Game.objects.get(pk=game.pk)
+        self.assertEqual(game.move_count, 4)
+        self.assertEqual(list(game.moves.order_by('seq').values_list('seq', 'row', 'column', 'sign')),
+                         [(1, 0, 0, 'F'), (2, 1, 1, None), (3, 0, 1, '?'), (4, 1, 1, 'C')])
+        self.assertEqual(game.replay(0).as_ascii(), 'xxxx\nxxxx\nxxxx')
+        self.assertFalse(game.replay(1).mines_placed)
+        self.assertEqual(game.replay(1).as_ascii(), 'Fxxx\nxxxx\nxxxx')
+        self.assertEqual(game.replay(2).as_ascii(), 'Fxxx\nx2xx\nxxxx')
+        self.assertEqual(game.replay(3).as_ascii(), 'F?xx\nx2xx\nxxxx')
+        self.assertEqual(game.replay(4).as_ascii(), game.board.as_ascii())
+        with self.assertRaises(ValueError):
+            game.replay(5)
+
+    def test_replay_snapshots(self):
+        """ Replays start from the latest snapshot
+        """
+        game = self.create_game(['*...',
+                                 '....'])
+        with mock.patch.object(Game, 'SNAPSHOT_INTERVAL', 3):
+            game.make_moves([(1, 3, 'F'), (1, 3, '')] * 4)
+        self.assertEqual(list(game.snapshots.values_list('seq', flat=True)), [8])
+        with mock.patch.object(Game, 'SNAPSHOT_INTERVAL', 3):
+            for _ in range(2):
+                game.make_move(1, 3, sign='F')
+                game.make_move(1, 3, sign='?')
+        self.assertEqual(list(game.snapshots.order_by('seq').values_list('seq', flat=True)), [8, 9, 12])
+        game = Game.objects.get(pk=game.pk)
+        with CaptureQueriesContext(connection) as queries:
+            board = game.replay(11)
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(board.sign[7], Board.FLAGGED)
+        self.assertEqual(game.replay(12).sign[7], Board.Q_MARK)
+        self.assertEqual(game.replay(2).sign[7], Board.NO_SIGN)
+
+    def test_played_time(self):
+        """ Every move adds up the time played since the last one
+        """
+        game = self.create_game(['*..',
+                                 '...',
+                                 '..*'])
+
+        game = later(game, 100.4)
+        game.make_move(0, 0, sign='F')
+        game = later(Game.objects.get(pk=game.pk), 50)
+        self.assertEqual(game.elapsed_time, 100)
+        self.assertAlmostEqual(game.played_time, 150.4, places=0)
+        game.make_move(0, 1)
+        game = later(Game.objects.get(pk=game.pk), 30)
+        self.assertEqual((game.elapsed_time, game.status), (150, Game.PLAYING))
+        game.make_move(2, 0)
+        game.make_move(0, 2)
+        game = Game.objects.get(pk=game.pk)
+        self.assertEqual((game.elapsed_time, game.status), (180, Game.WON))
+
+    def test_game_lost(self):
+        game = self.create_game(['*.',
+                                 '..'])
+        game.make_move(0, 0)
+        self.assertEqual(Game.objects.get(pk=game.pk).status, Game.LOST)
+
+
+@override_settings(BOARD_POOL_SIZES=[(4, 4, 5)], BOARD_POOL_DEPTH=3)
+class PooledBoardTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='testUser', email='test@test.com')
+
+    def test_refill(self):
+        """ The pool is topped up to its depth
+        """
+        self.assertEqual(PooledBoard.refill(batch=2), {(4, 4, 5): 3})
+        self.assertEqual(PooledBoard.refill(), {})
+        PooledBoard.objects.first().delete()
+        call_command('refill_board_pool', workers=2, stdout=io.StringIO())
+        self.assertEqual(PooledBoard.objects.count(), 3)
+
+    def test_claim(self):
+        """ A claimed board leaves the pool
+        """
+        self.assertIsNone(PooledBoard.claim(4, 4, 5))
+        PooledBoard.refill(depth=1)
+        board = PooledBoard.claim(4, 4, 5)
+        self.assertEqual(sum(board.mine), 5)
+        self.assertEqual(board.counts, adjacent_mines(4, 4, board.mine))
+        self.assertFalse(PooledBoard.objects.exists())
+
+    def test_first_reveal(self):
+        """ The first reveal of a game takes its mines from the pool
+            and keeps them away from the revealed cell
+        """
+        PooledBoard.refill()
+        for _ in range(3):
+            game = Game.objects.create(user=self.user, rows=4, columns=4, mines=5)
+            game.make_move(0, 0, sign='F')
+            game.make_move(3, 3)
+            game = Game.objects.get(pk=game.pk)
+            self.assertEqual(sum(game.board.mine), 5)
+            self.assertFalse(any(game.board.mine[idx] for idx in (10, 11, 14, 15)))
+            self.assertEqual(game.board.counts, adjacent_mines(4, 4, game.board.mine))
+            self.assertEqual(game.board.sign[0], Board.FLAGGED)
+            self.assertEqual(game.flagged_mines, game.board.mine[0])
+        self.assertFalse(PooledBoard.objects.exists())
+
+
+def later(game, seconds):
+    """ The game as if its last action was `seconds` earlier. """
+    Game.objects.filter(pk=game.pk).update(last_action=F('last_action') - datetime.timedelta(seconds=seconds))
+    return Game.objects.get(pk=game.pk)
+
+
+def finished_game(user, won, seconds=0):
+    """ A game of `user` won (or lost) after `seconds` of play, spread
+        over its moves.
+    """
+    game = later(Game.objects.create(user=user, rows=3, columns=3, mines=8 if won else 7), seconds // 2)
+    game.make_move(2, 2, sign='?')
+    game = later(game, seconds - seconds // 2)
+    game.make_move(0, 0)
+    if not won:
+        game.make_move(*divmod(game.board.mine.index(1), 3))
+    return game
+
+
+class StatsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='testUser', email='test@test.com')
+        self.other = User.objects.create(username='otherUser', email='other@test.com')
+
+    def stats(self):
+        return (list(UserStats.objects.order_by('user').values_list('user', 'played', 'won')),
+                list(BoardStats.objects.order_by('user', 'mines').values_list(
+                    'user', 'rows', 'columns', 'mines', 'played', 'won', 'best_time', 'won_time')))
+
+    def test_record(self):
+        """ The move ending a game adds it to the stats of its user
+        """
+        game = finished_game(self.user, True, 30)
+        self.assertEqual((game.status, game.move_count, game.elapsed_time), (Game.WON, 2, 30))
+        finished_game(self.user, True, 20)
+        finished_game(self.user, True, 40)
+        self.assertEqual(finished_game(self.user, False).status, Game.LOST)
+        finished_game(self.other, False)
+        Game.objects.create(user=self.other, rows=3, columns=3, mines=8)
+        self.assertEqual(self.stats(), (
+            [(self.user.id, 4, 3), (self.other.id, 1, 0)],
+            [(self.user.id, 3, 3, 7, 1, 0, None, 0), (self.user.id, 3, 3, 8, 3, 3, 20, 90),
+             (self.other.id, 3, 3, 7, 1, 0, None, 0)]))
+        stats = BoardStats.objects.get(user=self.user, mines=8)
+        self.assertEqual((stats.lost, stats.average_time), (0, 30))
+
+    def test_record_queries(self):
+        """ Once a user has stats, the end of a game updates them with two writes
+        """
+        finished_game(self.user, True)
+        game = Game.objects.create(user=self.user, rows=3, columns=3, mines=8)
+        with CaptureQueriesContext(connection) as queries:
+            game.make_move(0, 0)
+        self.assertEqual([q['sql'].split()[0] for q in queries.captured_queries if 'stats' in q['sql']],
+                         ['UPDATE', 'UPDATE'])
+
+    def test_rebuild(self):
+        """ The stats are rebuilt from the finished games
+        """
+        finished_game(self.user, True, 30)
+        finished_game(self.user, True, 20)
+        finished_game(self.user, False)
+        finished_game(self.other, True, 10)
+        recorded = self.stats()
+        UserStats.objects.filter(user=self.user).update(won=0)
+        BoardStats.objects.filter(user=self.other).delete()
+        out = io.StringIO()
+        call_command('rebuild_stats', stdout=out)
+        self.assertEqual(out.getvalue().strip(), "2 users, 3 board sizes")
+        self.assertEqual(self.stats(), recorded)
+
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='testUser', email='test@test.com')
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_moves(self):
+        """ Moves are timed by move and reveals counted by cells revealed
+        """
+        created = self.sample('minesweeper_board_creation_seconds_count', size='100')
+        flags = self.sample('minesweeper_move_seconds_count', move='flag')
+        reveals = self.sample('minesweeper_move_seconds_count', move='reveal')
+        batches = self.sample('minesweeper_move_seconds_count', move='batch')
+        cascades = self.sample('minesweeper_cascade_cells_count')
+        revealed = self.sample('minesweeper_cascade_cells_sum')
+
+        game = Game.objects.create(user=self.user, rows=9, columns=9, mines=10)
+        game.make_move(0, 0, sign='F')
+        game.make_move(4, 4)
+        cells = len(game.changed_cells)
+        game.make_move(0, 0, sign='X')
+        game.make_moves([(8, 8, 'F'), (8, 8, '')])
+        self.assertEqual(self.sample('minesweeper_board_creation_seconds_count', size='100'), created + 1)
+        self.assertEqual(self.sample('minesweeper_move_seconds_count', move='flag'), flags + 1)
+        self.assertEqual(self.sample('minesweeper_move_seconds_count', move='reveal'), reveals + 1)
+        self.assertEqual(self.sample('minesweeper_move_seconds_count', move='batch'), batches + 1)
+        self.assertEqual(self.sample('minesweeper_cascade_cells_count'), cascades + 1)
+        self.assertEqual(self.sample('minesweeper_cascade_cells_sum'), revealed + cells)
+
+    def test_games_finished(self):
+        """ Won and lost games are counted once
+        """
+        won = self.sample('minesweeper_games_finished_total', result='won')
+        lost = self.sample('minesweeper_games_finished_total', result='lost')
+        game = Game.objects.create(user=self.user, rows=3, columns=3, mines=8)
+        game.make_move(1, 1)
+        self.assertEqual(game.status, Game.WON)
+        game = Game.objects.create(user=self.user, rows=3, columns=3, mines=7)
+        game.make_move(0, 0)
+        game.make_move(*divmod(game.board.mine.index(1), 3))
+        self.assertEqual(game.status, Game.LOST)
+        self.assertEqual(self.sample('minesweeper_games_finished_total', result='won'), won + 1)
+        self.assertEqual(self.sample('minesweeper_games_finished_total', result='lost'), lost + 1)
+
+    def test_endpoint(self):
+        """ The metrics are served in the Prometheus text format with the active games
+        """
+        Game.objects.create(user=self.user, rows=9, columns=9, mines=10)
+        Game.objects.create(user=self.user, rows=9, columns=9, mines=10, status=Game.WON)
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        lines = response.content.decode('utf-8').splitlines()
+        self.assertIn('minesweeper_active_games 1.0', lines)
+        self.assertIn('# TYPE minesweeper_move_seconds histogram', lines)
+
+    def test_multiprocess(self):
+        """ With a directory of metrics, those of every process are scraped from it
+        """
+        with tempfile.TemporaryDirectory() as path, mock.patch.dict(os.environ, prometheus_multiproc_dir=path):
+            names = [metric.name for metric in registry().collect()]
+        self.assertEqual(names, ['minesweeper_active_games'])
+
+    def test_size_class(self):
+        self.assertEqual([size_class(cells) for cells in (81, 480, 10 ** 4, 10 ** 6 + 1)],
+                         ['100', '1000', '10000', 'more'])
+
+
+class BenchmarkTestCase(TestCase):
+    """ Every benchmark case, on small boards, keeps to its query budget """
+    def check_budgets(self, name, **options):
+        results = list(BENCHMARKS[name](repeat=1, **options))
+        self.assertTrue(results)
+        for result in results:
+            self.assertLessEqual(result['queries'], result['budget'], result['case'])
+            self.assertGreater(result['peak_memory'], 0)
+
+    def test_create_game(self):
+        self.check_budgets('create_game', sizes=[(9, 9, 10), (100, 100, 1500)])
+
+    def test_engine(self):
+        self.check_budgets('engine', sizes=[(9, 9, 10), (100, 100, 1500)])
+
+    def test_moves(self):
+        self.check_budgets('moves', sizes=[(16, 30, 99)], moves=6)
+
+    def test_list(self):
+        self.check_budgets('list', pages=[10, 50])
+
+    def test_no_guess(self):
+        self.check_budgets('no_guess', sizes=[(9, 9, 10)])
+
+    def test_command(self):
+        output = io.StringIO()
+        call_command('benchmark', 'create_game', '--repeat', '1', stdout=output)
+        self.assertIn('1 queries', output.getvalue())
+        with mock.patch('minesweeper.apps.game.benchmarks.MOVE_QUERIES', 0):
+            with self.assertRaisesRegex(CommandError, 'engine reveal 9x9/10 \\(2 > 0\\)'):
+                call_command('benchmark', 'engine', '--repeat', '1', stdout=output)
+
+
+class QueryPlanTestCase(TestCase):
+    """ The lookups of the game hot paths must be index searches. """
+    def setUp(self):
+        user = User.objects.create(username='testUser', email='test@test.com')
+        self.game = Game.objects.create(user=user, rows=3, columns=3, mines=1)
+
+    def query_plan(self, queryset):
+        # PostgreSQL would rather scan (and sort) such tiny tables
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('SET LOCAL enable_sort = off')
+        return queryset.explain()
+
+    def assertIndexSearch(self, queryset, terms):
+        plan = self.query_plan(queryset)
+        if connection.vendor == 'postgresql':
+            self.assertNotIn('Seq Scan', plan)
+        else:
+            self.assertNotIn('SCAN', plan)
+        for term in terms:
+            self.assertIn(term, plan)
+
+    def test_move_lookup(self):
+        """ A move loads the game by primary key
+        """
+        self.assertIndexSearch(Game.objects.select_for_update().filter(id=self.game.id), ['id'])
+
+    def test_cell_lookup(self):
+        """ Cells are found through the composite index
+        """
+        self.assertIndexSearch(Cell.objects.filter(game=self.game, row=1, column=2),
+                               ['game_cell_game_id_row_column'])
+        self.assertIndexSearch(Cell.objects.filter(game=self.game), ['game_id'])
+
+    def test_list_lookup(self):
+        """ The games of a user are listed straight from an index
+        """
+        games = Game.objects.filter(user=self.game.user).order_by('-create_date', '-id')[:50]
+        self.assertIndexSearch(games, ['game_user_create_idx'])
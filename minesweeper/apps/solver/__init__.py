@@ -0,0 +1,9 @@
+""" Minesweeper solver.
+
+    It works on what a player sees of a board (see `Board.view`) and
+    never on the mines themselves, so it can give hints without
+    leaking the board. Like `game.board` it has no dependencies on Django.
+"""
+from .solver import Solution, solve
+
+__all__ = ['Solution', 'solve']
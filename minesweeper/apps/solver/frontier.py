@@ -0,0 +1,186 @@
+""" Exact enumeration of the frontier (the hidden cells next to a number).
+
+    The frontier is split into components that share no constraint, so
+    they are enumerated independently. Each one is enumerated cell by
+    cell, memoizing on the mines still needed by the constraints that
+    are partially assigned: for every number of mines in the component,
+    it counts the solutions and how many of them have a mine in each cell.
+    The components are combined with the cells away from the frontier
+    through the total number of mines.
+"""
+import math
+from collections import defaultdict, deque
+
+# States memoized for a single component before giving up on it.
+MAX_STATES = 200000
+# Cells of the biggest component that is enumerated.
+MAX_CELLS = 500
+
+
+class TooManyStates(Exception):
+    """ A component is too big to be enumerated. """
+
+
+def components(constraints):
+    """ Splits the constraints into groups that share no cell.
+
+    Returns:
+        list: (cells, constraints) of every component, the cells in an
+            order where the cells of a constraint are close together.
+    """
+    containing = defaultdict(list)
+    for cells in constraints:
+        for idx in cells:
+            containing[idx].append(cells)
+
+    seen = set()
+    result = []
+    for start in sorted(containing):
+        if start in seen:
+            continue
+        order, own = [], {}
+        pending = deque([start])
+        seen.add(start)
+        while pending:
+            idx = pending.popleft()
+            order.append(idx)
+            for cells in containing[idx]:
+                own[cells] = constraints[cells]
+                for nei in sorted(cells):
+                    if nei not in seen:
+                        seen.add(nei)
+                        pending.append(nei)
+        result.append((order, own))
+    return result
+
+
+def enumerate_component(order, constraints, max_states=MAX_STATES):
+    """ Counts the solutions of a component.
+
+    Args:
+        order (list): Index of the cells, in the order they are assigned.
+        constraints (dict): Mines among every set of cells.
+    Returns:
+        dict: For every number of mines, the number of solutions and
+            the number of solutions with a mine in each cell of `order`.
+    Raises:
+        TooManyStates: If more than `max_states` states are needed.
+    """
+    size = len(order)
+    # The enumeration recurses once per cell
+    if size > MAX_CELLS:
+        raise TooManyStates()
+    position = {idx: pos for pos, idx in enumerate(order)}
+    needed = []
+    # Constraints of every cell: (constraint, cells of it left after this one)
+    of_cell = [[] for _ in range(size)]
+    first, last = [], []
+    for number, (cells, count) in enumerate(constraints.items()):
+        positions = sorted(position[idx] for idx in cells)
+        needed.append(count)
+        first.append(positions[0])
+        last.append(positions[-1])
+        for left, pos in enumerate(reversed(positions)):
+            of_cell[pos].append((number, left))
+    # Constraints partially assigned when the cell at `pos` is reached
+    active = [tuple(n for n in range(len(needed)) if first[n] < pos <= last[n]) for pos in range(size)]
+
+    memo = {}
+
+    def solve(pos, needed):
+        if pos == size:
+            return {0: (1, [])}
+        key = (pos, tuple(needed[n] for n in active[pos]))
+        if key in memo:
+            return memo[key]
+        if len(memo) >= max_states:
+            raise TooManyStates()
+        result = {}
+        for value in (0, 1):
+            after = list(needed)
+            for number, left in of_cell[pos]:
+                after[number] -= value
+                if not 0 <= after[number] <= left:
+                    break
+            else:
+                for mines, (count, cell_counts) in solve(pos + 1, after).items():
+                    total, counts = result.get(mines + value, (0, None))
+                    if counts is None:
+                        counts = [value * count] + cell_counts
+                    else:
+                        counts = [counts[0] + value * count] + [a + b for a, b in zip(counts[1:], cell_counts)]
+                    result[mines + value] = (total + count, counts)
+        memo[key] = result
+        return result
+
+    return solve(0, needed)
+
+
+def _log_binomial(n, k):
+    if k < 0 or k > n:
+        return None
+    return math.lgamma(n + 1) - math.lgamma(k + 1) - math.lgamma(n - k + 1)
+
+
+def _convolve(first, second):
+    result = defaultdict(float)
+    for a, wa in first.items():
+        for b, wb in second.items():
+            result[a + b] += wa * wb
+    return result
+
+
+def probabilities(solved, outside, mines):
+    """ Combines the solutions of the components with the cells away
+        from the frontier, all of them equally likely to have a mine.
+
+    Args:
+        solved (list): (order, solutions) of every component (see
+                `enumerate_component`).
+        outside (int): Number of unknown cells away from the frontier.
+        mines (int): Number of unknown mines left.
+    Returns:
+        tuple: Probability of having a mine of every cell of the
+            components (dict) and of any cell away from the frontier.
+    """
+    # Relative weight of every number of mines of every component
+    weights = []
+    for _, solutions in solved:
+        biggest = max(count for count, _ in solutions.values())
+        weights.append({k: count / biggest for k, (count, _) in solutions.items()})
+
+    logs = {}
+    for k in range(mines + 1):
+        value = _log_binomial(outside, mines - k)
+        if value is not None:
+            logs[k] = value
+    if not logs:
+        return {}, 0.0
+    top = max(logs.values())
+    ways_outside = {k: math.exp(value - top) for k, value in logs.items()}
+
+    def rest_weights(skip):
+        total = {0: 1.0}
+        for number, weight in enumerate(weights):
+            if number != skip:
+                total = _convolve(total, weight)
+        return total
+
+    everything = rest_weights(None)
+    total = sum(w * ways_outside.get(k, 0.0) for k, w in everything.items())
+    if not total:
+        return {}, 0.0
+
+    result = {}
+    for number, (order, solutions) in enumerate(solved):
+        rest = rest_weights(number)
+        mined = [0.0] * len(order)
+        for k, (count, cell_counts) in solutions.items():
+            factor = sum(w * ways_outside.get(k + r, 0.0) for r, w in rest.items()) * weights[number][k] / count
+            for pos, cell_count in enumerate(cell_counts):
+                mined[pos] += cell_count * factor
+        for idx, value in zip(order, mined):
+            result[idx] = value / total
+
+    expected_outside = sum(w * ways_outside.get(k, 0.0) * (mines - k) for k, w in everything.items()) / total
+    return result, (expected_outside / outside if outside else 0.0)
@@ -0,0 +1,117 @@
+""" Boards that can be solved without guessing.
+
+    Candidate boards are sampled with the first revealed cell (and its
+    neighbours) clear of mines and played with the solver, only ever
+    revealing cells proven to be safe. The first candidate that gets
+    solved is taken. Candidates are tried in batches, that can be spread
+    over the processes of an executor: once a batch finds a board, the
+    batches not started yet are cancelled.
+"""
+import random
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from minesweeper.apps.game.board import Board
+
+from .frontier import MAX_STATES
+from .solver import solve
+
+# Candidates tried by every task.
+BATCH_SIZE = 4
+
+
+def candidate(rows, columns, mines, start, seed):
+    """ The candidate board for `seed`, with its mines placed away from `start`. """
+    board = Board(rows, columns, counts=bytearray(rows * columns), mines_placed=False)
+    safe = [start] + list(board.neighbours(start))
+    if board.size - len(safe) < mines:
+        safe = [start]
+    board.place_mines(mines, safe, rng=random.Random(seed))
+    return board
+
+
+def is_solvable(board, mines, start):
+    """ Checks if the board is solved from `start` only revealing the
+        cells the solver proves to be safe. The cheap rules are tried
+        before the enumeration of the frontier.
+    """
+    board.visible = bytearray(board.size)
+    board.sign = bytearray(board.size)
+    board.reveal(start)
+    hidden = board.size - sum(board.visible)
+    while hidden > mines:
+        new = []
+        for max_states in (0, MAX_STATES):
+            solution = solve(board.rows, board.columns, mines, board.view(), max_states)
+            new = [idx for idx in solution.safe if not board.visible[idx]]
+            if new:
+                break
+        if not new:
+            return False
+        for idx in new:
+            if board.mine[idx]:
+                return False
+            hidden -= len(board.reveal(idx))
+    return True
+
+
+def search(rows, columns, mines, start, seeds):
+    """ Seed of the first candidate that can be solved without
+        guessing, None if none of them can.
+    """
+    for seed in seeds:
+        if is_solvable(candidate(rows, columns, mines, start, seed), mines, start):
+            return seed
+    return None
+
+
+def no_guess_board(rows, columns, mines, start, executor=None, tries=400, rng=random):
+    """ Finds a board that can be solved without guessing from the
+        first revealed cell `start` (see `no_guess_seed`).
+
+    Returns:
+        Board: The board with its mines placed, None if no candidate
+            could be solved.
+    """
+    seed = no_guess_seed(rows, columns, mines, start, executor, tries, rng)
+    if seed is None:
+        return None
+    return candidate(rows, columns, mines, start, seed)
+
+
+def no_guess_seed(rows, columns, mines, start, executor=None, tries=400, rng=random):
+    """ Finds the seed of a board that can be solved without guessing
+        from the first revealed cell `start` (see `candidate`).
+
+    Args:
+        rows (int): Number of rows of the board.
+        columns (int): Number of columns of the board.
+        mines (int): Number of mines of the board.
+        start (int): Index of the first revealed cell.
+        executor (Executor, optional): Tries the candidates in parallel
+                (e.g. a ProcessPoolExecutor). By default they are tried
+                in this process.
+        tries (int, optional): Candidates tried before giving up.
+        rng (random.Random, optional): Defaults to the `random` module.
+                Source of the seeds of the candidates.
+    Returns:
+        int: The seed of the board, None if no candidate could be solved.
+    """
+    seeds = [rng.getrandbits(63) for _ in range(tries)]
+    batches = [seeds[start_seed:start_seed + BATCH_SIZE] for start_seed in range(0, tries, BATCH_SIZE)]
+    found = None
+    if executor is None:
+        for batch in batches:
+            found = search(rows, columns, mines, start, batch)
+            if found is not None:
+                break
+    else:
+        pending = {executor.submit(search, rows, columns, mines, start, batch) for batch in batches}
+        while pending and found is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.result() is not None:
+                    found = future.result()
+                    break
+        for future in pending:
+            future.cancel()
+    return found
@@ -0,0 +1,79 @@
+""" Deductions over the numbers of a board.
+
+    Every revealed number is a constraint: a set of hidden cells and how
+    many mines are among them. The rules derive safe cells and mines
+    from single constraints and new constraints from pairs of them.
+"""
+from collections import defaultdict
+
+
+def constraints_of(numbers, neighbours, hidden, mines):
+    """ Constraints given by the revealed numbers.
+
+    Args:
+        numbers (dict): Number of surronding mines of every revealed cell.
+        neighbours (callable): Index of the surronding cells of a cell.
+        hidden (set): Index of the hidden cells.
+        mines (set): Index of the known mines.
+    Returns:
+        dict: Mines (int) among every set (frozenset) of hidden cells.
+    """
+    constraints = {}
+    for idx, number in numbers.items():
+        cells = frozenset(nei for nei in neighbours(idx) if nei in hidden)
+        if cells:
+            constraints[cells] = number - sum(1 for nei in neighbours(idx) if nei in mines)
+    return constraints
+
+
+def propagate(constraints, safe, mines):
+    """ Applies the single cell rules (all the cells of a constraint are
+        safe or all of them are mines) and the subset rule (if A is a
+        subset of B, B - A has the mines of B minus the ones of A)
+        until nothing new is found.
+        The cells found are added to `safe` and `mines`.
+
+    Args:
+        constraints (dict): As returned by `constraints_of`.
+        safe (set): Index of the cells known to be safe.
+        mines (set): Index of the cells known to be mines.
+    Returns:
+        dict: The constraints left over the cells still unknown.
+    """
+    changed = True
+    while changed:
+        changed = False
+        reduced = {}
+        for cells, count in constraints.items():
+            count -= len(cells & mines)
+            cells = cells - safe - mines
+            if not cells:
+                continue
+            if count == 0:
+                safe |= cells
+                changed = True
+            elif count == len(cells):
+                mines |= cells
+                changed = True
+            else:
+                reduced[cells] = count
+        constraints = reduced
+        if changed:
+            continue
+
+        containing = defaultdict(list)
+        for cells in constraints:
+            for idx in cells:
+                containing[idx].append(cells)
+        derived = {}
+        for small, count in constraints.items():
+            # Any superset of `small` contains its first cell
+            for big in containing[min(small)]:
+                if len(big) > len(small) and small <= big:
+                    rest = big - small
+                    if rest not in constraints and rest not in derived:
+                        derived[rest] = constraints[big] - count
+        if derived:
+            constraints.update(derived)
+            changed = True
+    return constraints
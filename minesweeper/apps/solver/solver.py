@@ -0,0 +1,126 @@
+from minesweeper.apps.game.board import Board
+
+from .frontier import MAX_STATES, TooManyStates, components, enumerate_component, probabilities
+from .rules import constraints_of, propagate
+
+HIDDEN_VIEWS = {Board.VIEW_HIDDEN, Board.VIEW_FLAGGED, Board.VIEW_Q_MARK}
+
+
+class Solution(object):
+    """ What can be told about the hidden cells of a board:
+        `safe` and `mines` are the index of the cells proven to be
+        safe or mines and `probabilities` the probability of having
+        a mine of every other cell of the frontier. The rest of the
+        hidden cells (`outside`) share `outside_probability`.
+    """
+    def __init__(self, safe, mines, probabilities, outside, outside_probability):
+        self.safe = safe
+        self.mines = mines
+        self.probabilities = probabilities
+        self.outside = outside
+        self.outside_probability = outside_probability
+
+    def probability(self, idx):
+        """ Probability of having a mine of the hidden cell `idx`. """
+        if idx in self.safe:
+            return 0.0
+        if idx in self.mines:
+            return 1.0
+        return self.probabilities.get(idx, self.outside_probability)
+
+    def best(self):
+        """ Index of the hidden cell least likely to have a mine,
+            None if every hidden cell is known.
+        """
+        if self.safe:
+            return min(self.safe)
+        candidates = list(self.probabilities)
+        if self.outside:
+            candidates.append(min(self.outside))
+        if not candidates:
+            return None
+        return min(candidates, key=lambda idx: (self.probability(idx), idx))
+
+
+def _feasible(solved, outside, mines):
+    """ Mines of every component, and of the cells away from the
+        frontier, that can be completed to a board with exactly
+        `mines` mines.
+    """
+    def totals(supports):
+        result = {0}
+        for support in supports:
+            result = {a + b for a in result for b in support}
+        return result
+
+    supports = [set(solutions) for _, solutions in solved]
+    result = []
+    for number, support in enumerate(supports):
+        rest = totals(supports[:number] + supports[number + 1:])
+        result.append({k for k in support if any(0 <= mines - k - r <= outside for r in rest)})
+    return result, {mines - k for k in totals(supports) if 0 <= mines - k <= outside}
+
+
+def solve(rows, columns, mines, view, max_states=MAX_STATES):
+    """ Finds the hidden cells that are safe or mines for sure, first
+        with the single cell and subset rules and then with an exact
+        enumeration of the frontier, which also gives the probability
+        of having a mine of every other hidden cell.
+        Components of the frontier that need more than `max_states`
+        states are not enumerated and their cells are given the same
+        probability as the cells away from the frontier.
+
+    Args:
+        rows (int): Number of rows of the board.
+        columns (int): Number of columns of the board.
+        mines (int): Number of mines of the board.
+        view (bytes-like): What a player sees of every cell (see `Board.view`).
+            Flags are not trusted: flagged cells are hidden cells.
+    Returns:
+        Solution: The safe cells, the mines and the probabilities.
+    """
+    board = Board(rows, columns, counts=bytearray(rows * columns))
+    cache = {}
+
+    def neighbours(idx):
+        if idx not in cache:
+            cache[idx] = tuple(board.neighbours(idx))
+        return cache[idx]
+
+    numbers = {idx: value for idx, value in enumerate(view) if value <= 8}
+    hidden = {idx for idx, value in enumerate(view) if value in HIDDEN_VIEWS}
+    exploded = {idx for idx, value in enumerate(view) if value == Board.VIEW_MINE}
+
+    safe, found = set(), set()
+    constraints = propagate(constraints_of(numbers, neighbours, hidden, exploded), safe, found)
+
+    solved = []
+    for order, own in components(constraints):
+        try:
+            solved.append((order, enumerate_component(order, own, max_states)))
+        except TooManyStates:
+            continue
+    frontier = {idx for order, _ in solved for idx in order}
+    outside = hidden - safe - found - frontier
+    mines_left = mines - len(exploded) - len(found)
+    chances, outside_chance = probabilities(solved, len(outside), mines_left)
+
+    # Cells with the same value in every solution are known too
+    feasible_components, feasible_outside = _feasible(solved, len(outside), mines_left)
+    if feasible_outside == {0}:
+        safe |= outside
+        outside = set()
+    elif feasible_outside == {len(outside)}:
+        found |= outside
+        outside = set()
+    for (order, solutions), feasible in zip(solved, feasible_components):
+        if not feasible:
+            continue
+        for pos, idx in enumerate(order):
+            if all(solutions[k][1][pos] == 0 for k in feasible):
+                safe.add(idx)
+            elif all(solutions[k][1][pos] == solutions[k][0] for k in feasible):
+                found.add(idx)
+
+    result = {idx: chances[idx] for idx in frontier if idx not in safe and idx not in found}
+    return Solution(safe, found, result, outside, outside_chance)
@@ -0,0 +1,136 @@
+import itertools
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from django.test import SimpleTestCase
+
+from minesweeper.apps.game.board import Board
+from minesweeper.apps.solver import solve
+from minesweeper.apps.solver.frontier import components, enumerate_component
+from minesweeper.apps.solver.generator import is_solvable, no_guess_board
+
+
+def board_from_layout(layout):
+    """ Creates a board from a list of strings where '*' is a mine
+        and 'o' a revealed cell.
+    """
+    cells = ''.join(layout)
+    board = Board(len(layout), len(layout[0]), mine=bytearray(c == '*' for c in cells))
+    board.visible = bytearray(c == 'o' for c in cells)
+    return board
+
+
+def brute_force(board, mines):
+    """ Probability of having a mine of every hidden cell,
+        trying every placement of the mines.
+    """
+    view = board.view()
+    hidden = [idx for idx, value in enumerate(view) if value >= Board.VIEW_HIDDEN]
+    numbers = {idx: value for idx, value in enumerate(view) if value < Board.VIEW_HIDDEN}
+    solutions, mined = 0, dict.fromkeys(hidden, 0)
+    for placement in itertools.combinations(hidden, mines):
+        placement = set(placement)
+        if all(sum(nei in placement for nei in board.neighbours(idx)) == number
+               for idx, number in numbers.items()):
+            solutions += 1
+            for idx in placement:
+                mined[idx] += 1
+    return {idx: count / solutions for idx, count in mined.items()}
+
+
+class SolverTestCase(SimpleTestCase):
+    def test_single_cell_rules(self):
+        """ A number with as many hidden neighbours as mines
+            has a mine in all of them
+        """
+        board = board_from_layout(['oo*',
+                                   'ooo',
+                                   'ooo'])
+        solution = solve(3, 3, 1, board.view())
+        self.assertEqual((solution.safe, solution.mines), (set(), {2}))
+
+    def test_subset_rule(self):
+        """ The 1-2-1 pattern is solved without enumeration
+        """
+        board = board_from_layout(['*.*',
+                                   'ooo'])
+        solution = solve(2, 3, 2, board.view(), max_states=0)
+        self.assertEqual((solution.safe, solution.mines), ({1}, {0, 2}))
+
+    def test_global_mine_count(self):
+        """ The number of mines left tells about the cells
+            away from the frontier
+        """
+        board = board_from_layout(['*...',
+                                   'oo..',
+                                   'oo..'])
+        solution = solve(3, 4, 1, board.view())
+        self.assertEqual(solution.safe, {2, 3, 6, 7, 10, 11})
+        self.assertEqual(solution.mines, set())
+        self.assertEqual(solution.probabilities, {0: 0.5, 1: 0.5})
+        self.assertEqual(solution.best(), 2)
+
+    def test_probabilities(self):
+        """ Probabilities match trying every placement of the mines
+        """
+        rng = random.Random(7)
+        for _ in range(50):
+            mines = rng.randint(2, 6)
+            board = Board.random(4, 5, mines, rng=rng)
+            for idx in rng.sample([idx for idx in range(20) if not board.mine[idx]], 3):
+                board.reveal(idx)
+            solution = solve(4, 5, mines, board.view())
+            for idx, probability in brute_force(board, mines).items():
+                self.assertAlmostEqual(solution.probability(idx), probability)
+                self.assertEqual(idx in solution.safe, probability == 0)
+                self.assertEqual(idx in solution.mines, probability == 1)
+
+    def test_components(self):
+        """ Constraints that share no cell are enumerated apart
+        """
+        constraints = {frozenset([0, 1]): 1, frozenset([1, 2]): 1, frozenset([7, 8]): 1}
+        found = components(constraints)
+        self.assertEqual([order for order, _ in found], [[0, 1, 2], [7, 8]])
+        solutions = enumerate_component(*found[0])
+        self.assertEqual(solutions, {1: (1, [0, 1, 0]), 2: (1, [1, 0, 1])})
+
+    def test_expert_board(self):
+        """ Safe cells and mines are always right while playing
+        """
+        rng = random.Random(3)
+        board = Board(16, 30, mines_placed=False)
+        board.place_mines(99, [0, 1, 30, 31], rng=rng)
+        board.reveal(0)
+        while not board.is_solved:
+            solution = solve(16, 30, 99, board.view())
+            self.assertFalse(any(board.mine[idx] for idx in solution.safe))
+            self.assertTrue(all(board.mine[idx] for idx in solution.mines))
+            best = solution.best()
+            if board.mine[best]:
+                break
+            board.reveal(best)
+
+
+class GeneratorTestCase(SimpleTestCase):
+    def assertNoGuess(self, board, mines, start):
+        self.assertEqual(sum(board.mine), mines)
+        self.assertFalse(any(board.mine[idx] for idx in [start] + list(board.neighbours(start))))
+        self.assertTrue(is_solvable(board, mines, start))
+
+    def test_is_solvable(self):
+        """ A board that needs a guess is not solvable
+        """
+        board = Board(2, 4, mine=bytearray([0, 0, 1, 0,
+                                            0, 0, 0, 1]))
+        self.assertFalse(is_solvable(board, 2, 0))
+        board = Board(2, 4, mine=bytearray([0, 0, 0, 1,
+                                            0, 0, 0, 1]))
+        self.assertTrue(is_solvable(board, 2, 0))
+
+    def test_no_guess_board(self):
+        rng = random.Random(11)
+        self.assertNoGuess(no_guess_board(16, 16, 40, 100, rng=rng), 40, 100)
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            self.assertNoGuess(no_guess_board(9, 9, 10, 0, executor=executor, rng=rng), 10, 0)
+        # The mine is on either cell of the right column
+        self.assertIsNone(no_guess_board(2, 3, 1, 0, tries=5))
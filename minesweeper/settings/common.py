@@ -2,6 +2,7 @@
 
 import sys
 import logging
+from os import cpu_count
 from os.path import abspath, basename, dirname, join, normpath
 
 ########## PATH CONFIGURATION
@@ -101,6 +102,8 @@ TEMPLATES = [
 
 ########## MIDDLEWARE CONFIGURATION
 MIDDLEWARE = (
+    # First, so it measures the whole request (disabled by REQUEST_TIMING)
+    'minesweeper.apps.game.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -162,16 +165,64 @@ LOG_LEVEL=logging.INFO
 LOG_FORMAT='%(asctime)s %(levelname)-8s %(message)s'
 LOG_DATEFMT='%a, %d %b %Y %H:%M:%S'
 LOG_FILENAME='log_minesweeper.log'
+
+# Per-request SQL queries and timings, as Server-Timing headers and a log
+# line (see `minesweeper.apps.game.middleware`), and the duration (in
+# seconds) beyond which a request also logs the queries it repeats the most.
+REQUEST_TIMING = False
+SLOW_REQUEST_THRESHOLD = 1.0
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'default': {'format': LOG_FORMAT, 'datefmt': LOG_DATEFMT},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'default'},
+    },
+    'loggers': {
+        'minesweeper.requests': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
 ########## END LOG CONFIGURATION
 
 ########## WSGI CONFIGURATION
 WSGI_APPLICATION = 'minesweeper.wsgi.application'
 ########## END WSGI CONFIGURATION
 
+########## GAME CONFIGURATION
+# Board sizes (rows, columns, mines) whose mines are taken from a pool of
+# pre-generated boards, and how many boards are kept ready for each one
+# (see the `refill_board_pool` management command).
+BOARD_POOL_SIZES = [(9, 9, 10), (16, 16, 40), (16, 30, 99)]
+BOARD_POOL_DEPTH = 200
+# Processes generating the boards of no-guess games, up to 4 when there
+# are CPUs to spare (0 to use the process of the request). Either way the
+# boards are searched with the game unlocked (see `play_locked`).
+NO_GUESS_WORKERS = min(cpu_count() or 1, 4) if (cpu_count() or 1) > 1 else 0
+# Cache (an alias of CACHES) of the API responses of the games, None to
+# render every response, and how long they are kept (in seconds).
+GAME_RESPONSE_CACHE = None
+GAME_RESPONSE_CACHE_TIMEOUT = 300
+# Cache of the boards of the games being played, None to load them from the
+# database on every move: {'BACKEND': dotted path of a `boardcache.BoardCache`,
+# 'OPTIONS': its arguments}.
+BOARD_CACHE = None
+########## END GAME CONFIGURATION
+
+########## AUTHENTICATION CONFIGURATION
+# How long (in seconds, 0 to load them on every request) and how many of the
+# users of the JSON Web Tokens are cached by every process (see
+# `minesweeper.apps.game.api.authentication`).
+JWT_USER_CACHE_TIMEOUT = 60
+JWT_USER_CACHE_MAX_ENTRIES = 1000
+########## END AUTHENTICATION CONFIGURATION
+
 ########## REST FRAMEWORK CONFIGURATION
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_jwt.authentication.JSONWebTokenAuthentication',
+        'minesweeper.apps.game.api.authentication.CachedJSONWebTokenAuthentication',
         'rest_framework.authentication.TokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
@@ -12,13 +12,25 @@ DEBUG = True
 
 ########## LOG CONFIGURATION
 LOG_LEVEL=logging.DEBUG
+REQUEST_TIMING = bool(environ.get('REQUEST_TIMING'))
 ########## END LOG CONFIGURATION
 
 ########## CACHE CONFIGURATION
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
-    }
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'minesweeper',
+    },
+    # Shared by every process of the host (e.g. several workers)
+    'files': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': join(SITE_ROOT, '.cache'),
+    },
+}
+GAME_RESPONSE_CACHE = environ.get('GAME_RESPONSE_CACHE', 'default')
+BOARD_CACHE = {
+    'BACKEND': 'minesweeper.apps.game.boardcache.LocMemBoardCache',
+    'OPTIONS': {'max_entries': 1000},
 }
 ########## END CACHE CONFIGURATION
 
@@ -15,6 +15,7 @@ DEBUG = False
 
 ########## LOG CONFIGURATION
 LOG_LEVEL=logging.INFO
+REQUEST_TIMING = bool(environ.get('REQUEST_TIMING'))
 ########## END LOG CONFIGURATION
 
 INSTALLED_APPS += (
@@ -32,6 +33,9 @@ DATABASES['default'].update(dj_database_url.config(conn_max_age=500))
 STATICFILES_STORAGE = 'whitenoise.django.GzipManifestStaticFilesStorage'
 
 django_heroku.settings(locals())
+# django_heroku replaces LOGGING, keep the log of the requests
+LOGGING.setdefault('handlers', {}).setdefault('console', {'class': 'logging.StreamHandler'})
+LOGGING.setdefault('loggers', {})['minesweeper.requests'] = {'handlers': ['console'], 'level': 'INFO', 'propagate': False}
 ########## END HEROKU CONFIGURATION
 
 # vim:expandtab:stmartindent:tabstop=4:softtabstop=4:shiftwidth=4:
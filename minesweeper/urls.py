@@ -18,6 +18,8 @@ from django.urls import path
 from django.conf.urls import url, include
 from rest_framework_jwt.views import obtain_jwt_token
 
+from minesweeper.apps.game.metrics import metrics_view
+
 from rest_framework.schemas import get_schema_view
 from rest_framework_swagger.renderers import OpenAPIRenderer, SwaggerUIRenderer
 
@@ -25,6 +27,7 @@ schema_view = get_schema_view(title='GameSweeper API', renderer_classes=[OpenAPI
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
 
     url(r'^api/doc/$', schema_view, name='api-documentation'),
     url(r'^api/auth/login/$', obtain_jwt_token, name='api-login'),